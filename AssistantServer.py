@@ -0,0 +1,304 @@
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, asynccontextmanager
+from urllib.parse import urlsplit, parse_qsl
+from AssistantService import AssistantService, COMMANDS, parse_flag
+from ExpressionEngine import ExpressionError
+from StorageError import StorageError, ConflictError
+
+# Команды, которые не меняют данные и выполняются сразу, без очереди записи
+READ_COMMANDS = {
+    command for command in COMMANDS
+    if command.startswith(("get_", "list_", "search_", "totals_")) or command == "balance"
+}
+# Долгие команды без изменения данных: выполняются в потоке, чтобы не
+# останавливать цикл событий (экспорт проходит всю коллекцию и пишет файл)
+SLOW_READ_COMMANDS = {command for command in COMMANDS if command.startswith("export_")}
+# Вычисление не обращается к записям: выполняется в отдельном пуле без
+# блокировки данных и с ограничением времени ответа
+CALCULATE_TIMEOUT = 2.0
+CALCULATE_WORKERS = 2
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+MAX_BODY = 16 * 1024 * 1024
+
+# Типы аргументов в строке запроса GET; остальные передаются строками
+INTEGER_ARGUMENTS = {"task_id", "note_id", "contact_id", "record_id", "offset", "limit", "shard_size", "workers"}
+BOOLEAN_ARGUMENTS = {"done", "prefix", "force"}
+LIST_ARGUMENTS = {"priorities"}
+
+
+class _ReadWriteLock:
+    """Блокировка данных для цикла событий: чтений сколько угодно, изменение - одно и без чтений.
+
+    Ожидающее изменение пропускается вперёд новых чтений, чтобы поток
+    запросов на чтение не откладывал запись бесконечно.
+    """
+
+    def __init__(self):
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reading(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._writing and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def writing(self):
+        async with self._condition:
+            self._writers_waiting += 1
+            try:
+                await self._condition.wait_for(lambda: not self._writing and not self._readers)
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class AssistantServer:
+    """Локальный HTTP/JSON-сервер помощника на asyncio.
+
+    Коллекции загружаются один раз и живут в памяти процесса. Запрос
+    POST /api/<команда> с JSON-объектом аргументов в теле (или GET с
+    аргументами в строке запроса) вызывает одноимённый метод
+    AssistantService. Быстрые чтения по индексам выполняются сразу в цикле
+    событий, экспорт - в потоке, вычисления - в отдельном пуле потоков без
+    блокировки данных, так что долгое выражение не задерживает ни чтения,
+    ни запись. Изменения ставятся в очередь
+    единственной задачи-писателя: она забирает всё, что накопилось,
+    применяет пакетом в потоке и фиксирует на диске одной операцией
+    (групповая фиксация), а клиенты получают ответ только после фиксации.
+    Цикл событий долгими командами не занят. Чтения ждут только применения
+    изменений к коллекциям в памяти (блокировка _ReadWriteLock), но не
+    записи на диск.
+    """
+
+    def __init__(self, service=None, max_batch=1000):
+        self.service = service or AssistantService()
+        self.max_batch = max_batch
+        self._queue = None
+        self._writer = None
+        self._lock = None
+        self._calculations = None
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        """Загрузка коллекций, запуск писателя и приём соединений."""
+        self.service.load()
+        self._lock = _ReadWriteLock()
+        self._calculations = ThreadPoolExecutor(CALCULATE_WORKERS, thread_name_prefix="calculate")
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self._handle, path=unix_path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        """Дописывание очереди, остановка писателя и сохранение производных данных."""
+        if self._writer is not None:
+            await self._queue.join()
+            self._writer.cancel()
+            self._writer = None
+        if self._calculations is not None:
+            # Зависшее вычисление не задерживает остановку
+            self._calculations.shutdown(wait=False)
+            self._calculations = None
+        self.service.close()
+
+    async def execute(self, command, arguments):
+        """Выполнение команды: чтение сразу или в потоке, изменение - через очередь писателя."""
+        if command == "calculate":
+            calculation = asyncio.get_running_loop().run_in_executor(
+                self._calculations, lambda: self.service.execute(command, **arguments))
+            try:
+                return await asyncio.wait_for(calculation, CALCULATE_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise ExpressionError("Превышено время вычисления.")
+        if command in READ_COMMANDS:
+            async with self._lock.reading():
+                return self.service.execute(command, **arguments)
+        if command in SLOW_READ_COMMANDS:
+            async with self._lock.reading():
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: self.service.execute(command, **arguments))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((command, arguments, future))
+        return await future
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self._queue.get()]
+            while len(group) < self.max_batch and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+
+            stack = ExitStack()
+            stack.enter_context(self.service.batch())
+            # Применение в потоке (импорт может идти долго), порядок команд сохраняется
+            async with self._lock.writing():
+                outcomes = await loop.run_in_executor(None, self._apply, group)
+            try:
+                # Запись на диск в потоке: чтения в это время продолжают обслуживаться
+                await loop.run_in_executor(None, stack.close)
+            except Exception as e:
+                outcomes = [(False, e)] * len(group)
+
+            for (_, _, future), (ok, value) in zip(group, outcomes):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                self._queue.task_done()
+
+    def _apply(self, group):
+        """Выполнение группы изменений по порядку; список (успех, результат или исключение)."""
+        outcomes = []
+        for command, arguments, _ in group:
+            try:
+                outcomes.append((True, self.service.execute(command, **arguments)))
+            except Exception as e:
+                outcomes.append((False, e))
+        return outcomes
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self._dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError:
+            self._write_response(writer, 400, {"ok": False, "error": "Некорректный HTTP-запрос."}, False)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        method, target, version = line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+            headers["connection"] = "close"
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY:
+            raise ValueError("Слишком большое тело запроса.")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if not url.path.startswith("/api/"):
+            return 404, {"ok": False, "error": "Неизвестный адрес."}
+        command = url.path[len("/api/"):]
+        if command not in COMMANDS:
+            return 404, {"ok": False, "error": f"Неизвестная команда '{command}'."}
+        try:
+            if method == "POST":
+                arguments = json.loads(body) if body else {}
+                if not isinstance(arguments, dict):
+                    raise ValueError("Тело запроса должно быть JSON-объектом.")
+            elif method == "GET" and command in READ_COMMANDS:
+                arguments = {name: self._parse_value(name, value) for name, value in parse_qsl(url.query)}
+            else:
+                return 405, {"ok": False, "error": "Метод не поддерживается."}
+            return 200, {"ok": True, "result": await self.execute(command, arguments)}
+        except KeyError as e:
+            return 404, {"ok": False, "error": e.args[0] if e.args else "Запись не найдена."}
+        except TypeError as e:
+            return 400, {"ok": False, "error": f"Неверные аргументы команды ({e})."}
+        except ConflictError as e:
+            return 409, {"ok": False, "error": str(e)}
+        except StorageError as e:
+            return 500, {"ok": False, "error": str(e)}
+        except (ValueError, ExpressionError, OSError) as e:
+            return 400, {"ok": False, "error": str(e)}
+        except Exception as e:
+            return 500, {"ok": False, "error": str(e)}
+
+    @staticmethod
+    def _parse_value(name, value):
+        """Значение аргумента из строки запроса по его имени."""
+        if name in INTEGER_ARGUMENTS:
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"Аргумент '{name}' должен быть числом.")
+        if name in BOOLEAN_ARGUMENTS:
+            return parse_flag(value, name)
+        if name in LIST_ARGUMENTS:
+            return [item.strip() for item in value.split(",") if item.strip()]
+        return value
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + body)
+
+
+async def serve(host, port, unix_path):
+    server = AssistantServer()
+    listener = await server.start(host, port, unix_path)
+    print(f"Сервер запущен: {unix_path or f'http://{host}:{port}'}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main(argv):
+    """Запуск сервера: python AssistantServer.py [--host H] [--port P] [--unix путь]."""
+    parser = argparse.ArgumentParser(description="HTTP/JSON-сервер персонального помощника")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="путь к Unix-сокету вместо TCP")
+    options = parser.parse_args(argv[1:])
+    try:
+        asyncio.run(serve(options.host, options.port, options.unix))
+    except KeyboardInterrupt:
+        print("Сервер остановлен.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,515 @@
+import sys
+import json
+from datetime import datetime
+from contextlib import contextmanager, ExitStack
+from CsvImporter import CsvImporter
+from RecordExporter import RecordExporter
+from DateIndex import to_ordinal
+from TaskIndex import PRIORITIES
+from ExpressionEngine import ExpressionEngine, ExpressionError
+from StorageError import StorageError
+
+TRUE_VALUES = ("1", "true", "да")
+FALSE_VALUES = ("0", "false", "нет")
+
+
+def parse_flag(value, name):
+    """Логический аргумент: True/False, 0/1 или строка 1/true/да, 0/false/нет; иначе ValueError."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+    raise ValueError(f"Аргумент '{name}' должен быть логическим значением (true или false).")
+
+
+# Допустимые типы аргументов команд (логические проверяет parse_flag). ID можно
+# передать и строкой: её проверяет поиск записи
+ARGUMENT_TYPES = {
+    **dict.fromkeys(("title", "description", "content", "priority", "due_date", "due_from", "due_to", "order_by",
+                     "query", "name", "phone", "email", "category", "date", "date_from", "date_to", "filename",
+                     "expression"), ((str,), "строкой")),
+    **dict.fromkeys(("batch_size", "limit", "offset", "shard_size", "workers"), ((int,), "целым числом")),
+    **dict.fromkeys(("task_id", "note_id", "contact_id", "record_id"), ((int, str), "целым числом")),
+    "amount": ((int, float, str), "числом"),
+    "priorities": ((list,), "списком"),
+    "variables": ((dict,), "объектом"),
+}
+
+
+def check_arguments(arguments):
+    """Проверка типов аргументов команды до её выполнения; ValueError для неверного типа."""
+    for name, value in arguments.items():
+        if value is None or name not in ARGUMENT_TYPES:
+            continue
+        types, description = ARGUMENT_TYPES[name]
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise ValueError(f"Аргумент '{name}' должен быть {description}.")
+
+
+class AssistantService:
+    """Программный интерфейс помощника без input() и print().
+
+    Каждая операция меню доступна как метод с явными параметрами: ошибки
+    проверки сообщаются исключением ValueError, отсутствие записи - KeyError,
+    результат возвращается значением. Менеджеры создаются при первом
+    обращении и дальше переиспользуются. Внутри batch() изменения всех
+    коллекций накапливаются и фиксируются на диске один раз при выходе.
+    """
+
+    def __init__(self):
+        self._managers = {}
+        self._batch = None
+        self._calculator = None
+
+    def _manager(self, name):
+        manager = self._managers.get(name)
+        if manager is not None and manager.storage.stale:
+            # Запись отклонена из-за изменений другим процессом - коллекция перечитывается
+            manager.close()
+            manager = None
+        if manager is None:
+            # Модули менеджеров импортируются только при обращении к ним
+            if name == "tasks":
+                from TaskManager import TaskManager
+                manager = TaskManager(reminders=False)
+            elif name == "notes":
+                from NoteManager import NoteManager
+                manager = NoteManager()
+            elif name == "contacts":
+                from ContactManager import ContactManager
+                manager = ContactManager()
+            else:
+                from FinanceManager import FinanceManager
+                manager = FinanceManager()
+            if self._batch is not None:
+                self._batch.enter_context(manager.storage.batch())
+            self._managers[name] = manager
+        return manager
+
+    def load(self, names=("tasks", "notes", "contacts", "finance")):
+        """Предварительная загрузка коллекций (для долгоживущих процессов)."""
+        for name in names:
+            self._manager(name)
+
+    @contextmanager
+    def batch(self):
+        """Выполнение группы операций с одной фиксацией изменений."""
+        if self._batch is not None:
+            yield self
+            return
+        with ExitStack() as stack:
+            for manager in self._managers.values():
+                stack.enter_context(manager.storage.batch())
+            self._batch = stack
+            try:
+                yield self
+            finally:
+                self._batch = None
+
+    def close(self):
+        """Сохранение производных данных (индексов, итогов, снимков) и остановка менеджеров."""
+        for name, manager in self._managers.items():
+            if name == "notes":
+                manager.save_index()
+            elif name == "finance":
+                manager.save_ledger()
+            elif name == "contacts":
+                manager.save_fingerprints()
+            manager.close()
+        self._managers.clear()
+
+    def execute(self, command, **arguments):
+        """Вызов операции по имени (для пакетного режима и сервера)."""
+        if not isinstance(command, str) or command not in COMMANDS:
+            raise ValueError(f"Неизвестная команда '{command}'.")
+        check_arguments(arguments)
+        return getattr(self, command)(**arguments)
+
+    @staticmethod
+    def _find(records, record_id, message):
+        try:
+            return records[int(record_id)]
+        except (KeyError, TypeError, ValueError):
+            raise KeyError(message)
+
+    @staticmethod
+    def _date(text, name="дата"):
+        ordinal = to_ordinal(text)
+        if ordinal is None:
+            raise ValueError(f"Неверный формат: {name} '{text}'. Используйте ДД-ММ-ГГГГ.")
+        return ordinal
+
+    @staticmethod
+    def _import(manager, records, filename, batch_size, workers=1, fingerprints=None, merge=False):
+        report = CsvImporter(records, manager.storage, manager.parse_csv_row, manager.CSV_FIELDS, batch_size,
+                             workers, fingerprints=fingerprints, merge=merge).run(filename)
+        return {"rows": report.rows, "imported": report.imported, "duplicates": report.duplicates,
+                "merged": report.merged, "errors": report.errors}
+
+    @staticmethod
+    def _export(manager, records, filename, shard_size=None, workers=None):
+        exporter = RecordExporter(manager.CSV_FIELDS)
+        if shard_size is None:
+            report = exporter.run(records, filename)
+        else:
+            report = exporter.run_sharded(records, filename, shard_size, workers)
+        return {"rows": report.rows, "files": report.files, "bytes": report.bytes}
+
+    # Задачи
+
+    def add_task(self, title, priority, due_date, description=""):
+        """Добавление задачи; возвращает созданную задачу."""
+        manager = self._manager("tasks")
+        task = manager.parse_csv_row({"title": title, "description": description, "done": "false",
+                                      "priority": priority, "due_date": due_date})
+        task = {"id": manager.tasks.ids.allocate(), **task}
+        manager.tasks.add(task)
+        manager.storage.insert(task)
+        return task
+
+    def get_task(self, task_id):
+        """Задача по ID."""
+        return self._find(self._manager("tasks").tasks, task_id, "Задача с таким ID не найдена.")
+
+    def list_tasks(self, done=None, priorities=None, due_from=None, due_to=None,
+                   order_by="due_date", offset=0, limit=None):
+        """Выборка задач; границы срока задаются датами ДД-ММ-ГГГГ."""
+        if priorities is not None and any(priority not in PRIORITIES for priority in priorities):
+            raise ValueError("Недопустимый приоритет. Используйте 'Высокий', 'Средний' или 'Низкий'.")
+        due_from = None if due_from is None else self._date(due_from, "срок с")
+        due_to = None if due_to is None else self._date(due_to, "срок по")
+        done = None if done is None else parse_flag(done, "done")
+        return self._manager("tasks").query_tasks(done, priorities, due_from, due_to, order_by, offset, limit)
+
+    def mark_task_done(self, task_id):
+        """Отметка задачи выполненной."""
+        return self.edit_task(task_id, done=True)
+
+    def edit_task(self, task_id, title=None, description=None, priority=None, due_date=None, done=None):
+        """Изменение заданных полей задачи; возвращает обновлённую задачу."""
+        manager = self._manager("tasks")
+        task = self.get_task(task_id)
+        changes = {}
+        if title is not None:
+            if not title.strip():
+                raise ValueError("Название задачи обязательно.")
+            changes["title"] = title.strip()
+        if description is not None:
+            changes["description"] = description
+        if priority is not None:
+            if priority not in PRIORITIES:
+                raise ValueError("Недопустимый приоритет. Используйте 'Высокий', 'Средний' или 'Низкий'.")
+            changes["priority"] = priority
+        if due_date is not None:
+            self._date(due_date, "срок")
+            changes["due_date"] = due_date
+        if done is not None:
+            changes["done"] = parse_flag(done, "done")
+        task = manager.tasks.update(task["id"], changes)
+        manager.storage.update(task)
+        return task
+
+    def delete_task(self, task_id):
+        """Удаление задачи; возвращает True, если задача была."""
+        manager = self._manager("tasks")
+        if manager.tasks.remove(int(task_id)) is None:
+            return False
+        manager.storage.delete(int(task_id))
+        return True
+
+    def import_tasks(self, filename, batch_size=1000, workers=None):
+        """Импорт задач из CSV; большой файл разбирается workers процессами (None - все процессоры)."""
+        manager = self._manager("tasks")
+        return self._import(manager, manager.tasks, filename, batch_size, workers)
+
+    def export_tasks(self, filename, done=None, priority=None):
+        """Экспорт задач в CSV/JSONL/gzip (по расширению) с фильтрами; возвращает сводку."""
+        manager = self._manager("tasks")
+        done = None if done is None else parse_flag(done, "done")
+        tasks = manager.tasks if done is None and priority is None else manager.find_tasks(done, priority)
+        return self._export(manager, tasks, filename)
+
+    # Заметки
+
+    def add_note(self, title, content=""):
+        """Создание заметки; возвращает созданную заметку."""
+        manager = self._manager("notes")
+        note = manager.parse_csv_row({"title": title, "content": content,
+                                      "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S")})
+        note = {"id": manager.notes.ids.allocate(), **note}
+        manager.notes.add(note)
+        manager.storage.insert(note)
+        return note
+
+    def get_note(self, note_id):
+        """Заметка по ID."""
+        return self._find(self._manager("notes").notes, note_id, "Заметка с таким ID не найдена.")
+
+    def list_notes(self):
+        """Все заметки."""
+        return list(self._manager("notes").notes)
+
+    def search_notes(self, query, limit=10):
+        """Полнотекстовый поиск; возвращает заметки с релевантностью."""
+        manager = self._manager("notes")
+        return [dict(manager.notes[note_id], score=score) for note_id, score in manager.index.search(query, limit)]
+
+    def edit_note(self, note_id, title=None, content=None):
+        """Изменение заметки; время обновления выставляется автоматически."""
+        manager = self._manager("notes")
+        note = self.get_note(note_id)
+        changes = {"timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S")}
+        if title is not None:
+            if not title.strip():
+                raise ValueError("Заголовок заметки обязателен.")
+            changes["title"] = title.strip()
+        if content is not None:
+            changes["content"] = content
+        note = manager.notes.update(note["id"], changes)
+        manager.storage.update(note)
+        return note
+
+    def delete_note(self, note_id):
+        """Удаление заметки; возвращает True, если заметка была."""
+        manager = self._manager("notes")
+        if manager.notes.remove(int(note_id)) is None:
+            return False
+        manager.storage.delete(int(note_id))
+        return True
+
+    def import_notes(self, filename, batch_size=1000):
+        """Импорт заметок из CSV; возвращает сводку."""
+        manager = self._manager("notes")
+        return self._import(manager, manager.notes, filename, batch_size)
+
+    def export_notes(self, filename):
+        """Экспорт заметок в CSV/JSONL/gzip (по расширению); возвращает сводку."""
+        manager = self._manager("notes")
+        return self._export(manager, manager.notes, filename)
+
+    # Контакты
+
+    def add_contact(self, name, phone="", email=""):
+        """Добавление контакта; возвращает созданный контакт.
+
+        Если контакт с таким телефоном или адресом почты уже есть, новый не
+        создаётся: пустые поля существующего дополняются, и возвращается он.
+        """
+        manager = self._manager("contacts")
+        contact = manager.parse_csv_row({"name": name, "phone": phone, "email": email})
+        duplicate = manager.fingerprints.find(contact)
+        if duplicate is not None:
+            return manager.merge_contact(duplicate, contact)[0]
+        contact = {"id": manager.contacts.ids.allocate(), **contact}
+        manager.contacts.add(contact)
+        manager.storage.insert(contact)
+        return contact
+
+    def get_contact(self, contact_id):
+        """Контакт по ID."""
+        return self._find(self._manager("contacts").contacts, contact_id, "Контакт с таким ID не найден.")
+
+    def search_contacts(self, query, prefix=False):
+        """Поиск контактов по подстроке (или началу) имени или номера."""
+        prefix = parse_flag(prefix, "prefix")
+        manager = self._manager("contacts")
+        if manager.storage.supports_queries:
+            ids = manager.query_contacts(query, prefix)
+        else:
+            ids = manager.index.search_prefix(query) if prefix else manager.index.search(query)
+        return [manager.contacts[contact_id] for contact_id in ids]
+
+    def edit_contact(self, contact_id, name=None, phone=None, email=None):
+        """Изменение заданных полей контакта."""
+        manager = self._manager("contacts")
+        contact = self.get_contact(contact_id)
+        changes = {}
+        if name is not None:
+            if not name.strip():
+                raise ValueError("Имя контакта обязательно.")
+            changes["name"] = name.strip()
+        if phone is not None:
+            changes["phone"] = phone.strip()
+        if email is not None:
+            changes["email"] = email.strip()
+        contact = manager.contacts.update(contact["id"], changes)
+        manager.storage.update(contact)
+        return contact
+
+    def delete_contact(self, contact_id):
+        """Удаление контакта; возвращает True, если контакт был."""
+        manager = self._manager("contacts")
+        if manager.contacts.remove(int(contact_id)) is None:
+            return False
+        manager.storage.delete(int(contact_id))
+        return True
+
+    def import_contacts(self, filename, batch_size=1000):
+        """Импорт контактов из CSV (совпадающие по телефону или почте объединяются); возвращает сводку."""
+        manager = self._manager("contacts")
+        return self._import(manager, manager.contacts, filename, batch_size,
+                            fingerprints=manager.fingerprints, merge=True)
+
+    def export_contacts(self, filename):
+        """Экспорт контактов в CSV/JSONL/gzip (по расширению); возвращает сводку."""
+        manager = self._manager("contacts")
+        return self._export(manager, manager.contacts, filename)
+
+    # Финансы
+
+    def add_record(self, amount, category, date, description="", force=False):
+        """Добавление финансовой записи; возвращает созданную запись.
+
+        Точная копия существующей записи добавляется только с force=True.
+        """
+        force = parse_flag(force, "force")
+        manager = self._manager("finance")
+        record = manager.parse_csv_row({"amount": str(amount), "category": category,
+                                        "date": date, "description": description})
+        if record["amount"] == 0:
+            raise ValueError("Сумма не может быть равной нулю.")
+        duplicate = manager.fingerprints.find(record)
+        if duplicate is not None and not force:
+            raise ValueError(f"Такая операция уже есть (ID {duplicate}). Для повторного добавления укажите force.")
+        record = {"id": manager.records.ids.allocate(), **record}
+        manager.records.add(record)
+        manager.storage.insert(record)
+        return record
+
+    def get_record(self, record_id):
+        """Финансовая запись по ID."""
+        return self._find(self._manager("finance").records, record_id, "Запись с таким ID не найдена.")
+
+    def list_records(self, category=None, date_from=None, date_to=None):
+        """Записи с необязательными фильтрами по категории и периоду (ДД-ММ-ГГГГ)."""
+        manager = self._manager("finance")
+        return list(manager.filter_records(category, None if date_from is None else self._date(date_from),
+                                           None if date_to is None else self._date(date_to)))
+
+    def balance(self):
+        """Общий баланс."""
+        return self._manager("finance").ledger.balance
+
+    def totals_by_category(self):
+        """Итоги по категориям."""
+        return dict(self._manager("finance").ledger.by_category)
+
+    def totals_by_month(self):
+        """Итоги по месяцам (ключ ММ-ГГГГ)."""
+        return dict(self._manager("finance").ledger.by_month)
+
+    def import_records(self, filename, batch_size=1000, workers=None):
+        """Импорт финансовых записей из CSV без дубликатов; большой файл разбирается workers процессами (None - все процессоры)."""
+        manager = self._manager("finance")
+        return self._import(manager, manager.records, filename, batch_size, workers, manager.fingerprints)
+
+    def export_records(self, filename, category=None, date_from=None, date_to=None, shard_size=None, workers=None):
+        """Экспорт финансовых записей с фильтрами; shard_size - разбиение на части пулом процессов."""
+        manager = self._manager("finance")
+        records = manager.filter_records(category, None if date_from is None else self._date(date_from),
+                                         None if date_to is None else self._date(date_to))
+        return self._export(manager, records, filename, shard_size, workers)
+
+    # Калькулятор
+
+    def calculate(self, expression, variables=None):
+        """Значение арифметического выражения; ошибки - ExpressionError."""
+        if self._calculator is None:
+            self._calculator = ExpressionEngine()
+        try:
+            return self._calculator.evaluate(expression, variables)
+        except ZeroDivisionError:
+            raise ExpressionError("Деление на ноль!")
+
+
+COMMANDS = {
+    "add_task", "get_task", "list_tasks", "mark_task_done", "edit_task", "delete_task",
+    "import_tasks", "export_tasks",
+    "add_note", "get_note", "list_notes", "search_notes", "edit_note", "delete_note",
+    "import_notes", "export_notes",
+    "add_contact", "get_contact", "search_contacts", "edit_contact", "delete_contact",
+    "import_contacts", "export_contacts",
+    "add_record", "get_record", "list_records", "balance", "totals_by_category", "totals_by_month",
+    "import_records", "export_records",
+    "calculate",
+}
+
+
+def run_batch(lines, output, service=None, stop_on_error=False):
+    """Выполнение команд JSON Lines с одной загрузкой и одной фиксацией.
+
+    Каждая строка - объект {"command": имя, ...аргументы}. На каждую команду
+    в output пишется строка {"ok": true, "result": ...} или {"ok": false,
+    "error": текст}. Ответы пишутся после фиксации: если она не удалась
+    (например, ConflictError), успешные команды тоже сообщаются ошибкой, ведь
+    их изменения не сохранены. Возвращает число ошибок.
+    """
+    service = service or AssistantService()
+    responses = []
+    try:
+        try:
+            with service.batch():
+                for line_num, line in enumerate(lines, 1):
+                    if not line.strip() or line.lstrip().startswith("#"):
+                        continue
+                    response = _run_line(service, line_num, line)
+                    responses.append((line_num, response))
+                    if not response["ok"] and stop_on_error:
+                        break
+        except (StorageError, OSError) as e:
+            responses = [(line_num, {"ok": False, "error": f"Строка {line_num}: изменения не сохранены ({e})."})
+                         if response["ok"] else (line_num, response) for line_num, response in responses]
+    finally:
+        service.close()
+    errors = 0
+    for _, response in responses:
+        output.write(json.dumps(response, ensure_ascii=False) + "\n")
+        if not response["ok"]:
+            errors += 1
+    return errors
+
+
+def _run_line(service, line_num, line):
+    """Выполнение одной строки пакета; ответ {"ok": ..., "result" или "error": ...}."""
+    try:
+        arguments = json.loads(line)
+        if not isinstance(arguments, dict):
+            raise ValueError("строка должна быть JSON-объектом.")
+        command = arguments.pop("command")
+        return {"ok": True, "result": service.execute(command, **arguments)}
+    except json.JSONDecodeError as e:
+        return {"ok": False, "error": f"Строка {line_num}: некорректный JSON ({e.msg})."}
+    except KeyError as e:
+        message = e.args[0] if e.args and e.args[0] != "command" else "не указана команда."
+        return {"ok": False, "error": f"Строка {line_num}: {message}"}
+    except TypeError as e:
+        return {"ok": False, "error": f"Строка {line_num}: неверные аргументы команды ({e})."}
+    except (ValueError, ExpressionError, StorageError, OSError) as e:
+        return {"ok": False, "error": f"Строка {line_num}: {e}"}
+    except (RecursionError, MemoryError):
+        return {"ok": False, "error": f"Строка {line_num}: слишком сложная команда или выражение."}
+
+
+def main(argv):
+    """Пакетный режим: python AssistantService.py команды.jsonl (или - для stdin) [--stop-on-error]."""
+    arguments = [argument for argument in argv[1:] if argument != "--stop-on-error"]
+    if len(arguments) != 1:
+        print("Использование: python AssistantService.py (commands.jsonl | -) [--stop-on-error]")
+        return 2
+    stop_on_error = "--stop-on-error" in argv
+    if arguments[0] == "-":
+        errors = run_batch(sys.stdin, sys.stdout, stop_on_error=stop_on_error)
+    else:
+        with open(arguments[0], "r", encoding="utf-8") as file:
+            errors = run_batch(file, sys.stdout, stop_on_error=stop_on_error)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,292 @@
+import ast
+import sys
+import csv
+import json
+import math
+from itertools import islice
+from ExpressionEngine import (ExpressionEngine, ExpressionError, BINARY_OPERATORS, UNARY_OPERATORS, CONSTANTS,
+                              MAX_ROUND_DIGITS)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Функции, которые в ExpressionEngine всегда возвращают целое число (round - без числа знаков)
+INTEGER_FUNCTIONS = {"floor", "ceil", "factorial"}
+# Функции, возвращающие целое для целого аргумента
+SAME_TYPE_FUNCTIONS = {"abs"}
+# Целые больше 2**53 float хранит неточно: такие строки считаются по одной
+MAX_EXACT_INTEGER = 2 ** 53
+
+if np is not None:
+    VECTOR_FUNCTIONS = {
+        "abs": np.abs,
+        "sqrt": np.sqrt,
+        "exp": np.exp,
+        "log": lambda value, base=None: np.log(value) if base is None else np.log(value) / np.log(base),
+        "log10": np.log10,
+        "log2": np.log2,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "asin": np.arcsin,
+        "acos": np.arccos,
+        "atan": np.arctan,
+        "floor": np.floor,
+        "ceil": np.ceil,
+        "factorial": np.vectorize(lambda value: _factorial(value), otypes=[float]),
+    }
+
+
+def _factorial(value):
+    # Факториал больше 170! не помещается в float; nan и inf - признак того,
+    # что строку нужно пересчитать по одной (см. evaluate_batch)
+    if not 0 <= value <= 170 or not float(value).is_integer():
+        return math.inf if value > 170 else math.nan
+    return float(math.factorial(int(value)))
+
+
+def _select(values, better):
+    """min/max как у Python: первое из лучших значений вместе с признаком целого.
+
+    values - пары (массив, признак целого). better(b, a) - маска строк, где b
+    строго лучше a; при равенстве остаётся первое значение, как у min и max.
+    """
+    result, ints = values[0]
+    for value, value_ints in values[1:]:
+        mask = better(value, result)
+        result = np.where(mask, value, result)
+        ints = np.where(mask, value_ints, ints)
+    return result, ints
+
+
+def _round_to(ndigits):
+    """round(x, ndigits) поэлементно встроенным round: np.round округляет иначе (2.675 -> 2.68)."""
+    round_one = np.frompyfunc(lambda value: round(value, ndigits), 1, 1)
+    return lambda values: np.asarray(round_one(values), dtype=np.float64)
+
+
+class _NotVectorizable(Exception):
+    """Выражение нельзя вычислить над столбцами (например, число знаков round - переменная)."""
+
+
+class BatchEvaluator:
+    """Вычисление одного выражения по потоку строк с переменными.
+
+    Выражение разбирается один раз. Строки читаются пакетами по batch_size;
+    при наличии NumPy пакет превращается в столбцы-массивы и выражение
+    вычисляется над ними целиком, без NumPy - по строкам скомпилированным
+    деревом ExpressionEngine. Строки, для которых NumPy дал inf или nan
+    (деление на ноль, корень из отрицательного, переполнение), пересчитываются
+    по одной, так что текст ошибки в обоих режимах одинаковый. Вместе со
+    значениями отслеживается, целое ли число дал бы ExpressionEngine (round,
+    floor, целые константы), поэтому и типы результатов совпадают. Результаты
+    отдаются генератором, поэтому поток любой длины не загружается в память
+    целиком.
+    """
+
+    def __init__(self, expression, batch_size=10000, engine=None):
+        self.expression = (engine or ExpressionEngine()).compile(expression)
+        self.names = sorted(self.expression.names)
+        self.batch_size = batch_size
+        self._vector = None
+        if np is not None:
+            try:
+                self._vector = self._compile_vector(self.expression.tree)
+            except _NotVectorizable:
+                pass
+
+    def evaluate(self, rows):
+        """Генератор пар (строка, результат); для неверной строки результат - текст ошибки."""
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield from zip(batch, self.evaluate_batch(batch))
+
+    def evaluate_batch(self, batch):
+        """Результаты выражения для пакета строк."""
+        columns = {name: [] for name in self.names}
+        errors = {}
+        for i, row in enumerate(batch):
+            for name in self.names:
+                try:
+                    columns[name].append(float(row[name]))
+                except KeyError:
+                    errors[i] = f"Нет значения переменной '{name}'."
+                    columns[name].append(math.nan)
+                except (TypeError, ValueError):
+                    errors[i] = f"Некорректное значение переменной '{name}'."
+                    columns[name].append(math.nan)
+
+        results = self._evaluate_vector(columns, errors, len(batch)) if self._vector is not None else None
+        if results is None:
+            results = [self._evaluate_row(columns, i) for i in range(len(batch))]
+        for i, message in errors.items():
+            results[i] = message
+        return results
+
+    def _evaluate_vector(self, columns, errors, size):
+        """Результаты пакета через NumPy или None, если пакет нужно считать по строкам."""
+        try:
+            with np.errstate(all="ignore"):
+                arrays = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+                values, ints = self._vector(arrays)
+                values = np.broadcast_to(np.asarray(values, dtype=np.float64), (size,))
+                ints = np.broadcast_to(ints, (size,))
+                invalid = ~np.isfinite(values) | (ints & (np.abs(values) > MAX_EXACT_INTEGER))
+        except (ArithmeticError, TypeError, ValueError):
+            # Целые константы слишком велики для float или делятся на ноль
+            return None
+        results = values.tolist()
+        for i in np.flatnonzero(ints & ~invalid).tolist():
+            results[i] = int(results[i])
+        for i in np.flatnonzero(invalid).tolist():
+            if i not in errors:
+                results[i] = self._evaluate_row(columns, i)
+        return results
+
+    def _evaluate_row(self, columns, i):
+        """Результат выражения для одной строки пакета или текст ошибки."""
+        try:
+            return self.expression.evaluate({name: columns[name][i] for name in self.names})
+        except ZeroDivisionError:
+            return "Деление на ноль!"
+        except ExpressionError as e:
+            return str(e)
+
+    def _compile_vector(self, node):
+        """Перевод дерева выражения в функцию над столбцами NumPy.
+
+        Функция возвращает пару (значения, признак целого): признак - bool или
+        булев массив и показывает, что ExpressionEngine дал бы в этой строке
+        int, а не float. Узлы уже проверены ExpressionEngine, поэтому здесь
+        встречаются только разрешённые конструкции.
+        """
+        if isinstance(node, ast.Constant):
+            value = node.value
+            ints = isinstance(value, int)
+            return lambda columns: (value, ints)
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                value = CONSTANTS[node.id]
+                return lambda columns: (value, False)
+            name = node.id
+            return lambda columns: (columns[name], False)
+        if isinstance(node, ast.BinOp):
+            function = BINARY_OPERATORS[type(node.op)]
+            left = self._compile_vector(node.left)
+            right = self._compile_vector(node.right)
+            if isinstance(node.op, ast.Div):
+                return lambda columns: (function(left(columns)[0], right(columns)[0]), False)
+            if isinstance(node.op, ast.Pow):
+                # Целое в отрицательной степени - float; дробная степень
+                # отрицательной константы - complex, строка пересчитается по одной
+                def power(columns):
+                    (a, a_ints), (b, b_ints) = left(columns), right(columns)
+                    result = function(a, b)
+                    if isinstance(result, complex):
+                        result = math.nan
+                    return result, a_ints & b_ints & (b >= 0)
+                return power
+
+            def binary(columns):
+                (a, a_ints), (b, b_ints) = left(columns), right(columns)
+                return function(a, b), a_ints & b_ints
+            return binary
+        if isinstance(node, ast.UnaryOp):
+            function = UNARY_OPERATORS[type(node.op)]
+            operand = self._compile_vector(node.operand)
+
+            def unary(columns):
+                value, ints = operand(columns)
+                return function(value), ints
+            return unary
+
+        name = node.func.id
+        arguments = [self._compile_vector(argument) for argument in node.args]
+        if name in ("min", "max"):
+            better = np.less if name == "min" else np.greater
+            return lambda columns: _select([argument(columns) for argument in arguments], better)
+        if name == "round":
+            return self._compile_round(node, arguments)
+        function = VECTOR_FUNCTIONS[name]
+
+        def call(columns):
+            values = [argument(columns) for argument in arguments]
+            result = function(*(value for value, _ in values))
+            if name in INTEGER_FUNCTIONS:
+                return result, True
+            if name in SAME_TYPE_FUNCTIONS:
+                return result, values[0][1]
+            return result, False
+        return call
+
+    @staticmethod
+    def _compile_round(node, arguments):
+        """round(x) - целое с округлением половин к чётному, round(x, n) - как встроенный round."""
+        if len(arguments) == 1:
+            operand = arguments[0]
+            # np.rint, как и round без числа знаков, округляет половины к чётному
+            return lambda columns: (np.rint(operand(columns)[0]), True)
+        ndigits = node.args[1]
+        if len(arguments) != 2 or not isinstance(ndigits, ast.Constant) or not isinstance(ndigits.value, int):
+            raise _NotVectorizable()
+        if abs(ndigits.value) > MAX_ROUND_DIGITS:
+            raise _NotVectorizable()
+        round_to = _round_to(ndigits.value)
+        operand = arguments[0]
+
+        def rounded(columns):
+            value, ints = operand(columns)
+            return round_to(value), ints
+        return rounded
+
+
+def read_rows(path, format):
+    """Потоковое чтение строк с переменными из CSV или JSONL."""
+    if format == "csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as file:
+            yield from csv.DictReader(file)
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def finance_rows(path="finance.json"):
+    """Финансовые записи как строки с переменными (amount, id)."""
+    from Storage import open_storage
+    yield from open_storage(path).load()
+
+
+def main(argv):
+    """Пакетный режим: python BatchEvaluator.py выражение (файл.csv | файл.jsonl | --finance)."""
+    if len(argv) != 3:
+        print("Использование: python BatchEvaluator.py 'amount * 1.2' (rows.csv | rows.jsonl | --finance)")
+        return 2
+    expression, source = argv[1], argv[2]
+    try:
+        evaluator = BatchEvaluator(expression)
+    except ExpressionError as e:
+        print(f"Ошибка: {e}")
+        return 1
+    if source == "--finance":
+        rows = finance_rows()
+    else:
+        rows = read_rows(source, "jsonl" if source.endswith(".jsonl") else "csv")
+
+    writer = None
+    for row, result in evaluator.evaluate(rows):
+        if writer is None:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(row) + ["result"], extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow(dict(row, result=result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,4 +1,27 @@
+from ExpressionEngine import ExpressionEngine, ExpressionError
+
 class Calculator:
+    def __init__(self):
+        self.engine = ExpressionEngine()
+        self.variables = {}
+
+    def calculate(self, line):
+        """Вычисление строки вида 'выражение' или 'имя = выражение'.
+
+        Результат запоминается в переменной ans, присваивание сохраняет
+        значение в указанной переменной.
+        """
+        name, sep, expression = line.partition("=")
+        if sep and name.strip().isidentifier() and not expression.startswith("="):
+            name = name.strip()
+        else:
+            name, expression = None, line
+        result = self.engine.evaluate(expression, self.variables)
+        self.variables["ans"] = result
+        if name is not None:
+            self.variables[name] = result
+        return result
+
     def start_calculator(self):
         print("\nКалькулятор:")
         while True:
@@ -6,9 +29,9 @@ class Calculator:
             if expression.lower() == 'назад':
                 break
             try:
-                result = eval(expression)
+                result = self.calculate(expression)
                 print(f"Результат: {result}")
             except ZeroDivisionError:
                 print("Ошибка: Деление на ноль!")
-            except Exception as e:
-                print(f"Ошибка: {e}")
\ No newline at end of file
+            except ExpressionError as e:
+                print(f"Ошибка: {e}")
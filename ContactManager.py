@@ -1,23 +1,64 @@
-import json
-import csv
-
+from Storage import open_storage
+from CsvImporter import CsvImporter, require_fields, merge_changes
+from RecordExporter import RecordExporter
+from ContactSearchIndex import ContactSearchIndex, fold, digits
+from FingerprintIndex import LazyFingerprintIndex, SqliteFingerprintIndex, contact_keys
+from Metrics import instrumented
+
+@instrumented("contacts")
 class ContactManager:
+    CSV_FIELDS = ["name", "phone", "email"]
+
     def __init__(self):
         self.contacts_file = "contacts.json"
-        self.contacts = self.load_contacts()
+        self.storage = open_storage(self.contacts_file)
+        snapshot = self.storage.load_snapshot()
+        if snapshot is None:
+            self.contacts = self.load_contacts()
+            # Поиск по SQLite выполняет сама база, индекс в памяти не нужен
+            self.index = None if self.storage.supports_queries else ContactSearchIndex.build(self.contacts)
+            fingerprints = None
+        else:
+            self.contacts, self.index, fingerprints = snapshot
+        if self.index is not None:
+            self.contacts.listeners.append(self.index)
+        if self.storage.supports_queries:
+            self._fingerprints = SqliteFingerprintIndex(self.storage, contact_keys)
+        else:
+            # Индекс телефонов и адресов почты читается только при первой проверке дубликата
+            self._fingerprints = LazyFingerprintIndex(self.contacts, self.storage, contact_keys, index=fingerprints)
+        self.contacts.listeners.append(self._fingerprints)
+
+    @property
+    def fingerprints(self):
+        """Индекс телефонов и адресов почты для поиска дубликатов (загружается при первом обращении)."""
+        return self._fingerprints.get()
+
+    def close(self):
+        """Сохранение снимка контактов с индексами для быстрого следующего запуска."""
+        self.storage.save_snapshot((self.contacts, self.index, self._fingerprints.index))
+
+    def save_fingerprints(self):
+        """Сохранение индекса отпечатков рядом с файлом контактов."""
+        self._fingerprints.save()
+
+    def merge_contact(self, contact_id, contact):
+        """Дополнение пустых полей существующего контакта; возвращает контакт и признак изменения."""
+        existing = self.contacts[contact_id]
+        changes = merge_changes(existing, contact)
+        if not changes:
+            return existing, False
+        existing = self.contacts.update(contact_id, changes)
+        self.storage.update(existing)
+        return existing, True
 
     def load_contacts(self):
-        """Загрузка контактов из JSON-файла."""
-        try:
-            with open(self.contacts_file, "r") as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        """Загрузка контактов из JSON-файла с применением журнала изменений."""
+        return self.storage.load()
 
     def save_contacts(self):
-        """Сохранение контактов в JSON-файл."""
-        with open(self.contacts_file, "w") as file:
-            json.dump(self.contacts, file, indent=4)
+        """Полное сохранение контактов в JSON-файл."""
+        self.storage.save(self.contacts)
 
     def add_contact(self):
         """Добавление нового контакта."""
@@ -28,50 +69,83 @@ class ContactManager:
 
         phone = input("Введите номер телефона: ").strip()
         email = input("Введите адрес электронной почты: ").strip()
-        contact_id = len(self.contacts) + 1
-
-        self.contacts.append({
-            "id": contact_id,
+        contact = {
             "name": name,
             "phone": phone,
             "email": email
-        })
-        self.save_contacts()
+        }
+        duplicate = self.fingerprints.find(contact)
+        if duplicate is not None:
+            existing, changed = self.merge_contact(duplicate, contact)
+            print(f"Контакт с таким телефоном или адресом почты уже есть: [{duplicate}] {existing['name']}.")
+            if changed:
+                print("Пустые поля контакта дополнены.")
+            return
+        contact = {"id": self.contacts.ids.allocate(), **contact}
+        self.contacts.add(contact)
+        self.storage.insert(contact)
         print("Контакт добавлен.")
 
     def search_contact(self):
         """Поиск контакта по имени или номеру телефона."""
         query = input("Введите имя или номер телефона для поиска: ").strip()
-        results = [contact for contact in self.contacts if query.lower() in contact["name"].lower() or query in contact["phone"]]
+        if self.storage.supports_queries:
+            self.display_contacts(self.query_contacts(query, prefix=False))
+        else:
+            self.display_contacts(self.index.search(query))
 
-        if not results:
+    def search_contact_prefix(self):
+        """Поиск контакта по началу имени или номера телефона."""
+        query = input("Введите начало имени или номера телефона: ").strip()
+        if self.storage.supports_queries:
+            self.display_contacts(self.query_contacts(query, prefix=True))
+        else:
+            self.display_contacts(self.index.search_prefix(query))
+
+    def query_contacts(self, query, prefix):
+        """Поиск контактов запросом к SQLite; возвращает список ID."""
+        pattern = fold(query).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = pattern + "%" if prefix else f"%{pattern}%"
+        where = "name_folded LIKE ? ESCAPE '\\'"
+        params = [pattern]
+        number = digits(query)
+        if number:
+            where += " OR phone_digits LIKE ?"
+            params.append(number + "%" if prefix else f"%{number}%")
+        return [contact["id"] for contact in self.storage.query(where, params)]
+
+    def display_contacts(self, contact_ids):
+        """Вывод найденных контактов."""
+        if not contact_ids:
             print("Контакты не найдены.")
         else:
-            for contact in results:
+            for contact_id in contact_ids:
+                contact = self.contacts[contact_id]
                 print(f"[{contact['id']}] {contact['name']} - Телефон: {contact['phone']}, Email: {contact['email']}")
 
     def edit_contact(self):
         """Редактирование контакта."""
         try:
             contact_id = int(input("Введите ID контакта для редактирования: "))
-            contact = next(contact for contact in self.contacts if contact["id"] == contact_id)
+            contact = self.contacts[contact_id]
+            changes = {}
 
             print(f"Редактирование контакта: {contact['name']}")
             new_name = input("Введите новое имя (оставьте пустым для сохранения текущего): ").strip()
             if new_name:
-                contact["name"] = new_name
+                changes["name"] = new_name
 
             new_phone = input("Введите новый номер телефона (оставьте пустым для сохранения текущего): ").strip()
             if new_phone:
-                contact["phone"] = new_phone
+                changes["phone"] = new_phone
 
             new_email = input("Введите новый адрес электронной почты (оставьте пустым для сохранения текущего): ").strip()
             if new_email:
-                contact["email"] = new_email
+                changes["email"] = new_email
 
-            self.save_contacts()
+            self.storage.update(self.contacts.update(contact_id, changes))
             print("Контакт обновлен.")
-        except StopIteration:
+        except KeyError:
             print("Контакт с таким ID не найден.")
         except ValueError:
             print("ID должен быть числом.")
@@ -80,46 +154,56 @@ class ContactManager:
         """Удаление контакта."""
         try:
             contact_id = int(input("Введите ID контакта для удаления: "))
-            self.contacts = [contact for contact in self.contacts if contact["id"] != contact_id]
-            self.save_contacts()
+            if self.contacts.remove(contact_id) is not None:
+                self.storage.delete(contact_id)
             print("Контакт удален.")
         except ValueError:
             print("ID должен быть числом.")
 
-    def import_contacts(self):
-        """Импорт контактов из CSV."""
+    @staticmethod
+    def parse_csv_row(row):
+        """Проверка строки CSV и преобразование её в контакт (без ID)."""
+        require_fields(row, ContactManager.CSV_FIELDS)
+        name = row["name"].strip()
+        if not name:
+            raise ValueError("Имя контакта обязательно.")
+        return {
+            "name": name,
+            "phone": row["phone"].strip(),
+            "email": row["email"].strip()
+        }
+
+    def import_contacts(self, batch_size=1000):
+        """Потоковый импорт контактов из CSV с пакетной фиксацией.
+
+        Контакт с уже известным телефоном или адресом почты не дублируется:
+        он дополняет пустые поля существующего.
+        """
         filename = input("Введите имя файла CSV для импорта: ").strip()
+        importer = CsvImporter(self.contacts, self.storage, self.parse_csv_row, self.CSV_FIELDS, batch_size,
+                               fingerprints=self.fingerprints, merge=True)
         try:
-            with open(filename, "r") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    self.contacts.append({
-                        "id": len(self.contacts) + 1,
-                        "name": row["name"],
-                        "phone": row["phone"],
-                        "email": row["email"]
-                    })
-                self.save_contacts()
-                print("Контакты импортированы.")
+            report = importer.run(filename)
         except FileNotFoundError:
             print("Файл не найден.")
-        except KeyError:
-            print("Некорректный формат CSV-файла.")
+            return
+        except ValueError as e:
+            print(f"Некорректный формат CSV-файла. {e}")
+            return
+        print("Контакты импортированы.")
+        report.print_summary()
+        self.save_fingerprints()
 
     def export_contacts(self):
-        """Экспорт контактов в CSV."""
-        filename = input("Введите имя файла CSV для экспорта: ").strip()
-        with open(filename, "w", newline="") as file:
-            fieldnames = ["name", "phone", "email"]
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for contact in self.contacts:
-                writer.writerow({
-                    "name": contact["name"],
-                    "phone": contact["phone"],
-                    "email": contact["email"]
-                })
-            print("Контакты экспортированы.")
+        """Потоковый экспорт контактов в CSV, JSONL или gzip."""
+        filename = input("Введите имя файла для экспорта (.csv, .jsonl, можно добавить .gz): ").strip()
+        try:
+            report = RecordExporter(self.CSV_FIELDS, progress_every=100000).run(self.contacts, filename)
+        except OSError as e:
+            print(f"Не удалось записать файл: {e}")
+            return
+        print("Контакты экспортированы.")
+        report.print_summary()
 
     def manage_contacts(self):
         """Основное меню управления контактами."""
@@ -130,8 +214,9 @@ class ContactManager:
             print("3. Редактировать контакт")
             print("4. Удалить контакт")
             print("5. Импорт контактов из CSV")
-            print("6. Экспорт контактов в CSV")
-            print("7. Назад")
+            print("6. Экспорт контактов (CSV, JSONL, gzip)")
+            print("7. Поиск по началу имени или номера")
+            print("8. Назад")
 
             choice = input("Введите номер действия: ")
 
@@ -148,6 +233,9 @@ class ContactManager:
             elif choice == '6':
                 self.export_contacts()
             elif choice == '7':
+                self.search_contact_prefix()
+            elif choice == '8':
+                self.save_fingerprints()
                 break
             else:
                 print("Неверный выбор.")
@@ -0,0 +1,162 @@
+import re
+import bisect
+from Metrics import metrics
+from SortedKeys import SortedKeys
+
+NON_DIGIT_RE = re.compile(r"\D")
+
+
+def fold(text):
+    """Приведение имени к виду для сравнения без учёта регистра."""
+    return text.casefold().replace("ё", "е")
+
+
+def digits(phone):
+    """Только цифры номера телефона."""
+    return NON_DIGIT_RE.sub("", phone)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PhoneTrie:
+    """Префиксное дерево по цифрам телефонов.
+
+    В каждом узле хранится множество ID контактов, чьи номера проходят через
+    этот узел, поэтому поиск по префиксу стоит O(длины префикса).
+    """
+
+    def __init__(self):
+        self.root = {"ids": set(), "next": {}}
+
+    def add(self, number, contact_id):
+        node = self.root
+        node["ids"].add(contact_id)
+        for digit in number:
+            node = node["next"].setdefault(digit, {"ids": set(), "next": {}})
+            node["ids"].add(contact_id)
+
+    def remove(self, number, contact_id):
+        path = [self.root]
+        for digit in number:
+            node = path[-1]["next"].get(digit)
+            if node is None:
+                break
+            path.append(node)
+        for node in path:
+            node["ids"].discard(contact_id)
+        # Опустевшие ветви удаляются снизу вверх
+        for depth in range(len(path) - 1, 0, -1):
+            if not path[depth]["ids"]:
+                del path[depth - 1]["next"][number[depth - 1]]
+
+    def prefix(self, number):
+        """ID контактов, номер которых начинается с number."""
+        node = self.root
+        for digit in number:
+            node = node["next"].get(digit)
+            if node is None:
+                return set()
+        return node["ids"]
+
+
+class ContactSearchIndex:
+    """Индексы контактов для поиска по подстроке и префиксу.
+
+    Имена хранятся уже приведёнными к нижнему регистру. Подстрока имени
+    ищется по триграммам: пересекаются множества ID для всех триграмм запроса,
+    кандидаты проверяются точным сравнением. Для префикса имени есть
+    отсортированный список, для префикса номера - PhoneTrie, для подстроки
+    номера - триграммы цифр.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.phones = {}
+        self.name_trigrams = {}
+        self.phone_trigrams = {}
+        self.phone_trie = PhoneTrie()
+        self._sorted_names = SortedKeys()
+
+    @classmethod
+    def build(cls, contacts):
+        """Построение индексов по всем контактам."""
+        index = cls()
+        for contact in contacts:
+            index._index(contact)
+        index._sorted_names = SortedKeys((name, contact_id) for contact_id, name in index.names.items())
+        return index
+
+    def _index(self, contact):
+        contact_id = contact["id"]
+        name = fold(contact["name"])
+        number = digits(contact["phone"])
+        self.names[contact_id] = name
+        self.phones[contact_id] = number
+        for gram in trigrams(name):
+            self.name_trigrams.setdefault(gram, set()).add(contact_id)
+        for gram in trigrams(number):
+            self.phone_trigrams.setdefault(gram, set()).add(contact_id)
+        self.phone_trie.add(number, contact_id)
+        return name
+
+    def add(self, contact):
+        """Добавление контакта в индексы."""
+        self._sorted_names.add((self._index(contact), contact["id"]))
+
+    def remove(self, contact):
+        """Удаление контакта из индексов."""
+        contact_id = contact["id"]
+        name = self.names.pop(contact_id, None)
+        number = self.phones.pop(contact_id, None)
+        if name is None:
+            return
+        for gram in trigrams(name):
+            self._discard(self.name_trigrams, gram, contact_id)
+        for gram in trigrams(number):
+            self._discard(self.phone_trigrams, gram, contact_id)
+        self.phone_trie.remove(number, contact_id)
+        self._sorted_names.remove((name, contact_id))
+
+    @staticmethod
+    def _discard(grams, gram, contact_id):
+        ids = grams.get(gram)
+        if ids is not None:
+            ids.discard(contact_id)
+            if not ids:
+                del grams[gram]
+
+    def _substring(self, query, grams, values):
+        if len(query) < 3:
+            # Для коротких запросов триграмм нет, проверяются все значения
+            found = {contact_id for contact_id, value in values.items() if query in value}
+            metrics.scan("contacts.search", len(values), len(found))
+            return found
+        candidates = sorted((grams.get(gram, set()) for gram in trigrams(query)), key=len)
+        ids = set(candidates[0]).intersection(*candidates[1:])
+        found = {contact_id for contact_id in ids if query in values[contact_id]}
+        metrics.scan("contacts.search", len(ids), len(found))
+        return found
+
+    def search(self, query):
+        """ID контактов, в имени или номере которых есть подстрока query."""
+        ids = self._substring(fold(query), self.name_trigrams, self.names)
+        number = digits(query)
+        if number:
+            ids |= self._substring(number, self.phone_trigrams, self.phones)
+        return sorted(ids)
+
+    def search_prefix(self, query):
+        """ID контактов, имя или номер которых начинается с query."""
+        name = fold(query)
+        ids = set()
+        sorted_names = self._sorted_names.ordered()
+        i = bisect.bisect_left(sorted_names, (name,))
+        while i < len(sorted_names) and sorted_names[i][0].startswith(name):
+            ids.add(sorted_names[i][1])
+            i += 1
+        number = digits(query)
+        if number:
+            ids |= self.phone_trie.prefix(number)
+        return sorted(ids)
@@ -0,0 +1,258 @@
+import io
+import os
+import csv
+import time
+from ProcessPool import map_ordered
+
+# Кодировка импортируемых CSV: UTF-8, в которой их пишет RecordExporter;
+# метка BOM в начале (так сохраняет Excel) пропускается
+CSV_ENCODING = "utf-8-sig"
+
+
+class ImportReport:
+    """Итоги импорта: число строк, дубликаты, ошибки по строкам и скорость."""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.merged = 0
+        self.errors = []
+        self.elapsed = 0.0
+        self.workers = 1
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def print_summary(self, max_errors=10):
+        """Вывод итогов импорта."""
+        print(f"Обработано строк: {self.rows}, импортировано: {self.imported}, "
+              f"с ошибками: {len(self.errors)} ({self.rows_per_second:.0f} строк/с"
+              + (f", процессов: {self.workers}" if self.workers > 1 else "") + ").")
+        if self.duplicates:
+            print(f"Дубликатов пропущено: {self.duplicates - self.merged}, объединено: {self.merged}.")
+        for line_num, message in self.errors[:max_errors]:
+            print(f"  Строка {line_num}: {message}")
+        if len(self.errors) > max_errors:
+            print(f"  ... и ещё {len(self.errors) - max_errors} ошибок.")
+
+
+def require_fields(row, fieldnames):
+    """Проверка, что в строке CSV есть все поля: в короткой строке недостающие равны None."""
+    for name in fieldnames:
+        if row.get(name) is None:
+            raise ValueError(f"В строке нет значения столбца '{name}'.")
+
+
+def merge_changes(existing, record):
+    """Поля record, которыми можно дополнить пустые поля существующей записи."""
+    return {field: value for field, value in record.items() if value and not existing.get(field)}
+
+
+def _parse_chunk(filename, start, end, lines, encoding, fieldnames, parse_row):
+    """Разбор части файла [start, end) в процессе пула: (записи, ошибки, число строк).
+
+    lines - число строк файла до части, от него считаются номера строк в ошибках.
+    """
+    with open(filename, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode(encoding)
+    reader = csv.DictReader(io.StringIO(text, newline=""), fieldnames)
+    records = []
+    errors = []
+    rows = 0
+    for row in reader:
+        rows += 1
+        try:
+            records.append(parse_row(row))
+        except (KeyError, ValueError) as e:
+            errors.append((lines + reader.line_num, str(e)))
+    return records, errors, rows
+
+
+def _read_row_end(file, quotes):
+    """Дочитывание текущей строки CSV: байты до её конца включительно (до конца файла, если строка последняя).
+
+    quotes - число кавычек от начала строки до текущей позиции файла.
+    Перевод строки внутри значения в кавычках концом строки не считается:
+    до настоящего конца кавычек чётное число (кавычка внутри значения
+    удваивается). Файл остаётся на начале следующей строки.
+    """
+    tail = []
+    while True:
+        piece = file.read(64 * 1024)
+        if not piece:
+            return b"".join(tail)
+        pos = 0
+        newline = piece.find(b"\n")
+        while newline != -1:
+            quotes += piece.count(b'"', pos, newline)
+            if quotes % 2 == 0:
+                file.seek(newline + 1 - len(piece), os.SEEK_CUR)
+                tail.append(piece[:newline + 1])
+                return b"".join(tail)
+            pos = newline + 1
+            newline = piece.find(b"\n", pos)
+        quotes += piece.count(b'"', pos)
+        tail.append(piece)
+
+
+class CsvImporter:
+    """Потоковый импорт записей из CSV с пакетной фиксацией.
+
+    Строки читаются и проверяются по одной функцией parse_row, которая
+    возвращает запись без ID или выбрасывает KeyError/ValueError. Ошибочные
+    строки попадают в отчёт и не прерывают импорт. Корректные записи
+    фиксируются пакетами по batch_size: блок ID, добавление в коллекцию и
+    одна запись в журнал хранилища на пакет.
+
+    Файл больше parallel_min_size при workers > 1 (None - по числу
+    процессоров) разбирается пулом процессов: он режется на части примерно
+    по chunk_size байт по границам строк, части разбираются и проверяются
+    параллельно, а результаты принимаются в исходном порядке, так что ID и
+    журнал получаются такими же, как при разборе в одном процессе. parse_row
+    в этом режиме должна быть функцией уровня модуля или статическим методом.
+
+    С индексом отпечатков fingerprints (FingerprintIndex, подписанный на
+    коллекцию) каждая строка проверяется на дубликат: он пропускается, а при
+    merge дополняет пустые поля найденной записи.
+    """
+
+    def __init__(self, collection, storage, parse_row, fieldnames, batch_size=1000,
+                 workers=1, chunk_size=4 * 1024 * 1024, parallel_min_size=16 * 1024 * 1024,
+                 fingerprints=None, merge=False):
+        self.collection = collection
+        self.storage = storage
+        self.parse_row = parse_row
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.parallel_min_size = parallel_min_size
+        self.fingerprints = fingerprints
+        self.merge = merge
+        self._seen = {}
+
+    def run(self, filename):
+        """Импорт файла; FileNotFoundError, ValueError для неверного заголовка или файла не в UTF-8."""
+        report = ImportReport()
+        self._seen = {}
+        started = time.perf_counter()
+        try:
+            if self.workers > 1 and os.path.getsize(filename) >= self.parallel_min_size:
+                self._run_parallel(filename, report)
+            else:
+                self._run_sequential(filename, report)
+        except UnicodeDecodeError:
+            raise ValueError(f"Файл {filename} не в кодировке UTF-8, импортировано строк: {report.imported}.")
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _run_sequential(self, filename, report):
+        """Разбор файла в текущем процессе пакетами по batch_size."""
+        with open(filename, "r", encoding=CSV_ENCODING, newline="") as file:
+            reader = csv.DictReader(file)
+            self._check_header(reader.fieldnames)
+
+            batch = []
+            for row in reader:
+                report.rows += 1
+                try:
+                    batch.append(self.parse_row(row))
+                except (KeyError, ValueError) as e:
+                    report.errors.append((reader.line_num, str(e)))
+                    continue
+                if len(batch) >= self.batch_size:
+                    report.imported += self.commit(batch, report)
+                    batch = []
+            report.imported += self.commit(batch, report)
+
+    def _check_header(self, fieldnames):
+        missing = [name for name in self.fieldnames if name not in (fieldnames or [])]
+        if missing:
+            raise ValueError(f"В CSV-файле нет столбцов: {', '.join(missing)}")
+
+    def _run_parallel(self, filename, report):
+        """Разбор частей файла пулом процессов с приёмом результатов по порядку."""
+        report.workers = self.workers
+        batch = []
+        with open(filename, "rb") as file:
+            header = _read_row_end(file, 0)
+            fieldnames = next(csv.reader(io.StringIO(header.decode(CSV_ENCODING), newline="")), None)
+            self._check_header(fieldnames)
+            chunks = ((filename, start, end, lines, "utf-8", fieldnames, self.parse_row)
+                      for start, end, lines in self._chunks(file, len(header), header.count(b"\n")))
+            for result in map_ordered(_parse_chunk, chunks, self.workers):
+                batch = self._accept(report, result, batch)
+        report.imported += self.commit(batch, report)
+
+    def _chunks(self, file, start, lines):
+        """Части файла по целым строкам: (начало, конец, число строк файла до части).
+
+        Файл читается один раз блоками по chunk_size, в основном процессе
+        только считаются кавычки и переводы строк; сами части процессы пула
+        читают из файла по смещениям.
+        """
+        while True:
+            block = file.read(self.chunk_size)
+            if not block:
+                return
+            tail = _read_row_end(file, block.count(b'"'))
+            end = start + len(block) + len(tail)
+            yield start, end, lines
+            lines += block.count(b"\n") + tail.count(b"\n")
+            start = end
+
+    def _accept(self, report, result, batch):
+        """Приём разобранной части: ошибки в отчёт, записи - пакетами."""
+        records, errors, rows = result
+        report.rows += rows
+        report.errors.extend(errors)
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                report.imported += self.commit(batch, report)
+                batch = []
+        return batch
+
+    def commit(self, batch, report):
+        """Фиксация пакета записей одной записью в журнал; возвращает число новых записей."""
+        if not batch:
+            return 0
+        if self.fingerprints is not None:
+            return self._commit_new(batch, report)
+        ids = self.collection.ids.reserve(len(batch))
+        batch = [{"id": record_id, **record} for record_id, record in zip(ids, batch)]
+        for record in batch:
+            self.collection.add(record)
+        self.storage.insert_many(batch)
+        return len(batch)
+
+    def _commit_new(self, batch, report):
+        """Фиксация пакета с проверкой дубликатов по индексу отпечатков.
+
+        Новые записи добавляются в коллекцию по одной, чтобы индекс сразу
+        находил и повторы внутри самого файла.
+        """
+        added = []
+        merged = []
+        for record in batch:
+            duplicate = self.fingerprints.find(record, self._seen)
+            if duplicate is None:
+                record = {"id": self.collection.ids.allocate(), **record}
+                self.collection.add(record)
+                added.append(record)
+                continue
+            report.duplicates += 1
+            if self.merge:
+                changes = merge_changes(self.collection[duplicate], record)
+                if changes:
+                    merged.append(self.collection.update(duplicate, changes))
+                    report.merged += 1
+        with self.storage.batch():
+            if added:
+                self.storage.insert_many(added)
+            for record in merged:
+                self.storage.update(record)
+        return len(added)
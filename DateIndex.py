@@ -0,0 +1,72 @@
+import bisect
+from datetime import date
+from SortedKeys import SortedKeys
+
+
+def to_ordinal(text):
+    """Перевод даты ДД-ММ-ГГГГ в порядковый номер дня; None для неверной даты."""
+    try:
+        if len(text) != 10 or text[2] != "-" or text[5] != "-":
+            return None
+        return date(int(text[6:]), int(text[3:5]), int(text[:2])).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class DateIndex:
+    """Отсортированный индекс записей по полю с датой ДД-ММ-ГГГГ.
+
+    Хранит пары (порядковый номер дня, ID) в SortedKeys, поэтому выборка за
+    период стоит O(log N + k), записи отдаются в порядке дат, а записи,
+    добавленные импортом, вливаются в индекс одним слиянием.
+    Записи с неверной датой в индекс не попадают.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self._keys = SortedKeys()
+
+    @classmethod
+    def build(cls, records, field):
+        """Построение индекса по всем записям одной сортировкой.
+
+        Из коллекции читаются только ID и дата, а различных дат мало по
+        сравнению с числом записей, поэтому каждая разбирается один раз.
+        """
+        index = cls(field)
+        ordinals = {}
+        keys = []
+        for record_id, text in records.values("id", field):
+            ordinal = ordinals.get(text)
+            if ordinal is None and text not in ordinals:
+                ordinal = ordinals[text] = to_ordinal(text)
+            if ordinal is not None:
+                keys.append((ordinal, record_id))
+        index._keys = SortedKeys(keys)
+        return index
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, record):
+        """Добавление записи в индекс."""
+        ordinal = to_ordinal(record[self.field])
+        if ordinal is not None:
+            self._keys.add((ordinal, record["id"]))
+
+    def remove(self, record):
+        """Удаление записи из индекса."""
+        ordinal = to_ordinal(record[self.field])
+        if ordinal is not None:
+            self._keys.remove((ordinal, record["id"]))
+
+    def range(self, start=None, end=None):
+        """ID записей с датой в диапазоне [start, end] в порядке дат.
+
+        Границы - порядковые номера дней, None означает отсутствие границы.
+        """
+        keys = self._keys.ordered()
+        lo = 0 if start is None else bisect.bisect_left(keys, (start,))
+        hi = len(keys) if end is None else bisect.bisect_left(keys, (end + 1,))
+        for i in range(lo, hi):
+            yield keys[i][1]
@@ -0,0 +1,246 @@
+import ast
+import math
+import time
+import threading
+import operator
+from collections import OrderedDict
+
+
+class ExpressionError(Exception):
+    """Ошибка разбора или вычисления выражения."""
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "factorial": math.factorial,
+}
+
+CONSTANTS = {
+    "pi": math.pi,
+    "e": math.e,
+}
+
+MAX_EXPONENT = 10000
+MAX_POWER_BITS = 100000
+MAX_FACTORIAL = 1000
+# Целый результат не длиннее 4000 цифр: больше Python не переводит в строку
+# (ограничение 4300 цифр), и вывод результата упал бы с ValueError
+MAX_RESULT_DIGITS = 4000
+# round(x, n) строит 10**|n| одним вызовом, который не прерывается по времени
+MAX_ROUND_DIGITS = MAX_RESULT_DIGITS
+
+
+class Expression:
+    """Скомпилированное выражение: дерево замыканий, вычисляемое без eval."""
+
+    def __init__(self, text, evaluate, names, tree):
+        self.text = text
+        self._evaluate = evaluate
+        self.names = names
+        self.tree = tree
+
+    def evaluate(self, variables=None, timeout=1.0):
+        """Вычисление выражения с заданными значениями переменных."""
+        deadline = time.monotonic() + timeout
+        try:
+            return check_result(self._evaluate(variables or {}, deadline))
+        except ExpressionError:
+            raise
+        except ZeroDivisionError:
+            raise
+        except OverflowError:
+            raise ExpressionError("Слишком большой результат.")
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(str(e))
+        except (RecursionError, MemoryError):
+            raise ExpressionError("Выражение слишком сложное.")
+
+
+class ExpressionEngine:
+    """Безопасный вычислитель арифметических выражений.
+
+    Выражение разбирается модулем ast, допускаются только числа, переменные,
+    арифметические операции и функции из белого списка. Разобранные
+    выражения хранятся в LRU-кэше по нормализованному тексту, поэтому
+    повторные вычисления не тратят время на разбор. Степени и факториалы
+    ограничены по размеру, а вычисление - по времени.
+    """
+
+    def __init__(self, cache_size=256):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # Вычисления могут идти из нескольких потоков (сервер)
+        self._cache_lock = threading.Lock()
+
+    def compile(self, text):
+        """Разбор выражения с использованием кэша."""
+        key = " ".join(text.split())
+        with self._cache_lock:
+            expression = self._cache.get(key)
+            if expression is not None:
+                self._cache.move_to_end(key)
+                return expression
+        try:
+            tree = ast.parse(key, mode="eval")
+            names = set()
+            expression = Expression(key, self._compile(tree.body, names), frozenset(names), tree.body)
+        except SyntaxError:
+            raise ExpressionError("Синтаксическая ошибка в выражении.")
+        except (RecursionError, MemoryError):
+            # Слишком глубокая вложенность: разбор и компиляция рекурсивны
+            raise ExpressionError("Выражение слишком сложное.")
+        with self._cache_lock:
+            self._cache[key] = expression
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return expression
+
+    def evaluate(self, text, variables=None, timeout=1.0):
+        """Разбор (или взятие из кэша) и вычисление выражения."""
+        return self.compile(text).evaluate(variables, timeout)
+
+    def _compile(self, node, names):
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError("Допускаются только числа.")
+            value = node.value
+            return lambda variables, deadline: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in CONSTANTS:
+                value = CONSTANTS[name]
+                return lambda variables, deadline: value
+            names.add(name)
+
+            def load(variables, deadline):
+                try:
+                    return variables[name]
+                except KeyError:
+                    raise ExpressionError(f"Неизвестная переменная '{name}'.")
+            return load
+
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            function = BINARY_OPERATORS[type(node.op)]
+            left = self._compile(node.left, names)
+            right = self._compile(node.right, names)
+            if function is operator.pow:
+                function = checked_pow
+
+            def binary(variables, deadline):
+                a = left(variables, deadline)
+                b = right(variables, deadline)
+                check_deadline(deadline)
+                return function(a, b)
+            return binary
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            function = UNARY_OPERATORS[type(node.op)]
+            operand = self._compile(node.operand, names)
+            return lambda variables, deadline: function(operand(variables, deadline))
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            name = node.func.id
+            if name not in FUNCTIONS:
+                raise ExpressionError(f"Неизвестная функция '{name}'.")
+            function = CHECKED_FUNCTIONS.get(name, FUNCTIONS[name])
+            arguments = [self._compile(argument, names) for argument in node.args]
+
+            def call(variables, deadline):
+                values = [argument(variables, deadline) for argument in arguments]
+                check_deadline(deadline)
+                return function(*values)
+            return call
+
+        raise ExpressionError("Недопустимая конструкция в выражении.")
+
+
+def check_deadline(deadline):
+    if time.monotonic() > deadline:
+        raise ExpressionError("Превышено время вычисления.")
+
+
+def check_result(value):
+    """Проверка результата: конечное действительное число, целое - не длиннее MAX_RESULT_DIGITS цифр."""
+    # Число битов - быстрая оценка сверху без перевода числа в строку
+    if isinstance(value, int) and value.bit_length() * math.log10(2) > MAX_RESULT_DIGITS:
+        raise ExpressionError("Слишком большой результат.")
+    if isinstance(value, complex):
+        raise ExpressionError("Результат не является действительным числом.")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ExpressionError("Результат не является конечным числом.")
+    return value
+
+
+def checked_pow(base, exponent):
+    """Возведение в степень с ограничением размера результата."""
+    if isinstance(base, int) and isinstance(exponent, int) and abs(base) > 1:
+        if (abs(exponent) > MAX_EXPONENT or exponent * base.bit_length() > MAX_POWER_BITS
+                or exponent * math.log10(abs(base)) > MAX_RESULT_DIGITS):
+            raise ExpressionError("Слишком большая степень.")
+    result = operator.pow(base, exponent)
+    # Дробная степень отрицательного числа в Python - комплексное число
+    if isinstance(result, complex):
+        raise ExpressionError("Результат не является действительным числом.")
+    return result
+
+
+def checked_factorial(value):
+    """Факториал с ограничением аргумента; дробное число с нулевой дробной частью считается целым."""
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ExpressionError("Факториал определён только для целых чисел.")
+        value = int(value)
+    if value > MAX_FACTORIAL:
+        raise ExpressionError("Слишком большой аргумент факториала.")
+    return math.factorial(value)
+
+
+def checked_round(value, ndigits=None):
+    """Округление с ограничением числа знаков; дробное число с нулевой дробной частью считается целым."""
+    if ndigits is None:
+        return round(value)
+    if isinstance(ndigits, float):
+        if not ndigits.is_integer():
+            raise ExpressionError("Число знаков округления должно быть целым.")
+        ndigits = int(ndigits)
+    if abs(ndigits) > MAX_ROUND_DIGITS:
+        raise ExpressionError("Слишком большое число знаков округления.")
+    return round(value, ndigits)
+
+
+CHECKED_FUNCTIONS = {
+    "factorial": checked_factorial,
+    "round": checked_round,
+}
@@ -0,0 +1,46 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """Рекомендательная блокировка файла данных между процессами.
+
+    Используется отдельный файл <путь>.lock, потому что файлы данных
+    заменяются переименованием. Читатели берут разделяемую блокировку и не
+    мешают друг другу, писатель - исключительную. Внутри процесса потоки
+    должны упорядочиваться своей блокировкой до взятия этой. Без fcntl
+    (Windows) блокировка ничего не делает.
+    """
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+
+    @contextmanager
+    def shared(self):
+        """Блокировка для чтения."""
+        with self._locked(fcntl.LOCK_SH if fcntl else None):
+            yield
+
+    @contextmanager
+    def exclusive(self):
+        """Блокировка для записи."""
+        with self._locked(fcntl.LOCK_EX if fcntl else None):
+            yield
+
+    @contextmanager
+    def _locked(self, operation):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            # Закрытие дескриптора снимает блокировку
+            os.close(fd)
@@ -0,0 +1,140 @@
+from IdSequence import IdSequence
+
+
+class FileRecordCollection:
+    """Коллекция поверх двоичного файла RecordFile с ленивым чтением записей.
+
+    Записи файла не превращаются в словари при загрузке: запись собирается
+    из столбцов при обращении к ней. Изменения после загрузки лежат поверх
+    файла: изменённые записи - в changed, новые - в added, ID удалённых
+    записей файла - в removed. Интерфейс и порядок обхода совпадают с
+    RecordCollection (записи файла по порядку, затем добавленные).
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.ids = IdSequence(file.next_id)
+        self.listeners = []
+        self.renumbered = []
+        self.changed = {}
+        self.added = {}
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.file) - len(self.removed) + len(self.added)
+
+    def __iter__(self):
+        ids = self.file.column("id")
+        for row in range(len(self.file)):
+            record_id = ids[row]
+            if record_id in self.removed:
+                continue
+            record = self.changed.get(record_id)
+            yield self.file.record(row) if record is None else record
+        yield from list(self.added.values())
+
+    def __contains__(self, record_id):
+        return self._row(record_id) is not None or record_id in self.added
+
+    def __getitem__(self, record_id):
+        record = self.get(record_id)
+        if record is None:
+            raise KeyError(record_id)
+        return record
+
+    def get(self, record_id, default=None):
+        """Поиск записи по ID."""
+        record = self.added.get(record_id)
+        if record is not None:
+            return record
+        record = self.changed.get(record_id)
+        if record is not None:
+            return record
+        row = self._row(record_id)
+        return default if row is None else self.file.record(row)
+
+    def values(self, *fields):
+        """Кортежи значений нескольких полей fields всех записей.
+
+        Значения берутся прямо из столбцов файла, остальные поля не
+        декодируются, поэтому индекс по датам или статусам строится без
+        сборки всех записей.
+        """
+        kinds = dict(self.file.fields)
+        columns = []
+        for name in fields:
+            if kinds[name] == "text":
+                columns.append(self.file.texts(name))
+            elif kinds[name] == "symbol":
+                columns.append(map(self.file.symbols(name).__getitem__, self.file.column(name)))
+            elif kinds[name] == "bool":
+                columns.append(map(bool, self.file.column(name)))
+            else:
+                columns.append(self.file.column(name))
+        if not self.removed and not self.changed:
+            yield from zip(*columns)
+        else:
+            for record_id, values in zip(self.file.column("id"), zip(*columns)):
+                if record_id in self.removed:
+                    continue
+                record = self.changed.get(record_id)
+                yield values if record is None else tuple(record[name] for name in fields)
+        for record in list(self.added.values()):
+            yield tuple(record[name] for name in fields)
+
+    def add(self, record):
+        """Добавление новой записи."""
+        record_id = record["id"]
+        if record_id in self:
+            raise KeyError(record_id)
+        self.added[record_id] = record
+        self.ids.advance(record_id + 1)
+        for listener in self.listeners:
+            listener.add(record)
+
+    def put(self, record):
+        """Добавление записи или замена существующей с тем же ID."""
+        old = self.get(record["id"])
+        if old is None:
+            self.add(record)
+            return
+        self._set(record)
+        for listener in self.listeners:
+            listener.remove(old)
+            listener.add(record)
+
+    def update(self, record_id, changes):
+        """Изменение полей записи; KeyError, если записи нет."""
+        record = self[record_id]
+        old = dict(record)
+        record.update(changes)
+        self._set(record)
+        for listener in self.listeners:
+            listener.remove(old)
+            listener.add(record)
+        return record
+
+    def remove(self, record_id):
+        """Удаление записи; возвращает удалённую запись или None."""
+        record = self.added.pop(record_id, None)
+        if record is None:
+            record = self.get(record_id)
+            if record is None:
+                return None
+            self.changed.pop(record_id, None)
+            self.removed.add(record_id)
+        for listener in self.listeners:
+            listener.remove(record)
+        return record
+
+    def _set(self, record):
+        if record["id"] in self.added:
+            self.added[record["id"]] = record
+        else:
+            self.changed[record["id"]] = record
+
+    def _row(self, record_id):
+        """Строка живой записи файла или None."""
+        if record_id in self.removed:
+            return None
+        return self.file.find(record_id)
@@ -0,0 +1,366 @@
+from array import array
+from bisect import bisect_left
+from datetime import date
+from itertools import compress
+from operator import itemgetter
+from IdSequence import IdSequence
+from DateIndex import to_ordinal
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class FinanceColumns:
+    """Колоночное хранилище финансовых записей.
+
+    Суммы лежат в типизированном массиве, даты - порядковыми номерами дней,
+    категории - кодами из словаря. Записи наружу отдаются словарями, которые
+    собираются по требованию, а итоги (баланс, суммы по категориям и месяцам,
+    выборка за период) считаются векторно: через NumPy, если он установлен,
+    иначе проходом по массивам модуля array.
+
+    Интерфейс совпадает с RecordCollection. Удалённые строки помечаются в
+    маске live и вычищаются, когда их становится больше половины.
+    """
+
+    def __init__(self, records=()):
+        self.ids = IdSequence()
+        self.listeners = []
+        self.renumbered = []
+        self.category_names = []
+        self._category_codes = {}
+        self._rows = {}
+        self._raw_dates = {}
+        self._clear()
+        file = getattr(records, "file", None)
+        if file is not None:
+            # Двоичный файл: столбцы копируются целиком, поверх - изменения после загрузки
+            self._load(file)
+            for record_id in records.removed:
+                self.remove(record_id)
+            for record in records.changed.values():
+                self.update(record["id"], record)
+            for record in records.added.values():
+                self.add(record)
+        else:
+            for record in records:
+                self.add(record)
+        if hasattr(records, "ids"):
+            self.ids.advance(records.ids.next_id)
+
+    def _clear(self):
+        self._id = array("q")
+        self._amount = array("d")
+        self._date = array("l")
+        self._month = array("l")
+        self._category = array("l")
+        self._description = []
+        self._live = bytearray()
+
+    def _load(self, file):
+        """Заполнение столбцов из RecordFile без сборки записей.
+
+        Категории и даты в файле уже закодированы словарём, поэтому разбираются
+        только различные даты, а коды переводятся в номера дней таблицей.
+        """
+        count = len(file)
+        self._id.frombytes(file.column("id").cast("B"))
+        self._amount.frombytes(file.column("amount").cast("B"))
+        self.category_names = list(file.symbols("category"))
+        self._category_codes = {name: code for code, name in enumerate(self.category_names)}
+        self._category = self._lookup(range(len(self.category_names)), file.column("category"))
+
+        dates = file.symbols("date")
+        ordinals = [to_ordinal(text) for text in dates]
+        months = [-1 if ordinal is None else self._month_of(ordinal) for ordinal in ordinals]
+        codes = file.column("date")
+        self._date = self._lookup([ordinal or 0 for ordinal in ordinals], codes)
+        self._month = self._lookup(months, codes)
+        invalid = {code for code, ordinal in enumerate(ordinals) if ordinal is None}
+        if invalid:
+            if np is not None:
+                rows = np.flatnonzero(np.isin(np.frombuffer(codes, dtype=np.uint32), list(invalid)))
+            else:
+                rows = [row for row, code in enumerate(codes) if code in invalid]
+            for row in rows:
+                self._raw_dates[int(row)] = dates[codes[row]]
+
+        self._description = file.texts("description")
+        self._live = bytearray(b"\x01") * count
+        if file.sorted:
+            self._rows = _FileRows(self._id, self._live)
+        else:
+            self._rows = dict(zip(self._id, range(count)))
+
+    @staticmethod
+    def _lookup(table, codes):
+        """Массив значений table по кодам словаря."""
+        column = array("l")
+        if np is not None:
+            column.frombytes(np.asarray(table, dtype="l")[np.frombuffer(codes, dtype=np.uint32)].tobytes())
+        else:
+            column.extend(map(table.__getitem__, codes))
+        return column
+
+    @staticmethod
+    def _month_of(ordinal):
+        day = date.fromordinal(ordinal)
+        return day.year * 12 + day.month - 1
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        for row in self._rows.values():
+            yield self._record(row)
+
+    def __contains__(self, record_id):
+        return record_id in self._rows
+
+    def __getitem__(self, record_id):
+        return self._record(self._rows[record_id])
+
+    def get(self, record_id, default=None):
+        """Поиск записи по ID."""
+        row = self._rows.get(record_id)
+        return default if row is None else self._record(row)
+
+    def values(self, *fields):
+        """Кортежи значений нескольких полей fields всех записей."""
+        return map(itemgetter(*fields), self)
+
+    def add(self, record):
+        """Добавление новой записи."""
+        record_id = record["id"]
+        if record_id in self._rows:
+            raise KeyError(record_id)
+        row = len(self._id)
+        self._id.append(record_id)
+        self._amount.append(0.0)
+        self._date.append(0)
+        self._month.append(0)
+        self._category.append(0)
+        self._description.append("")
+        self._live.append(1)
+        self._rows[record_id] = row
+        self._store(row, record)
+        self.ids.advance(record_id + 1)
+        for listener in self.listeners:
+            listener.add(record)
+
+    def put(self, record):
+        """Добавление записи или замена существующей с тем же ID."""
+        if record["id"] in self._rows:
+            self.update(record["id"], record)
+        else:
+            self.add(record)
+
+    def update(self, record_id, changes):
+        """Изменение полей записи; KeyError, если записи нет."""
+        row = self._rows[record_id]
+        old = self._record(row)
+        record = dict(old, **changes)
+        self._store(row, record)
+        for listener in self.listeners:
+            listener.remove(old)
+            listener.add(record)
+        return record
+
+    def remove(self, record_id):
+        """Удаление записи; возвращает удалённую запись или None."""
+        row = self._rows.pop(record_id, None)
+        if row is None:
+            return None
+        record = self._record(row)
+        self._live[row] = 0
+        self._description[row] = ""
+        self._raw_dates.pop(row, None)
+        if len(self._rows) * 2 < len(self._id):
+            self._vacuum()
+        for listener in self.listeners:
+            listener.remove(record)
+        return record
+
+    def __getstate__(self):
+        # Подписчики в снимок не попадают, как и у RecordCollection
+        state = dict(self.__dict__)
+        state["listeners"] = []
+        return state
+
+    def _store(self, row, record):
+        self._amount[row] = record["amount"]
+        ordinal = to_ordinal(record["date"])
+        if ordinal is None:
+            # Неверную дату храним как есть, в выборки по датам она не попадает
+            self._raw_dates[row] = record["date"]
+            self._date[row] = 0
+            self._month[row] = -1
+        else:
+            self._raw_dates.pop(row, None)
+            self._date[row] = ordinal
+            self._month[row] = self._month_of(ordinal)
+        self._category[row] = self._code(record["category"])
+        self._description[row] = record["description"]
+
+    def _code(self, category):
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+
+    def _record(self, row):
+        ordinal = self._date[row]
+        return {
+            "id": self._id[row],
+            "amount": self._amount[row],
+            "category": self.category_names[self._category[row]],
+            "date": self._raw_dates[row] if row in self._raw_dates else date.fromordinal(ordinal).strftime("%d-%m-%Y"),
+            "description": self._description[row]
+        }
+
+    def _vacuum(self):
+        """Удаление помеченных строк из массивов."""
+        records = list(self)
+        self._rows = {}
+        self._raw_dates = {}
+        self._clear()
+        for row, record in enumerate(records):
+            self._id.append(record["id"])
+            self._amount.append(0.0)
+            self._date.append(0)
+            self._month.append(0)
+            self._category.append(0)
+            self._description.append("")
+            self._live.append(1)
+            self._rows[record["id"]] = row
+            self._store(row, record)
+
+    @property
+    def balance(self):
+        """Общий баланс по живым строкам."""
+        if np is not None:
+            return float(self._view(self._amount)[self._mask()].sum())
+        return sum(compress(self._amount, self._live))
+
+    @property
+    def by_category(self):
+        """Суммы по категориям в порядке появления категорий."""
+        return self._group(self._category, 0, self.category_names)
+
+    @property
+    def by_month(self):
+        """Суммы по месяцам с ключами ММ-ГГГГ."""
+        if np is not None:
+            months = self._view(self._month)[self._mask()]
+            months = months[months >= 0]
+            if not len(months):
+                return {}
+            first, last = int(months.min()), int(months.max())
+        else:
+            months = [month for month in compress(self._month, self._live) if month >= 0]
+            if not months:
+                return {}
+            first, last = min(months), max(months)
+        names = [f"{month % 12 + 1:02d}-{month // 12}" for month in range(first, last + 1)]
+        return self._group(self._month, first, names)
+
+    def _group(self, codes, offset, names):
+        if np is not None:
+            mask = self._mask()
+            keys = self._view(codes)[mask] - offset
+            amounts = self._view(self._amount)[mask]
+            valid = keys >= 0
+            totals = np.bincount(keys[valid], weights=amounts[valid], minlength=len(names))
+            counts = np.bincount(keys[valid], minlength=len(names))
+            return {names[i]: float(totals[i]) for i in np.flatnonzero(counts)}
+        totals = {}
+        for code, amount, live in zip(codes, self._amount, self._live):
+            if live and code >= offset:
+                totals[code - offset] = totals.get(code - offset, 0.0) + amount
+        return {names[code]: totals[code] for code in sorted(totals)}
+
+    def range(self, start=None, end=None):
+        """ID записей с датой в диапазоне [start, end] в порядке дат."""
+        start = 1 if start is None else start
+        end = date.max.toordinal() if end is None else end
+        if np is not None:
+            dates = self._view(self._date)
+            rows = np.flatnonzero(self._mask() & (dates >= start) & (dates <= end))
+            rows = rows[np.argsort(dates[rows], kind="stable")]
+            # Представление держит буфер массива, его нужно отпустить до выдачи строк
+            del dates
+        else:
+            rows = [row for row, day in enumerate(self._date) if self._live[row] and start <= day <= end]
+            rows.sort(key=self._date.__getitem__)
+        for row in rows:
+            yield self._id[int(row)]
+
+    def _mask(self):
+        return np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+
+    @staticmethod
+    def _view(column):
+        return np.frombuffer(column, dtype=column.typecode)
+
+
+class _FileRows:
+    """Отображение ID -> строка для строк, загруженных из файла с упорядоченными ID.
+
+    Вместо словаря на все строки используется бинарный поиск по столбцу ID,
+    удалённые строки отсекаются маской live. Словарь хранит только строки,
+    добавленные после загрузки.
+    """
+
+    def __init__(self, ids, live):
+        self._ids = ids
+        self._live = live
+        self._count = len(ids)
+        self._removed = 0
+        self._extra = {}
+
+    def __len__(self):
+        return self._count - self._removed + len(self._extra)
+
+    def __contains__(self, record_id):
+        return self.get(record_id) is not None
+
+    def __getitem__(self, record_id):
+        row = self.get(record_id)
+        if row is None:
+            raise KeyError(record_id)
+        return row
+
+    def __setitem__(self, record_id, row):
+        self._extra[record_id] = row
+
+    def get(self, record_id, default=None):
+        row = self._extra.get(record_id)
+        if row is None:
+            row = self._find(record_id)
+        return default if row is None else row
+
+    def pop(self, record_id, default=None):
+        row = self._extra.pop(record_id, None)
+        if row is not None:
+            return row
+        row = self._find(record_id)
+        if row is None:
+            return default
+        # Строку помечает удалённой в маске live вызывающий код
+        self._removed += 1
+        return row
+
+    def values(self):
+        for row in range(self._count):
+            if self._live[row]:
+                yield row
+        yield from list(self._extra.values())
+
+    def _find(self, record_id):
+        row = bisect_left(self._ids, record_id, 0, self._count)
+        if row < self._count and self._ids[row] == record_id and self._live[row]:
+            return row
+        return None
@@ -0,0 +1,122 @@
+class FinanceLedger:
+    """Материализованные итоги по финансовым записям.
+
+    Баланс, суммы по категориям, месяцам и дням пересчитываются инкрементно
+    при каждом добавлении и удалении записи, поэтому запросы к ним не
+    требуют прохода по всем записям. Счётчики записей нужны, чтобы убирать
+    опустевшие группы.
+    """
+
+    def __init__(self):
+        self.balance = 0.0
+        self.count = 0
+        self.by_category = {}
+        self.by_month = {}
+        self.by_day = {}
+        self._counts = {"category": {}, "month": {}, "day": {}}
+
+    @classmethod
+    def build(cls, records):
+        """Построение итогов по всем записям."""
+        ledger = cls()
+        for record in records:
+            ledger.add(record)
+        return ledger
+
+    @classmethod
+    def from_dict(cls, data):
+        """Восстановление итогов из сохранённого словаря."""
+        ledger = cls()
+        ledger.balance = data["balance"]
+        ledger.count = data["count"]
+        ledger.by_category = data["by_category"]
+        ledger.by_month = data["by_month"]
+        ledger.by_day = data["by_day"]
+        ledger._counts = data["counts"]
+        return ledger
+
+    def to_dict(self):
+        """Словарь для сохранения на диск."""
+        return {
+            "balance": self.balance,
+            "count": self.count,
+            "by_category": self.by_category,
+            "by_month": self.by_month,
+            "by_day": self.by_day,
+            "counts": self._counts
+        }
+
+    def add(self, record):
+        """Учёт новой записи."""
+        self._apply(record, 1)
+
+    def remove(self, record):
+        """Исключение записи из итогов."""
+        self._apply(record, -1)
+
+    def _apply(self, record, sign):
+        amount = sign * record["amount"]
+        self.balance += amount
+        self.count += sign
+        date = record["date"]
+        # Дата хранится как ДД-ММ-ГГГГ, месяц - как ММ-ГГГГ
+        self._bump("category", self.by_category, record["category"], amount, sign)
+        self._bump("month", self.by_month, date[3:], amount, sign)
+        self._bump("day", self.by_day, date, amount, sign)
+        if self.count == 0:
+            self.balance = 0.0
+
+    def _bump(self, group, totals, key, amount, sign):
+        counts = self._counts[group]
+        counts[key] = counts.get(key, 0) + sign
+        if counts[key] <= 0:
+            del counts[key]
+            totals.pop(key, None)
+        else:
+            totals[key] = totals.get(key, 0.0) + amount
+
+
+class SqliteLedger:
+    """Итоги финансовых записей, которые считает SQLite.
+
+    Ключи групп те же, что у FinanceLedger: категория, месяц ММ-ГГГГ и день
+    ДД-ММ-ГГГГ. Итог считается агрегатным запросом к таблице и хранится до
+    изменения версии коллекции в базе, поэтому в памяти нет итогов по всем
+    группам сразу и не нужна подписка на коллекцию.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._totals = {}
+        self._state = None
+
+    @property
+    def balance(self):
+        return self._total("TOTAL(amount)")
+
+    @property
+    def count(self):
+        return self._total("COUNT(*)")
+
+    @property
+    def by_category(self):
+        return self._total("TOTAL(amount)", "category")
+
+    @property
+    def by_month(self):
+        # Дата хранится как ДД-ММ-ГГГГ, месяц - как ММ-ГГГГ
+        return self._total("TOTAL(amount)", "substr(date, 4)")
+
+    @property
+    def by_day(self):
+        return self._total("TOTAL(amount)", "date")
+
+    def _total(self, expression, group_by=None):
+        state = self.storage.state()
+        if state != self._state:
+            self._totals = {}
+            self._state = state
+        key = expression, group_by
+        if key not in self._totals:
+            self._totals[key] = self.storage.aggregate(expression, group_by)
+        return self._totals[key]
@@ -1,24 +1,94 @@
-import json
-import csv
-from collections import defaultdict
+import os
+from datetime import datetime
+from Storage import open_storage
+from CsvImporter import CsvImporter, require_fields
+from RecordExporter import RecordExporter
+from FinanceLedger import FinanceLedger, SqliteLedger
+from DateIndex import DateIndex, to_ordinal
+from FingerprintIndex import LazyFingerprintIndex, SqliteFingerprintIndex, finance_keys
+from ContactSearchIndex import fold
+from Metrics import metrics, instrumented
 
+@instrumented("finance")
 class FinanceManager:
-    def __init__(self):
+    CSV_FIELDS = ["amount", "category", "date", "description"]
+
+    def __init__(self, columnar=None):
         self.finance_file = "finance.json"
-        self.records = self.load_records()
+        self.storage = open_storage(self.finance_file)
+        if columnar is None:
+            columnar = os.environ.get("FINANCE_COLUMNAR") == "1"
+        self.columnar = columnar
+        snapshot = self.storage.load_snapshot()
+        if snapshot is not None and snapshot[0] != columnar:
+            snapshot = None
+        fingerprints = None
+        if columnar:
+            # Колоночное хранилище само векторно считает итоги и выборки по датам.
+            # Модуль тянет NumPy, поэтому импортируется только в этом режиме
+            from FinanceColumns import FinanceColumns
+            if snapshot is None:
+                self.records = FinanceColumns(self.load_records())
+            else:
+                _, self.records, fingerprints = snapshot
+            self.ledger = self.dates = self.records
+        else:
+            if snapshot is None:
+                self.records = self.load_records()
+            else:
+                _, self.records, self.ledger, self.dates, fingerprints = snapshot
+            if self.storage.supports_queries:
+                # Итоги и выборки по датам на SQLite считает сама база, в памяти их нет
+                self.ledger = SqliteLedger(self.storage)
+                self.dates = None
+            else:
+                if snapshot is None:
+                    self.ledger = self.load_ledger()
+                    self.dates = DateIndex.build(self.records, "date")
+                self.records.listeners.append(self.ledger)
+                self.records.listeners.append(self.dates)
+        if self.storage.supports_queries:
+            self._fingerprints = SqliteFingerprintIndex(self.storage, finance_keys, multiset=True)
+        else:
+            # Индекс отпечатков читается только при первой проверке дубликата
+            self._fingerprints = LazyFingerprintIndex(self.records, self.storage, finance_keys, multiset=True,
+                                                      index=fingerprints)
+        self.records.listeners.append(self._fingerprints)
+
+    @property
+    def fingerprints(self):
+        """Индекс отпечатков для поиска дубликатов (загружается при первом обращении)."""
+        return self._fingerprints.get()
+
+    def close(self):
+        """Сохранение снимка записей с итогами и индексами для быстрого следующего запуска."""
+        fingerprints = self._fingerprints.index
+        if self.columnar:
+            self.storage.save_snapshot((True, self.records, fingerprints))
+        else:
+            self.storage.save_snapshot((False, self.records, self.ledger, self.dates, fingerprints))
 
     def load_records(self):
-        """Загрузка финансовых записей из JSON-файла."""
-        try:
-            with open(self.finance_file, "r") as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        """Загрузка финансовых записей из JSON-файла с применением журнала изменений."""
+        return self.storage.load()
 
     def save_records(self):
-        """Сохранение финансовых записей в JSON-файл."""
-        with open(self.finance_file, "w") as file:
-            json.dump(self.records, file, indent=4)
+        """Полное сохранение финансовых записей в JSON-файл."""
+        self.storage.save(self.records)
+
+    def load_ledger(self):
+        """Загрузка сохранённых итогов или их построение по записям."""
+        data = self.storage.load_derived("ledger")
+        if data is None:
+            return FinanceLedger.build(self.records)
+        return FinanceLedger.from_dict(data)
+
+    def save_ledger(self):
+        """Сохранение итогов и индекса отпечатков рядом с файлом записей."""
+        self._fingerprints.save()
+        if self.columnar or self.storage.supports_queries:
+            return
+        self.storage.save_derived("ledger", self.ledger.to_dict())
 
     def add_record(self):
         """Добавление новой финансовой записи."""
@@ -30,19 +100,27 @@ class FinanceManager:
 
             category = input("Введите категорию операции (например, 'Еда', 'Транспорт'): ").strip()
             date = input("Введите дату операции (ДД-ММ-ГГГГ): ").strip()
+            if to_ordinal(date) is None:
+                print("Неверный формат даты. Используйте ДД-ММ-ГГГГ.")
+                return
             description = input("Введите описание операции: ").strip()
 
-            record_id = len(self.records) + 1
-
-            self.records.append({
-                "id": record_id,
+            record = {
                 "amount": amount,
                 "category": category,
                 "date": date,
                 "description": description
-            })
+            }
+            duplicate = self.fingerprints.find(record)
+            if duplicate is not None:
+                answer = input(f"Такая операция уже есть (ID {duplicate}). Всё равно добавить? (да/нет): ")
+                if answer.strip().lower() != "да":
+                    print("Запись не добавлена.")
+                    return
+            record = {"id": self.records.ids.allocate(), **record}
 
-            self.save_records()
+            self.records.add(record)
+            self.storage.insert(record)
             print("Финансовая запись добавлена.")
         except ValueError:
             print("Ошибка ввода суммы. Пожалуйста, введите корректное число.")
@@ -59,85 +137,165 @@ class FinanceManager:
             self.display_records(self.records)
         elif choice == '2':
             category = input("Введите категорию для фильтрации: ").strip()
-            filtered_records = [record for record in self.records if record["category"].lower() == category.lower()]
-            self.display_records(filtered_records)
+            self.display_records(self.records_in_category(category))
         elif choice == '3':
-            date = input("Введите дату для фильтрации (ДД-ММ-ГГГГ): ").strip()
-            filtered_records = [record for record in self.records if record["date"] == date]
-            self.display_records(filtered_records)
+            ordinal = to_ordinal(input("Введите дату для фильтрации (ДД-ММ-ГГГГ): ").strip())
+            if ordinal is None:
+                print("Неверный формат даты. Используйте ДД-ММ-ГГГГ.")
+                return
+            self.display_records(self.records_between(ordinal, ordinal))
         else:
             print("Неверный выбор.")
 
-    def display_records(self, records):
-        """Вывод всех записей."""
-        if not records:
-            print("Нет записей для отображения.")
-            return
+    def display_records(self, records, empty_message="Нет записей для отображения."):
+        """Вывод записей по мере их получения из последовательности или генератора."""
+        shown = 0
         for record in records:
             print(f"[{record['id']}] {record['amount']} | {record['category']} | {record['date']} | {record['description']}")
+            shown += 1
+        if not shown:
+            print(empty_message)
+
+    def records_between(self, start, end):
+        """Записи за период [start, end] (порядковые номера дней) в порядке дат."""
+        if self.storage.supports_queries:
+            yield from self.storage.query("date_ordinal BETWEEN ? AND ?", (start, end), "date_ordinal, id")
+            return
+        for record_id in self.dates.range(start, end):
+            yield self.records[record_id]
+
+    def records_in_category(self, category):
+        """Записи категории без учёта регистра."""
+        if self.storage.supports_queries:
+            return self.storage.query("category_folded = ?", (fold(category),))
+        return self._scan_category(self.records, category, "finance.category")
+
+    def filter_records(self, category=None, start=None, end=None):
+        """Записи с необязательными фильтрами по категории и периоду (порядковые номера дней)."""
+        if start is None and end is None:
+            return self.records if category is None else self.records_in_category(category)
+        records = self.records_between(0 if start is None else start, 10 ** 9 if end is None else end)
+        if category is not None:
+            records = self._scan_category(records, category, "finance.period_category")
+        return records
+
+    @staticmethod
+    def _scan_category(records, category, metric):
+        """Фильтр по категории полным проходом с учётом просмотренных и выданных записей."""
+        category = category.lower()
+        scanned = returned = 0
+        for record in records:
+            scanned += 1
+            if record["category"].lower() == category:
+                returned += 1
+                yield record
+        metrics.scan(metric, scanned, returned)
 
     def generate_report(self):
         """Генерация отчёта о финансовой активности за определённый период."""
-        start_date = input("Введите начальную дату (ДД-ММ-ГГГГ): ").strip()
-        end_date = input("Введите конечную дату (ДД-ММ-ГГГГ): ").strip()
-
-        report_records = [record for record in self.records if start_date <= record["date"] <= end_date]
+        start = to_ordinal(input("Введите начальную дату (ДД-ММ-ГГГГ): ").strip())
+        end = to_ordinal(input("Введите конечную дату (ДД-ММ-ГГГГ): ").strip())
+        if start is None or end is None:
+            print("Неверный формат даты. Используйте ДД-ММ-ГГГГ.")
+            return
 
-        if not report_records:
-            print("Нет записей за указанный период.")
-        else:
-            self.display_records(report_records)
+        self.display_records(self.records_between(start, end), "Нет записей за указанный период.")
 
     def calculate_balance(self):
         """Подсчёт общего баланса (доходы минус расходы)."""
-        balance = sum(record["amount"] for record in self.records)
-        print(f"Общий баланс: {balance:.2f} руб.")
+        print(f"Общий баланс: {self.ledger.balance:.2f} руб.")
 
     def group_by_category(self):
         """Группировка расходов и доходов по категориям."""
-        categories = defaultdict(float)
-        for record in self.records:
-            categories[record["category"]] += record["amount"]
-
-        for category, total in categories.items():
+        for category, total in self.ledger.by_category.items():
             print(f"{category}: {total:.2f} руб.")
 
-    def import_records(self):
-        """Импорт финансовых записей из CSV."""
+    def group_by_month(self):
+        """Итоги доходов и расходов по месяцам."""
+        if not self.ledger.by_month:
+            print("Нет записей для отображения.")
+            return
+        # Ключ месяца имеет вид ММ-ГГГГ, сортируем по году, затем по месяцу
+        for month in sorted(self.ledger.by_month, key=lambda key: (key[3:], key[:2])):
+            print(f"{month}: {self.ledger.by_month[month]:.2f} руб.")
+
+    @staticmethod
+    def parse_csv_row(row):
+        """Проверка строки CSV и преобразование её в финансовую запись (без ID)."""
+        require_fields(row, FinanceManager.CSV_FIELDS)
+        try:
+            amount = float(row["amount"])
+        except ValueError:
+            raise ValueError(f"Некорректная сумма '{row['amount']}'.")
+        try:
+            datetime.strptime(row["date"], "%d-%m-%Y")  # Проверка формата даты
+        except ValueError:
+            raise ValueError(f"Неверный формат даты '{row['date']}'. Используйте ДД-ММ-ГГГГ.")
+        return {
+            "amount": amount,
+            "category": row["category"].strip(),
+            "date": row["date"],
+            "description": row["description"]
+        }
+
+    def import_records(self, batch_size=1000):
+        """Потоковый импорт финансовых записей из CSV с пакетной фиксацией.
+
+        Большие выписки разбираются и проверяются параллельно всеми процессорами.
+        Операции, которые уже есть (повторный импорт той же выписки), пропускаются.
+        """
         filename = input("Введите имя файла CSV для импорта: ").strip()
+        importer = CsvImporter(self.records, self.storage, self.parse_csv_row, self.CSV_FIELDS, batch_size,
+                               workers=None, fingerprints=self.fingerprints)
         try:
-            with open(filename, "r") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    self.records.append({
-                        "id": len(self.records) + 1,
-                        "amount": float(row["amount"]),
-                        "category": row["category"],
-                        "date": row["date"],
-                        "description": row["description"]
-                    })
-                self.save_records()
-                print("Записи успешно импортированы.")
+            report = importer.run(filename)
         except FileNotFoundError:
             print("Файл не найден.")
-        except KeyError:
-            print("Некорректный формат CSV-файла.")
+            return
+        except ValueError as e:
+            print(f"Некорректный формат CSV-файла. {e}")
+            return
+        print("Записи успешно импортированы.")
+        report.print_summary()
+        self.save_ledger()
 
     def export_records(self):
-        """Экспорт финансовых записей в CSV."""
-        filename = input("Введите имя файла CSV для экспорта: ").strip()
-        with open(filename, "w", newline="") as file:
-            fieldnames = ["amount", "category", "date", "description"]
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in self.records:
-                writer.writerow({
-                    "amount": record["amount"],
-                    "category": record["category"],
-                    "date": record["date"],
-                    "description": record["description"]
-                })
-            print("Записи успешно экспортированы.")
+        """Потоковый экспорт финансовых записей в CSV, JSONL или gzip.
+
+        Можно ограничить категорию и период, а большой экспорт разбить на
+        части, которые записывает пул процессов.
+        """
+        filename = input("Введите имя файла для экспорта (.csv, .jsonl, можно добавить .gz): ").strip()
+        category = input("Категория (пусто - все): ").strip() or None
+        bounds = []
+        for prompt in ("Начальная дата (ДД-ММ-ГГГГ, пусто - без ограничения): ",
+                       "Конечная дата (ДД-ММ-ГГГГ, пусто - без ограничения): "):
+            text = input(prompt).strip()
+            bounds.append(to_ordinal(text) if text else None)
+            if text and bounds[-1] is None:
+                print("Неверный формат даты. Используйте ДД-ММ-ГГГГ.")
+                return
+        shard_text = input("Записей в одном файле (пусто - всё в один файл): ").strip()
+        try:
+            shard_size = int(shard_text) if shard_text else None
+            if shard_size is not None and shard_size <= 0:
+                raise ValueError
+        except ValueError:
+            print("Размер части должен быть положительным числом.")
+            return
+
+        records = self.filter_records(category, *bounds)
+        exporter = RecordExporter(self.CSV_FIELDS, progress_every=100000)
+        try:
+            if shard_size is None:
+                report = exporter.run(records, filename)
+            else:
+                report = exporter.run_sharded(records, filename, shard_size)
+        except OSError as e:
+            print(f"Не удалось записать файл: {e}")
+            return
+        print("Записи успешно экспортированы.")
+        report.print_summary()
 
     def manage_finances(self):
         """Основное меню управления финансовыми записями."""
@@ -149,8 +307,9 @@ class FinanceManager:
             print("4. Подсчёт баланса")
             print("5. Группировка по категориям")
             print("6. Импорт записей из CSV")
-            print("7. Экспорт записей в CSV")
-            print("8. Назад")
+            print("7. Экспорт записей (CSV, JSONL, gzip)")
+            print("8. Итоги по месяцам")
+            print("9. Назад")
 
             choice = input("Введите номер действия: ")
 
@@ -169,6 +328,9 @@ class FinanceManager:
             elif choice == '7':
                 self.export_records()
             elif choice == '8':
+                self.group_by_month()
+            elif choice == '9':
+                self.save_ledger()
                 break
             else:
                 print("Неверный выбор.")
@@ -0,0 +1,211 @@
+import hashlib
+from ContactSearchIndex import fold, digits
+
+
+def finance_keys(record):
+    """Отпечаток финансовой записи: хэш суммы, даты, категории и описания.
+
+    Сумма берётся с точностью до копеек, категория - без учёта регистра,
+    так что "10" и "10.00" в разных выгрузках дают один отпечаток.
+    """
+    text = f"{record['amount']:.2f}|{record['date']}|{fold(record['category'].strip())}|{record['description'].strip()}"
+    return (hashlib.blake2b(text.encode(), digest_size=8).hexdigest(),)
+
+
+def contact_keys(record):
+    """Ключи контакта: нормализованный номер телефона и адрес почты.
+
+    Номера приводятся к виду 7XXXXXXXXXX (8 в начале и номер без кода
+    страны считаются российскими), адрес почты - к нижнему регистру.
+    """
+    keys = []
+    number = digits(record["phone"])
+    if len(number) == 11 and number[0] == "8":
+        number = "7" + number[1:]
+    elif len(number) == 10:
+        number = "7" + number
+    if len(number) >= 5:
+        keys.append("phone:" + number)
+    email = record["email"].strip().casefold()
+    if "@" in email:
+        keys.append("email:" + email)
+    return keys
+
+
+class FingerprintIndex:
+    """Индекс отпечатков записей для поиска дубликатов за O(1).
+
+    Функция keys выдаёт для записи её ключи (отпечатки), индекс хранит
+    словарь ключ -> ID записей с этим ключом и обновляется через listeners
+    коллекции. Проверка новой записи - несколько обращений к словарю, без
+    прохода по коллекции.
+    """
+
+    def __init__(self, keys, multiset=False):
+        self.keys = keys
+        self.multiset = multiset
+        self._ids = {}
+
+    @classmethod
+    def build(cls, records, keys, multiset=False):
+        """Построение индекса по всем записям."""
+        index = cls(keys, multiset)
+        for record in records:
+            index.add(record)
+        return index
+
+    @classmethod
+    def from_dict(cls, data, keys, multiset=False):
+        """Восстановление индекса из сохранённого словаря."""
+        index = cls(keys, multiset)
+        index._ids = data["ids"]
+        return index
+
+    def to_dict(self):
+        """Словарь для сохранения на диск."""
+        return {"ids": self._ids}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, record):
+        """Добавление записи в индекс."""
+        for key in self.keys(record):
+            ids = self._ids.get(key)
+            if ids is None:
+                self._ids[key] = [record["id"]]
+            else:
+                ids.append(record["id"])
+
+    def remove(self, record):
+        """Удаление записи из индекса."""
+        for key in self.keys(record):
+            ids = self._ids.get(key)
+            if ids is not None and record["id"] in ids:
+                ids.remove(record["id"])
+                if not ids:
+                    del self._ids[key]
+
+    def find(self, record, seen=None):
+        """ID существующей записи-дубликата или None.
+
+        Без seen и для контактов дубликат - запись с любым общим ключом.
+        Финансовые операции могут законно повторяться (две одинаковые покупки
+        за день), поэтому при импорте в режиме multiset учитывается, сколько
+        раз отпечаток уже встретился в файле: seen - общий для всего импорта
+        словарь. n-я строка с отпечатком считается дубликатом, только если
+        до импорта записей с ним было не меньше n. Так повторный импорт той
+        же выписки пропускается целиком, а одинаковые строки новой выписки
+        сохраняются.
+        """
+        for key in self.keys(record):
+            ids = self._lookup(key)
+            if not self.multiset or seen is None:
+                if ids:
+                    return ids[0]
+                continue
+            counts = seen.get(key)
+            if counts is None:
+                counts = seen[key] = [len(ids) if ids else 0, 0]
+            occurrence = counts[1]
+            counts[1] += 1
+            if occurrence < counts[0]:
+                return ids[occurrence]
+        return None
+
+    def _lookup(self, key):
+        return self._ids.get(key)
+
+
+class LazyFingerprintIndex:
+    """Индекс отпечатков, который читается с диска при первом обращении.
+
+    Сохранённый индекс большой (на 500 тысяч записей - около 15 МБ JSON), а
+    нужен только при добавлении, импорте и слиянии записей, поэтому при
+    запуске менеджера не загружается. До загрузки объект подписан на
+    коллекцию вместо индекса и только отмечает изменения: если записи
+    менялись в памяти, сохранённый файл им уже не соответствует, и индекс
+    строится по записям.
+    """
+
+    def __init__(self, records, storage, keys, multiset=False, index=None):
+        self.records = records
+        self.storage = storage
+        self.keys = keys
+        self.multiset = multiset
+        self.index = index
+        self.changed = False
+
+    def add(self, record):
+        if self.index is None:
+            self.changed = True
+        else:
+            self.index.add(record)
+
+    def remove(self, record):
+        if self.index is None:
+            self.changed = True
+        else:
+            self.index.remove(record)
+
+    def get(self):
+        """Индекс отпечатков: сохранённый, если он соответствует данным, иначе построенный по записям."""
+        if self.index is None:
+            data = None if self.changed else self.storage.load_derived("fingerprints")
+            if data is None:
+                self.index = FingerprintIndex.build(self.records, self.keys, self.multiset)
+            else:
+                self.index = FingerprintIndex.from_dict(data, self.keys, self.multiset)
+        return self.index
+
+    def save(self):
+        """Сохранение индекса, если он загружался: иначе он не менялся с прошлого сохранения."""
+        if self.index is not None:
+            self.storage.save_derived("fingerprints", self.index.to_dict())
+
+
+class SqliteFingerprintIndex(FingerprintIndex):
+    """Поиск дубликатов запросом к SQLite вместо индекса в памяти.
+
+    Отпечатки хранятся в вычисляемых столбцах таблицы с индексами, поэтому
+    проверка записи - запрос по индексу базы. В памяти остаются только
+    записи, добавленные в коллекцию, но ещё не записанные в базу (повторы
+    внутри пакета импорта): они сбрасываются, как только меняется версия
+    коллекции в базе. Интерфейс загрузки совпадает с LazyFingerprintIndex.
+    """
+
+    def __init__(self, storage, keys, multiset=False):
+        super().__init__(keys, multiset)
+        self.storage = storage
+        self.index = None
+        self._version = storage.version
+
+    def get(self):
+        return self
+
+    def save(self):
+        """Отпечатки лежат в таблице, сохранять нечего."""
+
+    def add(self, record):
+        self._check_version()
+        super().add(record)
+
+    def remove(self, record):
+        self._check_version()
+        super().remove(record)
+
+    def find(self, record, seen=None):
+        self._check_version()
+        return super().find(record, seen)
+
+    def _check_version(self):
+        if self.storage.version != self._version:
+            self._ids = {}
+            self._version = self.storage.version
+
+    def _lookup(self, key):
+        ids = self.storage.fingerprint_ids(key)
+        pending = self._ids.get(key)
+        if pending:
+            ids.extend(record_id for record_id in pending if record_id not in ids)
+        return ids
@@ -0,0 +1,26 @@
+class IdSequence:
+    """Монотонная последовательность ID коллекции.
+
+    Хранит следующий свободный ID (верхнюю границу выданных номеров), поэтому
+    номера удалённых записей больше никогда не выдаются повторно.
+    """
+
+    def __init__(self, next_id=1):
+        self.next_id = next_id
+
+    def allocate(self):
+        """Выдача одного нового ID за O(1)."""
+        record_id = self.next_id
+        self.next_id += 1
+        return record_id
+
+    def reserve(self, count):
+        """Резервирование блока из count подряд идущих ID."""
+        start = self.next_id
+        self.next_id += count
+        return range(start, self.next_id)
+
+    def advance(self, next_id):
+        """Сдвиг границы, если она меньше next_id."""
+        if next_id > self.next_id:
+            self.next_id = next_id
@@ -0,0 +1,482 @@
+import gc
+import json
+import os
+import mmap
+import pickle
+import struct
+import hashlib
+import threading
+from contextlib import contextmanager
+from RecordCollection import RecordCollection
+from RecordFile import RecordFile, FIELDS, MAGIC
+from FileRecordCollection import FileRecordCollection
+from FileLock import FileLock
+from StorageError import StorageError, ConflictError
+from Metrics import metrics
+
+# Версия формата снимка; снимки других версий игнорируются
+SNAPSHOT_VERSION = 3
+
+
+class JournalStorage:
+    """Хранилище записей: базовый файл плюс журнал изменений.
+
+    Базовый файл пишется в формате format: json или binary (компактный
+    столбцовый RecordFile, читается через mmap лениво). При чтении формат
+    определяется по содержимому, поэтому смена формата не требует
+    конвертации: файл перепишется в новом формате при ближайшем сохранении
+    или сжатии журнала. Журнал всегда состоит из строк JSON.
+
+    Файлы можно использовать из нескольких процессов. Чтение идёт под
+    разделяемой блокировкой FileLock, запись - под исключительной. Перед
+    каждой записью проверяется, что файлы на диске не менялись с момента
+    загрузки (оптимистическая проверка версии); иначе запись отклоняется
+    ConflictError, а хранилище помечается устаревшим (stale) и должно быть
+    перечитано. Повреждённый файл даёт StorageError, а не пустой список.
+
+    Для быстрого запуска менеджер может сохранить снимок: коллекцию вместе
+    с индексами в pickle-файле <path>.snapshot. Снимок действителен, пока
+    базовый файл и журнал на диске не менялись (совпадают inode, время
+    модификации и размер), и читается без разбора JSON и построения индексов.
+    """
+
+    supports_queries = False
+
+    def __init__(self, path, compact_size=1024 * 1024, format="json", collection=None):
+        if format not in ("json", "binary"):
+            raise ValueError(f"Неизвестный формат файла данных: {format}")
+        self.path = path
+        self.format = format
+        if format == "binary":
+            self.fields = FIELDS[collection or os.path.splitext(os.path.basename(path))[0]]
+        self.journal_path = path + ".journal"
+        self.pending_path = self.journal_path + ".tmp"
+        self.snapshot_path = path + ".snapshot"
+        self.compact_size = compact_size
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(path)
+        self._journal_size = 0
+        self._base_sha1 = None
+        self._base_stat = None
+        self._compactor = None
+        self._batch = None
+        self._snapshot_files = None
+        self.stale = False
+        self._metric = "storage." + os.path.splitext(os.path.basename(path))[0]
+
+    def load(self):
+        """Загрузка базового файла и применение журнала."""
+        with metrics.timer(self._metric + ".load"):
+            return self._load()
+
+    def _load(self):
+        with self._lock:
+            with self._file_lock.shared():
+                state = self._read_state()
+            if state is None:
+                # Прерванная запись: восстановление под исключительной блокировкой
+                with self._file_lock.exclusive():
+                    self._recover()
+                    state = self._read_state()
+            data, self._base_sha1, self._base_stat, entries, self._journal_size = state
+            self.stale = False
+        records = self._replay(self._parse_base(data), entries)
+        if records.renumbered:
+            self.save(records)
+        return records
+
+    def insert(self, record):
+        """Запись в журнал добавления новой записи."""
+        self._log([{"op": "insert", "record": record}])
+
+    def insert_many(self, records):
+        """Запись в журнал пакета новых записей одной операцией записи."""
+        self._log([{"op": "insert", "record": record} for record in records])
+
+    def update(self, record):
+        """Запись в журнал изменения записи."""
+        self._log([{"op": "update", "record": record}])
+
+    def delete(self, record_id):
+        """Запись в журнал удаления записи."""
+        self._log([{"op": "delete", "id": record_id}])
+
+    @contextmanager
+    def batch(self):
+        """Группировка изменений: журнал дописывается один раз при выходе из блока."""
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+        finally:
+            entries, self._batch = self._batch, None
+            if entries:
+                self._append(entries)
+
+    def save(self, records):
+        """Полная перезапись базового файла с очисткой журнала."""
+        self.wait()
+        with metrics.timer(self._metric + ".save"):
+            self._save(records)
+
+    def _save(self, records):
+        base = self._dump(records)
+        with self._lock, self._file_lock.exclusive():
+            self._check()
+            if self._batch:
+                # Полная запись включает все отложенные изменения
+                self._batch = []
+            self._commit(base, b"", records.ids.next_id)
+
+    def state(self):
+        """Отпечаток состояния файлов: контрольная сумма базы и размер журнала."""
+        with self._lock:
+            return [self._base_sha1, self._journal_size]
+
+    def fingerprint(self):
+        """Время модификации и размер файлов на диске (для кэша менеджеров)."""
+        self.wait()
+        stats = []
+        for path in (self.path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return stats
+
+    def load_derived(self, name):
+        """Загрузка производных данных, если они соответствуют текущему состоянию."""
+        try:
+            with open(f"{self.path}.{name}", "rb") as file:
+                data = file.read()
+            derived = json.loads(data)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        metrics.add(self._metric + ".bytes_read", len(data))
+        if derived.get("state") != self.state():
+            return None
+        return derived["data"]
+
+    def save_derived(self, name, data):
+        """Сохранение производных данных (индексов, агрегатов) рядом с записями."""
+        derived = json.dumps({"state": self.state(), "data": data}, ensure_ascii=False).encode()
+        # Временный файл свой у каждого процесса, итоговый заменяется атомарно
+        temp_path = f"{self.path}.{name}.{os.getpid()}.tmp"
+        self._write_file(temp_path, derived)
+        metrics.add(self._metric + ".bytes_written", len(derived))
+        os.replace(temp_path, f"{self.path}.{name}")
+        self._fsync_dir(self.path)
+
+    def load_snapshot(self):
+        """Данные снимка вместо load(), если файлы не менялись после его записи; иначе None.
+
+        Состояние хранилища (контрольная сумма базы, размер журнала) берётся
+        из заголовка снимка, так что дальнейшие изменения проверяются так же,
+        как после обычной загрузки.
+        """
+        if self.format == "binary":
+            return None
+        with metrics.timer(self._metric + ".snapshot_load"), self._lock:
+            try:
+                with self._file_lock.shared(), open(self.snapshot_path, "rb") as file:
+                    header = pickle.load(file)
+                    files = [self._stat(self.path), self._stat(self.journal_path)]
+                    if (header.get("version") != SNAPSHOT_VERSION or header.get("files") != files
+                            or os.path.exists(self.pending_path)):
+                        return None
+                    data = self._unpickle(file)
+                    size = file.tell()
+            except FileNotFoundError:
+                return None
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+                    IndexError, TypeError, ValueError):
+                # Снимок повреждён или записан другой версией программы - данные читаются заново
+                return None
+            self._base_sha1 = header["sha1"]
+            self._base_stat = files[0]
+            self._journal_size = header["journal_size"]
+            self._snapshot_files = files
+            self.stale = False
+        metrics.add(self._metric + ".bytes_read", size)
+        return data
+
+    def save_snapshot(self, data):
+        """Сохранение снимка данных (коллекции с индексами) для быстрого следующего запуска.
+
+        Снимок пишется, только если все изменения уже в файлах и файлы не
+        менял другой процесс; если с последней загрузки или записи снимка
+        ничего не изменилось, он не перезаписывается. Для двоичного формата
+        снимок не нужен: файл и так открывается через mmap без разбора.
+        """
+        if self.format == "binary":
+            return
+        self.wait()
+        with metrics.timer(self._metric + ".snapshot_save"), self._lock, self._file_lock.shared():
+            files = [self._stat(self.path), self._stat(self.journal_path)]
+            if (self.stale or self._batch or files == self._snapshot_files
+                    or files[0] != self._base_stat or self._size(self.journal_path) != self._journal_size):
+                return
+            header = {"version": SNAPSHOT_VERSION, "files": files,
+                      "sha1": self._base_sha1, "journal_size": self._journal_size}
+            try:
+                snapshot = (pickle.dumps(header, pickle.HIGHEST_PROTOCOL)
+                            + pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                return
+            temp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            self._write_file(temp_path, snapshot)
+            os.replace(temp_path, self.snapshot_path)
+            self._snapshot_files = files
+        metrics.add(self._metric + ".bytes_written", len(snapshot))
+
+    def wait(self):
+        """Ожидание завершения фонового сжатия журнала."""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def _log(self, entries):
+        if self._batch is not None:
+            self._batch.extend(entries)
+        else:
+            self._append(entries)
+
+    def _append(self, entries):
+        data = b"".join(self._encode(entry) for entry in entries)
+        with metrics.timer(self._metric + ".append"), self._lock, self._file_lock.exclusive():
+            self._check()
+            created = not self._journal_size
+            with open(self.journal_path, "ab") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            if created:
+                self._fsync_dir(self.journal_path)
+            self._journal_size += len(data)
+            metrics.add(self._metric + ".bytes_written", len(data))
+            if self._journal_size >= self.compact_size and not self._compacting():
+                self._compactor = threading.Thread(target=self._compact, daemon=True)
+                self._compactor.start()
+
+    def _check(self):
+        """Проверка, что файлы на диске не менялись после загрузки или последней записи."""
+        if self._stat(self.path) != self._base_stat or self._size(self.journal_path) != self._journal_size:
+            self.stale = True
+            raise ConflictError(f"Файл {self.path} изменён другим процессом. "
+                                "Изменение не сохранено, данные нужно перечитать.")
+
+    def _compacting(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def _compact(self):
+        """Фоновое сжатие: журнал сворачивается в новый базовый файл."""
+        with metrics.timer(self._metric + ".compact"):
+            self._compact_files()
+
+    def _compact_files(self):
+        try:
+            with self._lock, self._file_lock.shared():
+                data = self._read_base()
+                base_stat = self._stat(self.path)
+                entries, offset, _ = self._read_journal()
+            # Тяжёлая часть выполняется без блокировки, добавления в журнал продолжаются
+            records = self._replay(self._parse_base(data), entries)
+        except StorageError:
+            return
+        base = self._dump(records)
+        with self._lock, self._file_lock.exclusive():
+            # Файлы изменил другой процесс - сжатие откладывается до перезагрузки
+            if self.stale or self._stat(self.path) != base_stat:
+                return
+            try:
+                self._check()
+            except ConflictError:
+                return
+            with open(self.journal_path, "rb") as file:
+                file.seek(offset)
+                tail = file.read()
+            self._commit(base, tail, records.ids.next_id)
+
+    def _commit(self, base, tail, next_id):
+        """Атомарная замена базового файла и журнала.
+
+        Сначала на диск пишется новый журнал с контрольной суммой нового
+        базового файла и границей последовательности ID, затем по очереди
+        заменяются оба файла. Если процесс упадёт между заменами, _recover
+        по контрольной сумме поймёт, какой журнал относится к базовому файлу.
+        """
+        sha1 = hashlib.sha1(base).hexdigest()
+        header = self._encode({"op": "base", "sha1": sha1, "next_id": next_id})
+        self._write_file(self.pending_path, header + tail)
+        self._write_file(self.path + ".tmp", base)
+        metrics.add(self._metric + ".bytes_written", len(header) + len(tail) + len(base))
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(self.pending_path, self.journal_path)
+        self._fsync_dir(self.path)
+        self._base_sha1 = sha1
+        self._base_stat = self._stat(self.path)
+        self._journal_size = len(header) + len(tail)
+
+    def _read_state(self):
+        """Содержимое файлов или None, если нужно восстановление после сбоя."""
+        if os.path.exists(self.pending_path):
+            return None
+        data = self._read_base()
+        base_stat = self._stat(self.path)
+        entries, size, torn = self._read_journal()
+        if torn:
+            return None
+        metrics.add(self._metric + ".bytes_read", (0 if data is None else len(data)) + size)
+        if entries and entries[0]["op"] == "base":
+            # Контрольная сумма базы записана в заголовке журнала при её замене,
+            # большой файл не нужно перечитывать целиком
+            sha1 = entries[0]["sha1"]
+        else:
+            sha1 = self._digest(data)
+        return data, sha1, base_stat, entries, size
+
+    def _recover(self):
+        """Завершение прерванной замены файлов и отрезание недописанной строки журнала."""
+        if os.path.exists(self.pending_path):
+            with open(self.pending_path, "rb") as file:
+                header = file.readline()
+            sha1 = self._digest(self._read_base())
+            try:
+                complete = json.loads(header)["sha1"] == sha1
+            except (ValueError, KeyError):
+                complete = False
+            if complete:
+                os.replace(self.pending_path, self.journal_path)
+            else:
+                os.remove(self.pending_path)
+            self._fsync_dir(self.path)
+        _, size, torn = self._read_journal()
+        if torn:
+            with open(self.journal_path, "r+b") as file:
+                file.truncate(size)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _read_base(self):
+        """Содержимое базового файла: bytes для JSON, mmap для двоичного формата."""
+        try:
+            with open(self.path, "rb") as file:
+                if RecordFile.is_record_file(file.read(len(MAGIC))):
+                    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                file.seek(0)
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _parse_base(self, data):
+        if data is None:
+            return []
+        try:
+            if RecordFile.is_record_file(data[:len(MAGIC)]):
+                return RecordFile(data)
+            return json.loads(data)
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            raise StorageError(f"Файл {self.path} повреждён ({e}). Данные не загружены, файл не изменён.")
+
+    def _read_journal(self):
+        """Чтение журнала: (операции, размер целых строк, есть ли недописанный хвост).
+
+        Недописанная последняя строка (без перевода строки) - след прерванной
+        записи, она не применяется. Нечитаемая целая строка - повреждение.
+        """
+        entries = []
+        size = 0
+        try:
+            with open(self.journal_path, "rb") as file:
+                for line_num, line in enumerate(file, 1):
+                    if not line.endswith(b"\n"):
+                        return entries, size, True
+                    try:
+                        entries.append(json.loads(line))
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        raise StorageError(f"Журнал {self.journal_path} повреждён в строке {line_num}.")
+                    size += len(line)
+        except FileNotFoundError:
+            pass
+        return entries, size, False
+
+    def _replay(self, records, entries):
+        """Применение операций журнала к записям базового файла."""
+        if isinstance(records, RecordFile):
+            records = FileRecordCollection(records)
+        else:
+            records = RecordCollection(records)
+        for entry in entries:
+            op = entry["op"]
+            if op in ("insert", "update"):
+                records.put(entry["record"])
+            elif op == "delete":
+                records.remove(entry["id"])
+            elif op == "base":
+                records.ids.advance(entry["next_id"])
+        return records
+
+    def _dump(self, records):
+        if self.format == "binary":
+            return RecordFile.dump(records, self.fields, records.ids.next_id)
+        return json.dumps(list(records), indent=4).encode()
+
+    @staticmethod
+    def _unpickle(file):
+        # Снимок - это миллионы словарей и множеств; без отключения сборщика
+        # мусора он многократно обходит их во время чтения, что втрое медленнее
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.load(file)
+        finally:
+            if enabled:
+                gc.enable()
+
+    @staticmethod
+    def _digest(data):
+        return None if data is None else hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def _encode(entry):
+        return json.dumps(entry, ensure_ascii=False).encode() + b"\n"
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _fsync_dir(path):
+        """Фиксация записи каталога после создания или переименования файла."""
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        except OSError:
+            # Каталог нельзя открыть (Windows) - там переименование фиксируется самой ФС
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _write_file(path, data):
+        with open(path, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+
+class ManagerRegistry:
+    """Кэш загруженных менеджеров на время работы процесса.
+
+    Менеджер создаётся (и читает свои файлы) при первом обращении, а при
+    повторном входе в меню переиспользуется, если его файлы данных не
+    изменились с момента последнего использования. Изменения определяются по
+    отпечатку хранилища: времени модификации и размеру файлов для JSON,
+    версии коллекции для SQLite. Менеджер, хранилище которого отклонило
+    запись из-за изменений другим процессом (stale), создаётся заново.
+    """
+
+    def __init__(self):
+        self._managers = {}
+
+    @contextmanager
+    def open(self, manager_class):
+        """Выдача менеджера для работы с меню; после выхода запоминается состояние файлов."""
+        manager = self.get(manager_class)
+        try:
+            yield manager
+        finally:
+            self._managers[manager_class] = (manager, self.fingerprint(manager))
+
+    def get(self, manager_class):
+        """Закэшированный менеджер или новый, если файлы изменились."""
+        cached = self._managers.get(manager_class)
+        if cached is not None and not cached[0].storage.stale and cached[1] == self.fingerprint(cached[0]):
+            return cached[0]
+        if cached is not None:
+            self.close(cached[0])
+        manager = manager_class()
+        self._managers[manager_class] = (manager, self.fingerprint(manager))
+        return manager
+
+    def invalidate(self, manager_class=None):
+        """Сброс кэша одного менеджера или всех."""
+        if manager_class is None:
+            cached = list(self._managers.values())
+            self._managers.clear()
+        else:
+            cached = [self._managers.pop(manager_class, (None, None))]
+        for manager, _ in cached:
+            self.close(manager)
+
+    @staticmethod
+    def close(manager):
+        """Освобождение ресурсов менеджера (фоновых потоков) и сохранение его снимка, если это поддерживается."""
+        close = getattr(manager, "close", None)
+        if close is not None:
+            close()
+
+    @staticmethod
+    def fingerprint(manager):
+        """Отпечаток состояния файлов данных менеджера."""
+        return manager.storage.fingerprint()
@@ -0,0 +1,209 @@
+import os
+import time
+import atexit
+import builtins
+import functools
+import threading
+from types import FunctionType
+
+# Флаг генераторной функции в co_flags (inspect.CO_GENERATOR); inspect
+# не импортируется, чтобы не замедлять запуск программы
+CO_GENERATOR = 0x20
+
+
+class _Timer:
+    """Замер одного вызова; время ожидания ввода пользователя не учитывается."""
+
+    __slots__ = ("metrics", "name", "start", "waited")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.waited = getattr(_local, "waited", 0.0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        elapsed -= getattr(_local, "waited", 0.0) - self.waited
+        self.metrics.observe(self.name, elapsed)
+        return False
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+_local = threading.local()
+
+
+class Metrics:
+    """Счётчики и таймеры операций помощника.
+
+    Таймер хранит число вызовов, суммарное и максимальное время, счётчик -
+    накопленное значение (байты, просмотренные и выданные записи). Имена
+    составные через точку: tasks.list_tasks, storage.finance.bytes_read.
+    Сбор включён по умолчанию и стоит микросекунды на операцию; выключается
+    переменной окружения ASSISTANT_METRICS=0. Снимок выгружается в JSON или
+    в текстовый формат Prometheus.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+
+    def add(self, name, value=1):
+        """Увеличение счётчика."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        """Учёт одного замера таймера."""
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+
+    def timer(self, name):
+        """Контекст, замеряющий время блока."""
+        return _Timer(self, name) if self.enabled else _NO_TIMER
+
+    def scan(self, name, scanned, returned):
+        """Сколько записей просмотрено и сколько выдано выборкой."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name + ".scanned"] = self._counters.get(name + ".scanned", 0) + scanned
+            self._counters[name + ".returned"] = self._counters.get(name + ".returned", 0) + returned
+
+    def reset(self):
+        """Обнуление всех счётчиков и таймеров."""
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def snapshot(self):
+        """Текущие значения: {"counters": {...}, "timers": {имя: {count, total_ms, mean_ms, max_ms}}}."""
+        with self._lock:
+            counters = dict(self._counters)
+            timers = {name: list(values) for name, values in self._timers.items()}
+        return {
+            "counters": dict(sorted(counters.items())),
+            "timers": {
+                name: {"count": count, "total_ms": round(total * 1000, 3),
+                       "mean_ms": round(total * 1000 / count, 3), "max_ms": round(peak * 1000, 3)}
+                for name, (count, total, peak) in sorted(timers.items())
+            }
+        }
+
+    def to_prometheus(self):
+        """Снимок в текстовом формате Prometheus."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted((name, list(values)) for name, values in self._timers.items())
+        lines = ["# HELP assistant_operation_seconds Время операций помощника.",
+                 "# TYPE assistant_operation_seconds summary"]
+        for name, (count, total, _) in timers:
+            lines.append(f'assistant_operation_seconds_count{{name="{name}"}} {count}')
+            lines.append(f'assistant_operation_seconds_sum{{name="{name}"}} {total:.6f}')
+        lines += ["# HELP assistant_operation_max_seconds Самая долгая операция.",
+                  "# TYPE assistant_operation_max_seconds gauge"]
+        for name, (_, _, peak) in timers:
+            lines.append(f'assistant_operation_max_seconds{{name="{name}"}} {peak:.6f}')
+        lines += ["# HELP assistant_events_total Счётчики: байты, просмотренные и выданные записи.",
+                  "# TYPE assistant_events_total counter"]
+        for name, value in counters:
+            lines.append(f'assistant_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Запись снимка в файл: .prom и .txt - формат Prometheus, иначе JSON."""
+        if path.endswith((".prom", ".txt")):
+            text = self.to_prometheus()
+        else:
+            import json
+            text = json.dumps(self.snapshot(), ensure_ascii=False, indent=4)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def print_report(self, limit=20):
+        """Вывод самых затратных операций и счётчиков."""
+        snapshot = self.snapshot()
+        if not snapshot["timers"] and not snapshot["counters"]:
+            print("Метрик пока нет.")
+            return
+        timers = sorted(snapshot["timers"].items(), key=lambda item: -item[1]["total_ms"])
+        print(f"{'Операция':40} {'вызовов':>8} {'всего, мс':>12} {'среднее':>10} {'макс':>10}")
+        for name, timer in timers[:limit]:
+            print(f"{name:40} {timer['count']:>8} {timer['total_ms']:>12.1f} "
+                  f"{timer['mean_ms']:>10.2f} {timer['max_ms']:>10.2f}")
+        for name, value in snapshot["counters"].items():
+            print(f"{name}: {value}")
+
+    @staticmethod
+    def install_input_hook():
+        """Учёт времени ожидания ввода, чтобы таймеры меню мерили только работу программы."""
+        if getattr(builtins.input, "_waits_counted", False):
+            return
+        original = builtins.input
+
+        def timed_input(prompt=""):
+            start = time.perf_counter()
+            try:
+                return original(prompt)
+            finally:
+                _local.waited = getattr(_local, "waited", 0.0) + time.perf_counter() - start
+
+        timed_input._waits_counted = True
+        builtins.input = timed_input
+
+
+metrics = Metrics(os.environ.get("ASSISTANT_METRICS", "1") != "0")
+
+if os.environ.get("ASSISTANT_METRICS_FILE"):
+    atexit.register(metrics.dump, os.environ["ASSISTANT_METRICS_FILE"])
+
+
+def instrumented(prefix):
+    """Декоратор класса менеджера: таймер <prefix>.<метод> вокруг публичных методов.
+
+    Циклы меню manage_* не замеряются - их время складывается из вложенных
+    операций. Для генераторов замеряется время до исчерпания.
+    """
+    def decorate(cls):
+        for name, member in list(vars(cls).items()):
+            if name.startswith(("_", "manage_")) or not isinstance(member, FunctionType):
+                continue
+            setattr(cls, name, _timed(f"{prefix}.{name}", member))
+        return cls
+    return decorate
+
+
+def _timed(name, function):
+    if function.__code__.co_flags & CO_GENERATOR:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(name):
+                yield from function(*args, **kwargs)
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(name):
+                return function(*args, **kwargs)
+    return wrapper
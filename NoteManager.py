@@ -1,24 +1,47 @@
-import json
-import csv
 from datetime import datetime
+from Storage import open_storage
+from CsvImporter import CsvImporter, require_fields
+from RecordExporter import RecordExporter
+from NoteSearchIndex import NoteSearchIndex
+from Metrics import instrumented
 
+@instrumented("notes")
 class NoteManager:
+    CSV_FIELDS = ["title", "content", "timestamp"]
+
     def __init__(self):
         self.notes_file = "notes.json"
-        self.notes = self.load_notes()
+        self.storage = open_storage(self.notes_file)
+        snapshot = self.storage.load_snapshot()
+        if snapshot is None:
+            self.notes = self.load_notes()
+            self.index = self.load_index()
+        else:
+            self.notes, self.index = snapshot
+        self.notes.listeners.append(self.index)
+
+    def close(self):
+        """Сохранение снимка заметок с индексом для быстрого следующего запуска."""
+        self.storage.save_snapshot((self.notes, self.index))
 
     def load_notes(self):
-        """Загрузка заметок из JSON-файла."""
-        try:
-            with open(self.notes_file, "r") as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        """Загрузка заметок из JSON-файла с применением журнала изменений."""
+        return self.storage.load()
 
     def save_notes(self):
-        """Сохранение заметок в JSON-файл."""
-        with open(self.notes_file, "w") as file:
-            json.dump(self.notes, file, indent=4)
+        """Полное сохранение заметок в JSON-файл."""
+        self.storage.save(self.notes)
+
+    def load_index(self):
+        """Загрузка сохранённого поискового индекса или его построение."""
+        data = self.storage.load_derived("index")
+        if data is None:
+            return NoteSearchIndex.build(self.notes)
+        return NoteSearchIndex.from_dict(data)
+
+    def save_index(self):
+        """Сохранение поискового индекса рядом с файлом заметок."""
+        self.storage.save_derived("index", self.index.to_dict())
 
     def add_note(self):
         """Создание новой заметки."""
@@ -29,15 +52,14 @@ class NoteManager:
 
         content = input("Введите содержимое заметки: ").strip()
         timestamp = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-        note_id = len(self.notes) + 1
-
-        self.notes.append({
-            "id": note_id,
+        note = {
+            "id": self.notes.ids.allocate(),
             "title": title,
             "content": content,
             "timestamp": timestamp
-        })
-        self.save_notes()
+        }
+        self.notes.add(note)
+        self.storage.insert(note)
         print("Заметка добавлена.")
 
     def list_notes(self):
@@ -53,34 +75,46 @@ class NoteManager:
         """Просмотр подробностей заметки."""
         try:
             note_id = int(input("Введите ID заметки: "))
-            note = next(note for note in self.notes if note["id"] == note_id)
+            note = self.notes[note_id]
             print(f"\nЗаголовок: {note['title']}")
             print(f"Содержимое:\n{note['content']}")
             print(f"Последнее обновление: {note['timestamp']}")
-        except StopIteration:
+        except KeyError:
             print("Заметка с таким ID не найдена.")
         except ValueError:
             print("ID должен быть числом.")
 
+    def search_notes(self):
+        """Полнотекстовый поиск по заголовкам и содержимому заметок."""
+        query = input('Введите запрос (слова, "фраза" или префикс*): ').strip()
+        results = self.index.search(query)
+        if not results:
+            print("Заметки не найдены.")
+            return
+        for note_id, score in results:
+            note = self.notes[note_id]
+            print(f"[{note['id']}] {note['title']} - Релевантность: {score:.2f}")
+
     def edit_note(self):
         """Редактирование существующей заметки."""
         try:
             note_id = int(input("Введите ID заметки для редактирования: "))
-            note = next(note for note in self.notes if note["id"] == note_id)
+            note = self.notes[note_id]
+            changes = {}
 
             print(f"Редактирование заметки: {note['title']}")
             new_title = input("Введите новый заголовок (оставьте пустым для сохранения текущего): ").strip()
             if new_title:
-                note["title"] = new_title
+                changes["title"] = new_title
 
             new_content = input("Введите новое содержимое (оставьте пустым для сохранения текущего): ").strip()
             if new_content:
-                note["content"] = new_content
+                changes["content"] = new_content
 
-            note["timestamp"] = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-            self.save_notes()
+            changes["timestamp"] = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+            self.storage.update(self.notes.update(note_id, changes))
             print("Заметка обновлена.")
-        except StopIteration:
+        except KeyError:
             print("Заметка с таким ID не найдена.")
         except ValueError:
             print("ID должен быть числом.")
@@ -89,46 +123,55 @@ class NoteManager:
         """Удаление заметки."""
         try:
             note_id = int(input("Введите ID заметки для удаления: "))
-            self.notes = [note for note in self.notes if note["id"] != note_id]
-            self.save_notes()
+            if self.notes.remove(note_id) is not None:
+                self.storage.delete(note_id)
             print("Заметка удалена.")
         except ValueError:
             print("ID должен быть числом.")
 
-    def import_notes(self):
-        """Импорт заметок из CSV."""
+    @staticmethod
+    def parse_csv_row(row):
+        """Проверка строки CSV и преобразование её в заметку (без ID)."""
+        require_fields(row, NoteManager.CSV_FIELDS)
+        title = row["title"].strip()
+        if not title:
+            raise ValueError("Заголовок заметки обязателен.")
+        try:
+            datetime.strptime(row["timestamp"], "%d-%m-%Y %H:%M:%S")  # Проверка формата времени
+        except ValueError:
+            raise ValueError(f"Неверный формат времени '{row['timestamp']}'. Используйте ДД-ММ-ГГГГ ЧЧ:ММ:СС.")
+        return {
+            "title": title,
+            "content": row["content"],
+            "timestamp": row["timestamp"]
+        }
+
+    def import_notes(self, batch_size=1000):
+        """Потоковый импорт заметок из CSV с пакетной фиксацией."""
         filename = input("Введите имя файла CSV для импорта: ").strip()
+        importer = CsvImporter(self.notes, self.storage, self.parse_csv_row, self.CSV_FIELDS, batch_size)
         try:
-            with open(filename, "r") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    self.notes.append({
-                        "id": len(self.notes) + 1,
-                        "title": row["title"],
-                        "content": row["content"],
-                        "timestamp": row["timestamp"]
-                    })
-                self.save_notes()
-                print("Заметки импортированы.")
+            report = importer.run(filename)
         except FileNotFoundError:
             print("Файл не найден.")
-        except KeyError:
-            print("Некорректный формат CSV-файла.")
+            return
+        except ValueError as e:
+            print(f"Некорректный формат CSV-файла. {e}")
+            return
+        print("Заметки импортированы.")
+        report.print_summary()
+        self.save_index()
 
     def export_notes(self):
-        """Экспорт заметок в CSV."""
-        filename = input("Введите имя файла CSV для экспорта: ").strip()
-        with open(filename, "w", newline="") as file:
-            fieldnames = ["title", "content", "timestamp"]
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for note in self.notes:
-                writer.writerow({
-                    "title": note["title"],
-                    "content": note["content"],
-                    "timestamp": note["timestamp"]
-                })
-            print("Заметки экспортированы.")
+        """Потоковый экспорт заметок в CSV, JSONL или gzip."""
+        filename = input("Введите имя файла для экспорта (.csv, .jsonl, можно добавить .gz): ").strip()
+        try:
+            report = RecordExporter(self.CSV_FIELDS, progress_every=100000).run(self.notes, filename)
+        except OSError as e:
+            print(f"Не удалось записать файл: {e}")
+            return
+        print("Заметки экспортированы.")
+        report.print_summary()
 
     def manage_notes(self):
         """Основное меню управления заметками."""
@@ -140,8 +183,9 @@ class NoteManager:
             print("4. Редактировать заметку")
             print("5. Удалить заметку")
             print("6. Импорт заметок из CSV")
-            print("7. Экспорт заметок в CSV")
-            print("8. Назад")
+            print("7. Экспорт заметок (CSV, JSONL, gzip)")
+            print("8. Поиск заметок")
+            print("9. Назад")
 
             choice = input("Введите номер действия: ")
 
@@ -160,6 +204,9 @@ class NoteManager:
             elif choice == '7':
                 self.export_notes()
             elif choice == '8':
+                self.search_notes()
+            elif choice == '9':
+                self.save_index()
                 break
             else:
                 print("Неверный выбор.")
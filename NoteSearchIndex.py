@@ -0,0 +1,187 @@
+import re
+import bisect
+import math
+from Metrics import metrics
+from SortedKeys import SortedKeys
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Окончания русских слов от длинных к коротким для упрощённого стемминга
+REFLEXIVE_ENDINGS = ("ся", "сь")
+WORD_ENDINGS = tuple(sorted((
+    "иями", "ями", "ами", "иях", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ете", "ите",
+    "ила", "ило", "или", "ыла", "ыло", "ыли", "ала", "ало", "али", "яла", "яло", "яли",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ой", "ей", "ий", "ый", "ом", "ем", "ам", "ям",
+    "ах", "ях", "ов", "ев", "ию", "ья", "ье", "ью", "ия", "ть", "ти", "ет", "ут", "ют",
+    "ит", "ат", "ят", "ил", "ыл", "ал", "ял", "ую", "юю",
+    "а", "я", "о", "е", "и", "ы", "у", "ю", "ь", "й"
+), key=len, reverse=True))
+
+
+def normalize(word):
+    """Приведение слова к нижнему регистру с заменой ё на е."""
+    return word.lower().replace("ё", "е")
+
+
+def stem(word):
+    """Упрощённый стемминг: отбрасывание типичного русского окончания."""
+    if not CYRILLIC_RE.search(word):
+        return word
+    for ending in REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            word = word[:-len(ending)]
+            break
+    for ending in WORD_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Список нормализованных основ слов текста."""
+    return [stem(normalize(word)) for word in TOKEN_RE.findall(text)]
+
+
+class NoteSearchIndex:
+    """Инвертированный индекс заметок с ранжированием BM25.
+
+    Для каждой основы слова хранится словарь id заметки -> позиции в тексте
+    (заголовок, затем содержимое). Позиции нужны для поиска фраз, отсортированный
+    список основ - для поиска по префиксу. Индекс обновляется по одной заметке
+    через add/remove, поэтому поиск не перечитывает тексты заметок.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+        self.total_length = 0
+        self._terms = SortedKeys()
+
+    @classmethod
+    def build(cls, notes):
+        """Построение индекса по всем заметкам."""
+        index = cls()
+        for note in notes:
+            index._index(note)
+        index._terms = SortedKeys(index.postings)
+        return index
+
+    @classmethod
+    def from_dict(cls, data):
+        """Восстановление индекса из сохранённого словаря."""
+        index = cls()
+        index.postings = {
+            term: {int(note_id): positions for note_id, positions in docs.items()}
+            for term, docs in data["postings"].items()
+        }
+        index.lengths = {int(note_id): length for note_id, length in data["lengths"].items()}
+        index.total_length = sum(index.lengths.values())
+        index._terms = SortedKeys(index.postings)
+        return index
+
+    def to_dict(self):
+        """Словарь для сохранения на диск."""
+        return {"postings": self.postings, "lengths": self.lengths}
+
+    @staticmethod
+    def _tokens(note):
+        # Пропуск позиции между заголовком и текстом, чтобы фраза не склеивала их
+        return tokenize(note["title"]) + [None] + tokenize(note["content"])
+
+    def _index(self, note):
+        tokens = self._tokens(note)
+        for position, term in enumerate(tokens):
+            if term is None:
+                continue
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+            docs.setdefault(note["id"], []).append(position)
+        self.lengths[note["id"]] = len(tokens) - 1
+        self.total_length += len(tokens) - 1
+        return tokens
+
+    def add(self, note):
+        """Добавление заметки в индекс."""
+        for term in set(self._index(note)):
+            if term is not None and len(self.postings[term]) == 1:
+                self._terms.add(term)
+
+    def remove(self, note):
+        """Удаление заметки из индекса."""
+        for term in set(self._tokens(note)):
+            docs = self.postings.get(term)
+            if docs is None or docs.pop(note["id"], None) is None:
+                continue
+            if not docs:
+                del self.postings[term]
+                self._terms.remove(term)
+        self.total_length -= self.lengths.pop(note["id"], 0)
+
+    def expand_prefix(self, prefix):
+        """Все основы, начинающиеся с prefix."""
+        sorted_terms = self._terms.ordered()
+        i = bisect.bisect_left(sorted_terms, prefix)
+        terms = []
+        while i < len(sorted_terms) and sorted_terms[i].startswith(prefix):
+            terms.append(sorted_terms[i])
+            i += 1
+        return terms
+
+    def search(self, query, limit=10):
+        """Поиск заметок по запросу; возвращает список (id, оценка).
+
+        Слова запроса ищутся по основам, "фраза в кавычках" должна встречаться
+        в заметке целиком, слово* - поиск по префиксу.
+        """
+        terms = []
+        phrases = []
+        for phrase, word in QUERY_RE.findall(query):
+            if phrase:
+                tokens = tokenize(phrase)
+                if tokens:
+                    phrases.append(tokens)
+                    terms.extend(tokens)
+            elif word.endswith("*") and len(word) > 1:
+                for prefix in TOKEN_RE.findall(normalize(word[:-1])):
+                    terms.extend(self.expand_prefix(stem(prefix)))
+            else:
+                terms.extend(tokenize(word))
+
+        scores = self._score(set(terms))
+        for tokens in phrases:
+            scores = {note_id: score for note_id, score in scores.items() if self._has_phrase(note_id, tokens)}
+        metrics.scan("notes.search", len(scores), min(len(scores), limit))
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def _score(self, terms):
+        count = len(self.lengths)
+        if not count:
+            return {}
+        average = self.total_length / count or 1
+        scores = {}
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for note_id, positions in docs.items():
+                tf = len(positions)
+                norm = self.K1 * (1 - self.B + self.B * self.lengths[note_id] / average)
+                scores[note_id] = scores.get(note_id, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+        return scores
+
+    def _has_phrase(self, note_id, tokens):
+        lists = [self.postings.get(term, {}).get(note_id) for term in tokens]
+        if not all(lists):
+            return False
+        following = [set(positions) for positions in lists[1:]]
+        return any(
+            all(start + offset + 1 in positions for offset, positions in enumerate(following))
+            for start in lists[0]
+        )
@@ -0,0 +1,20 @@
+from collections import deque
+
+
+def map_ordered(function, tasks, workers):
+    """Вызовы function(*args) для наборов аргументов из tasks в пуле из workers процессов.
+
+    Результаты отдаются в порядке заданий. Задания берутся из tasks по мере
+    освобождения очереди, поэтому источник частей не обгоняет обработку.
+    """
+    # Пул процессов импортируется только здесь: модуль заметно замедляет запуск
+    from concurrent.futures import ProcessPoolExecutor
+    pending = deque()
+    with ProcessPoolExecutor(workers) as pool:
+        for args in tasks:
+            pending.append(pool.submit(function, *args))
+            # Не больше двух частей на процесс в очереди - память ограничена
+            while len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,124 @@
+import io
+import os
+import pstats
+import cProfile
+import tracemalloc
+from Metrics import metrics
+
+
+class Profiler:
+    """Профилирование по запросу: cProfile (время) и tracemalloc (память).
+
+    Включается пунктом меню или переменной окружения ASSISTANT_PROFILE
+    (cpu, memory или cpu,memory) - тогда сбор идёт с запуска программы до
+    выхода. Результаты пишутся в каталог output_dir: assistant.prof для
+    cProfile (открывается pstats или snakeviz) и assistant.memory.txt для
+    tracemalloc, а краткая сводка выводится на экран.
+    """
+
+    def __init__(self, output_dir="."):
+        self.output_dir = output_dir
+        self._cpu = None
+
+    @classmethod
+    def from_env(cls):
+        """Профилировщик с режимами из ASSISTANT_PROFILE."""
+        profiler = cls(os.environ.get("ASSISTANT_PROFILE_DIR", "."))
+        modes = {mode.strip() for mode in os.environ.get("ASSISTANT_PROFILE", "").split(",")}
+        if "cpu" in modes:
+            profiler.start_cpu()
+        if "memory" in modes:
+            profiler.start_memory()
+        return profiler
+
+    @property
+    def cpu_active(self):
+        return self._cpu is not None
+
+    @property
+    def memory_active(self):
+        return tracemalloc.is_tracing()
+
+    def start_cpu(self):
+        if self._cpu is None:
+            self._cpu = cProfile.Profile()
+            self._cpu.enable()
+
+    def stop_cpu(self, limit=15):
+        """Остановка cProfile, запись assistant.prof; возвращает сводку по самым затратным функциям."""
+        if self._cpu is None:
+            return ""
+        self._cpu.disable()
+        path = os.path.join(self.output_dir, "assistant.prof")
+        self._cpu.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(self._cpu, stream=summary).sort_stats("cumulative").print_stats(limit)
+        self._cpu = None
+        return f"Профиль сохранён в {path}.\n{summary.getvalue()}"
+
+    def start_memory(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    def stop_memory(self, limit=15):
+        """Снимок tracemalloc в assistant.memory.txt; возвращает самые крупные места выделения."""
+        if not tracemalloc.is_tracing():
+            return ""
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = snapshot.statistics("lineno")
+        lines = [f"Сейчас выделено {current / 1024 / 1024:.1f} МБ, пик {peak / 1024 / 1024:.1f} МБ."]
+        lines += [str(stat) for stat in stats[:limit]]
+        path = os.path.join(self.output_dir, "assistant.memory.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines[:1] + [str(stat) for stat in stats]) + "\n")
+        return f"Снимок памяти сохранён в {path}.\n" + "\n".join(lines)
+
+    def finish(self):
+        """Остановка всех активных режимов с записью результатов (при выходе из программы)."""
+        for report in (self.stop_cpu(), self.stop_memory()):
+            if report:
+                print(report)
+
+    def manage_profiling(self):
+        """Меню метрик и профилирования."""
+        while True:
+            print("\nМетрики и профилирование:")
+            print("1. Показать метрики")
+            print("2. Сохранить метрики в файл (.json или .prom)")
+            print(f"3. {'Остановить' if self.cpu_active else 'Запустить'} профилирование времени (cProfile)")
+            print(f"4. {'Остановить' if self.memory_active else 'Запустить'} трассировку памяти (tracemalloc)")
+            print("5. Сбросить метрики")
+            print("6. Назад")
+
+            choice = input("Введите номер действия: ")
+
+            if choice == '1':
+                metrics.print_report()
+            elif choice == '2':
+                filename = input("Введите имя файла (metrics.json или metrics.prom): ").strip()
+                try:
+                    metrics.dump(filename)
+                    print(f"Метрики сохранены в {filename}.")
+                except OSError as e:
+                    print(f"Не удалось записать файл: {e}")
+            elif choice == '3':
+                if self.cpu_active:
+                    print(self.stop_cpu())
+                else:
+                    self.start_cpu()
+                    print("Профилирование времени запущено.")
+            elif choice == '4':
+                if self.memory_active:
+                    print(self.stop_memory())
+                else:
+                    self.start_memory()
+                    print("Трассировка памяти запущена.")
+            elif choice == '5':
+                metrics.reset()
+                print("Метрики сброшены.")
+            elif choice == '6':
+                break
+            else:
+                print("Неверный выбор. Пожалуйста, попробуйте снова.")
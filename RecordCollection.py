@@ -0,0 +1,95 @@
+from operator import itemgetter
+from IdSequence import IdSequence
+
+
+class RecordCollection:
+    """Упорядоченная коллекция записей с индексом по ID.
+
+    Записи хранятся в словаре id -> запись, который сохраняет порядок
+    добавления, поэтому поиск, изменение и удаление по ID выполняются за O(1).
+    Производные индексы подписываются через listeners: у каждого вызываются
+    add(record) и remove(record), изменение записи - это remove старой версии
+    и add новой.
+    """
+
+    def __init__(self, records=()):
+        self._records = {}
+        self.ids = IdSequence()
+        self.listeners = []
+        self.renumbered = []
+        duplicates = []
+        for record in records:
+            if record["id"] in self._records:
+                duplicates.append(record)
+            else:
+                self.add(record)
+        # Повторяющиеся ID (остались от старой схемы len + 1) получают новые номера
+        for record in duplicates:
+            record["id"] = self.ids.allocate()
+            self.add(record)
+            self.renumbered.append(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __contains__(self, record_id):
+        return record_id in self._records
+
+    def __getitem__(self, record_id):
+        return self._records[record_id]
+
+    def get(self, record_id, default=None):
+        """Поиск записи по ID."""
+        return self._records.get(record_id, default)
+
+    def add(self, record):
+        """Добавление новой записи."""
+        record_id = record["id"]
+        if record_id in self._records:
+            raise KeyError(record_id)
+        self._records[record_id] = record
+        self.ids.advance(record_id + 1)
+        for listener in self.listeners:
+            listener.add(record)
+
+    def values(self, *fields):
+        """Кортежи значений нескольких полей fields всех записей."""
+        return map(itemgetter(*fields), self._records.values())
+
+    def put(self, record):
+        """Добавление записи или замена существующей с тем же ID."""
+        old = self._records.get(record["id"])
+        if old is not None:
+            self._records[record["id"]] = record
+            for listener in self.listeners:
+                listener.remove(old)
+                listener.add(record)
+        else:
+            self.add(record)
+
+    def update(self, record_id, changes):
+        """Изменение полей записи; KeyError, если записи нет."""
+        record = self._records[record_id]
+        old = dict(record)
+        record.update(changes)
+        for listener in self.listeners:
+            listener.remove(old)
+            listener.add(record)
+        return record
+
+    def remove(self, record_id):
+        """Удаление записи; возвращает удалённую запись или None."""
+        record = self._records.pop(record_id, None)
+        if record is not None:
+            for listener in self.listeners:
+                listener.remove(record)
+        return record
+
+    def __getstate__(self):
+        # Подписчики (индексы, планировщик) в снимок не попадают - менеджер подключает их заново
+        state = dict(self.__dict__)
+        state["listeners"] = []
+        return state
@@ -0,0 +1,148 @@
+import io
+import os
+import csv
+import json
+import time
+from operator import itemgetter
+from itertools import islice
+from ProcessPool import map_ordered
+
+
+class ExportReport:
+    """Итоги экспорта: число записей, файлы, объём и скорость."""
+
+    def __init__(self):
+        self.rows = 0
+        self.files = []
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def print_summary(self):
+        """Вывод итогов экспорта."""
+        if len(self.files) == 1:
+            files = self.files[0]
+        else:
+            files = f"{len(self.files)} файлов" + (f" ({self.files[0]} ...)" if self.files else "")
+        print(f"Выгружено записей: {self.rows} в {files}, {self.bytes / 1024 / 1024:.1f} МБ "
+              f"({self.rows_per_second:.0f} записей/с).")
+
+
+def export_format(filename):
+    """Формат по имени файла: jsonl для .jsonl[.gz], иначе csv."""
+    name = filename[:-3] if filename.endswith(".gz") else filename
+    return "jsonl" if name.endswith(".jsonl") else "csv"
+
+
+def open_output(filename, buffer_size):
+    """Текстовый файл для записи с большим буфером; для .gz - со сжатием gzip."""
+    if filename.endswith(".gz"):
+        import gzip
+        raw = io.BufferedWriter(gzip.open(filename, "wb", compresslevel=6), buffer_size)
+    else:
+        raw = open(filename, "wb", buffering=buffer_size)
+    # UTF-8 без BOM: CsvImporter читает файлы в той же кодировке
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+
+def write_rows(file, fmt, fieldnames, rows):
+    """Запись пачки строк (кортежей значений полей) в открытый файл."""
+    if fmt == "csv":
+        csv.writer(file).writerows(rows)
+    else:
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        file.write("".join(encode(dict(zip(fieldnames, row))) + "\n" for row in rows))
+
+
+def write_header(file, fmt, fieldnames):
+    if fmt == "csv":
+        csv.writer(file).writerow(fieldnames)
+
+
+def _write_shard(filename, fieldnames, rows, buffer_size):
+    """Запись одной части в процессе пула; возвращает размер файла."""
+    fmt = export_format(filename)
+    with open_output(filename, buffer_size) as file:
+        write_header(file, fmt, fieldnames)
+        write_rows(file, fmt, fieldnames, rows)
+    return os.path.getsize(filename)
+
+
+class RecordExporter:
+    """Потоковый экспорт записей в CSV, JSONL или gzip (.csv.gz, .jsonl.gz).
+
+    Записи берутся из любой последовательности или генератора и
+    обрабатываются пачками по chunk_size: из записи выбираются только поля
+    fieldnames (кортежем, без промежуточных словарей), пачка форматируется
+    и пишется в файл с буфером buffer_size, так что в памяти никогда не
+    лежит весь экспорт. Большой экспорт можно разбить на части по
+    shard_size записей: части форматируются и сжимаются пулом процессов,
+    а в основном процессе остаётся только выборка значений.
+    """
+
+    def __init__(self, fieldnames, chunk_size=10000, buffer_size=1024 * 1024, progress_every=None):
+        self.fieldnames = list(fieldnames)
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.progress_every = progress_every
+        self._values = itemgetter(*self.fieldnames)
+
+    def run(self, records, filename):
+        """Экспорт в один файл; OSError, если файл нельзя записать."""
+        report = ExportReport()
+        started = time.perf_counter()
+        fmt = export_format(filename)
+        with open_output(filename, self.buffer_size) as file:
+            write_header(file, fmt, self.fieldnames)
+            for chunk in self._chunks(records, self.chunk_size):
+                write_rows(file, fmt, self.fieldnames, chunk)
+                self._advance(report, len(chunk))
+        report.files.append(filename)
+        report.bytes = os.path.getsize(filename)
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def run_sharded(self, records, filename, shard_size, workers=None):
+        """Экспорт частями <имя>.partNNNN<расширение> силами пула процессов."""
+        report = ExportReport()
+        started = time.perf_counter()
+        base, suffix = self.split_name(filename)
+        workers = workers or os.cpu_count() or 1
+
+        def shards():
+            for number, chunk in enumerate(self._chunks(records, shard_size), 1):
+                path = f"{base}.part{number:04d}{suffix}"
+                report.files.append(path)
+                self._advance(report, len(chunk))
+                yield path, self.fieldnames, chunk, self.buffer_size
+
+        for size in map_ordered(_write_shard, shards(), workers):
+            report.bytes += size
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    @staticmethod
+    def split_name(filename):
+        """Имя файла без расширения и расширение вместе с .gz."""
+        base, suffix = os.path.splitext(filename)
+        if suffix == ".gz":
+            base, inner = os.path.splitext(base)
+            suffix = inner + suffix
+        return base, suffix
+
+    def _chunks(self, records, size):
+        rows = map(self._values, records)
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _advance(self, report, count):
+        before = report.rows
+        report.rows += count
+        if self.progress_every and before // self.progress_every != report.rows // self.progress_every:
+            print(f"  ... выгружено {report.rows} записей")
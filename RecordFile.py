@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import mmap
+import bisect
+import struct
+from array import array
+
+MAGIC = b"PAREC01\n"
+
+# Поля коллекций и способ их хранения:
+# int/float/bool - массив чисел, symbol - код строки из словаря (категории,
+# приоритеты, даты повторяются), text - смещения и общий блок UTF-8
+FIELDS = {
+    "tasks": (("id", "int"), ("title", "text"), ("description", "text"), ("done", "bool"),
+              ("priority", "symbol"), ("due_date", "symbol")),
+    "notes": (("id", "int"), ("title", "text"), ("content", "text"), ("timestamp", "text")),
+    "contacts": (("id", "int"), ("name", "text"), ("phone", "text"), ("email", "text")),
+    "finance": (("id", "int"), ("amount", "float"), ("category", "symbol"), ("date", "symbol"),
+                ("description", "text")),
+}
+
+TYPECODES = {"int": "q", "float": "d", "bool": "B", "symbol": "I"}
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+class RecordFile:
+    """Компактный двоичный файл записей коллекции с ленивым чтением.
+
+    Устройство файла: MAGIC, длина заголовка (8 байт), заголовок JSON
+    (число записей, next_id, поля, словари строк, смещения столбцов), затем
+    столбцы, выровненные по 8 байт. Числа лежат типизированными массивами,
+    повторяющиеся строки - 4-байтовыми кодами словаря, тексты - массивом
+    смещений и общим блоком UTF-8. Файл открывается через mmap, столбцы
+    доступны как memoryview без копирования, а запись превращается в словарь
+    только при обращении к ней.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Неизвестный формат файла.")
+        (header_size,) = struct.unpack_from("<Q", view, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(view[start:start + header_size]))
+        data = view[_align(start + header_size):]
+        self.count = header["count"]
+        self.next_id = header["next_id"]
+        self.fields = [tuple(field) for field in header["fields"]]
+        self.symbol_tables = header["symbols"]
+        self.sorted = header["sorted"]
+        swap = header["byteorder"] != sys.byteorder
+        self._columns = {}
+        for name, (offset, size, typecode) in header["columns"].items():
+            column = data[offset:offset + size]
+            if swap and typecode != "B":
+                column = array(typecode, column.tobytes())
+                column.byteswap()
+                column = memoryview(column)
+            else:
+                column = column.cast(typecode)
+            self._columns[name] = column
+        self._index = None
+
+    @classmethod
+    def open(cls, path):
+        """Открытие файла через mmap; данные читаются с диска по мере обращения."""
+        with open(path, "rb") as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @staticmethod
+    def is_record_file(prefix):
+        return prefix.startswith(MAGIC)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for row in range(self.count):
+            yield self.record(row)
+
+    def column(self, name):
+        """Столбец числового поля или кодов словаря (memoryview без копирования)."""
+        return self._columns[name]
+
+    def symbols(self, name):
+        """Словарь строк поля типа symbol."""
+        return self.symbol_tables[name]
+
+    def text(self, name, row):
+        """Текстовое поле одной записи."""
+        offsets = self._columns[name + ":offsets"]
+        return str(self._columns[name + ":data"][offsets[row]:offsets[row + 1]], "utf-8")
+
+    def texts(self, name):
+        """Текстовый столбец как изменяемый список с ленивым декодированием."""
+        return TextColumn(self, name)
+
+    def record(self, row):
+        """Запись с номером строки row в виде словаря."""
+        record = {}
+        for name, kind in self.fields:
+            if kind == "text":
+                record[name] = self.text(name, row)
+            elif kind == "symbol":
+                record[name] = self.symbol_tables[name][self._columns[name][row]]
+            elif kind == "bool":
+                record[name] = bool(self._columns[name][row])
+            else:
+                record[name] = self._columns[name][row]
+        return record
+
+    def find(self, record_id):
+        """Номер строки записи с данным ID или None."""
+        ids = self._columns["id"]
+        if self.sorted:
+            row = bisect.bisect_left(ids, record_id)
+            return row if row < self.count and ids[row] == record_id else None
+        if self._index is None:
+            self._index = dict(zip(ids, range(self.count)))
+        return self._index.get(record_id)
+
+    @staticmethod
+    def dump(records, fields, next_id):
+        """Сериализация записей в байты файла."""
+        columns = {}
+        symbols = {}
+        codes = {}
+        for name, kind in fields:
+            if kind == "text":
+                columns[name + ":offsets"] = array("Q", [0])
+                columns[name + ":data"] = bytearray()
+            else:
+                columns[name] = array(TYPECODES[kind])
+            if kind == "symbol":
+                symbols[name] = []
+                codes[name] = {}
+
+        count = 0
+        last_id = None
+        ordered = True
+        for record in records:
+            for name, kind in fields:
+                value = record[name]
+                if kind == "text":
+                    data = columns[name + ":data"]
+                    data += value.encode("utf-8")
+                    columns[name + ":offsets"].append(len(data))
+                elif kind == "symbol":
+                    code = codes[name].get(value)
+                    if code is None:
+                        code = codes[name][value] = len(symbols[name])
+                        symbols[name].append(value)
+                    columns[name].append(code)
+                elif kind == "float":
+                    columns[name].append(float(value))
+                else:
+                    columns[name].append(int(value))
+            if last_id is not None and record["id"] <= last_id:
+                ordered = False
+            last_id = record["id"]
+            count += 1
+
+        layout = {}
+        offset = 0
+        for name, column in columns.items():
+            typecode = column.typecode if isinstance(column, array) else "B"
+            size = len(column) * (column.itemsize if isinstance(column, array) else 1)
+            layout[name] = [offset, size, typecode]
+            offset = _align(offset + size)
+        header = json.dumps({
+            "count": count, "next_id": next_id, "sorted": ordered, "byteorder": sys.byteorder,
+            "fields": [list(field) for field in fields], "symbols": symbols, "columns": layout
+        }, ensure_ascii=False).encode()
+
+        parts = [MAGIC, struct.pack("<Q", len(header)), header]
+        start = len(MAGIC) + 8 + len(header)
+        parts.append(b"\0" * (_align(start) - start))
+        for name, column in columns.items():
+            data = column.tobytes() if isinstance(column, array) else bytes(column)
+            parts.append(data)
+            parts.append(b"\0" * (_align(len(data)) - len(data)))
+        return b"".join(parts)
+
+
+class TextColumn:
+    """Текстовый столбец файла в виде списка: строка декодируется при чтении.
+
+    Изменённые строки хранятся в словаре, добавленные - в обычном списке,
+    сам файл не меняется.
+    """
+
+    def __init__(self, file, name):
+        self._file = file
+        self._name = name
+        self._changed = {}
+        self._extra = []
+
+    def __len__(self):
+        return len(self._file) + len(self._extra)
+
+    def __getitem__(self, row):
+        if row >= len(self._file):
+            return self._extra[row - len(self._file)]
+        text = self._changed.get(row)
+        return self._file.text(self._name, row) if text is None else text
+
+    def __setitem__(self, row, text):
+        if row >= len(self._file):
+            self._extra[row - len(self._file)] = text
+        else:
+            self._changed[row] = text
+
+    def append(self, text):
+        self._extra.append(text)
+
+
+def convert(source, target):
+    """Перевод файла данных (с журналом) между JSON и двоичным форматом.
+
+    Формат результата определяется расширением: .bin - двоичный, иначе JSON.
+    """
+    from JournalStorage import JournalStorage
+    records = JournalStorage(source).load()
+    fmt = "binary" if target.endswith(".bin") else "json"
+    collection = os.path.splitext(os.path.basename(target))[0]
+    storage = JournalStorage(target, format=fmt, collection=collection)
+    storage.load()
+    storage.save(records)
+    return len(records)
+
+
+def main(argv):
+    """Конвертер: python RecordFile.py finance.json finance.bin (или обратно)."""
+    if len(argv) != 3:
+        print("Использование: python RecordFile.py исходный_файл файл_результата (.json или .bin)")
+        return 2
+    count = convert(argv[1], argv[2])
+    print(f"{argv[1]} -> {argv[2]}: записей - {count}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,60 @@
+import bisect
+
+# До стольких новых ключей вставляются по одному: сдвиг хвоста списка
+# дешевле, чем сборка нового списка слиянием
+INSORT_LIMIT = 32
+
+
+class SortedKeys:
+    """Отсортированный список ключей с отложенным вливанием новых.
+
+    add кладёт ключ в буфер за O(1). Буфер сортируется и сливается с
+    основным списком при первом чтении через ordered(), поэтому
+    импорт k записей в индекс из N записей стоит O(N + k log k) один раз, а
+    не O(N) на каждую запись, как bisect.insort. Ключ, удалённый до слияния,
+    просто убирается из буфера. Ключи должны быть различными.
+    """
+
+    def __init__(self, keys=()):
+        self._keys = sorted(keys)
+        self._pending = set()
+
+    def __len__(self):
+        return len(self._keys) + len(self._pending)
+
+    def add(self, key):
+        """Добавление ключа."""
+        self._pending.add(key)
+
+    def remove(self, key):
+        """Удаление ключа, если он есть."""
+        if key in self._pending:
+            self._pending.discard(key)
+            return
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def ordered(self):
+        """Все ключи отсортированным списком (с влитым буфером)."""
+        if self._pending:
+            self._merge(sorted(self._pending))
+            self._pending.clear()
+        return self._keys
+
+    def _merge(self, new):
+        keys = self._keys
+        if len(new) <= INSORT_LIMIT:
+            for key in new:
+                bisect.insort(keys, key)
+            return
+        # Основной список копируется срезами между точками вставки новых ключей
+        merged = []
+        start = 0
+        for key in new:
+            i = bisect.bisect_left(keys, key, start)
+            merged += keys[start:i]
+            merged.append(key)
+            start = i
+        merged += keys[start:]
+        self._keys = merged
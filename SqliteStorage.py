@@ -0,0 +1,529 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from operator import itemgetter
+from IdSequence import IdSequence
+from DateIndex import to_ordinal
+from ContactSearchIndex import fold, digits
+from FingerprintIndex import finance_keys, contact_keys
+from StorageError import ConflictError
+from Metrics import metrics
+
+
+def key_with_prefix(keys, prefix):
+    """Ключ отпечатка с данным префиксом или None."""
+    for key in keys:
+        if key.startswith(prefix):
+            return key
+    return None
+
+
+class Schema:
+    """Описание таблицы коллекции: поля записи, вычисляемые столбцы и индексы.
+
+    fingerprints - вычисляемые столбцы с отпечатками записи для поиска
+    дубликатов (SqliteFingerprintIndex).
+    """
+
+    def __init__(self, fields, computed=None, indexes=(), booleans=(), fingerprints=()):
+        self.fields = fields
+        self.computed = computed or {}
+        self.indexes = indexes
+        self.booleans = booleans
+        self.fingerprints = fingerprints
+
+    @property
+    def columns(self):
+        return ("id",) + self.fields + tuple(self.computed)
+
+    def to_row(self, record):
+        row = [record["id"]]
+        row.extend(int(record[field]) if field in self.booleans else record[field] for field in self.fields)
+        row.extend(compute(record) for compute in self.computed.values())
+        return row
+
+    def to_record(self, row):
+        record = {"id": row[0]}
+        for field, value in zip(self.fields, row[1:]):
+            record[field] = bool(value) if field in self.booleans else value
+        return record
+
+
+SCHEMAS = {
+    "tasks": Schema(
+        ("title", "description", "done", "priority", "due_date"),
+        {"due_ordinal": lambda task: to_ordinal(task["due_date"])},
+        indexes=("priority", "done", "due_ordinal", "done, priority, due_ordinal"),
+        booleans=("done",)
+    ),
+    "notes": Schema(("title", "content", "timestamp")),
+    "contacts": Schema(
+        ("name", "phone", "email"),
+        {"name_folded": lambda contact: fold(contact["name"]), "phone_digits": lambda contact: digits(contact["phone"]),
+         "phone_key": lambda contact: key_with_prefix(contact_keys(contact), "phone:"),
+         "email_key": lambda contact: key_with_prefix(contact_keys(contact), "email:")},
+        indexes=("name_folded", "phone_digits", "phone_key", "email_key"),
+        fingerprints=("phone_key", "email_key")
+    ),
+    "finance": Schema(
+        ("amount", "category", "date", "description"),
+        {"date_ordinal": lambda record: to_ordinal(record["date"]), "category_folded": lambda record: fold(record["category"]),
+         "fingerprint": lambda record: finance_keys(record)[0]},
+        indexes=("date_ordinal", "category_folded", "fingerprint"),
+        fingerprints=("fingerprint",)
+    ),
+}
+
+
+class Database:
+    """Общее соединение с файлом базы для всех коллекций процесса.
+
+    Коллекции одной базы работают через одно соединение и одну блокировку,
+    поэтому пакет изменений нескольких коллекций фиксируется одной
+    транзакцией и не упирается в блокировку базы другим соединением.
+    """
+
+    _databases = {}
+    _databases_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._batch_depth = 0
+
+    @classmethod
+    def open(cls, path):
+        """Соединение с базой, общее для процесса."""
+        key = os.path.abspath(path)
+        with cls._databases_lock:
+            database = cls._databases.get(key)
+            if database is None:
+                database = cls._databases[key] = cls(path)
+            return database
+
+    @contextmanager
+    def batch(self):
+        """Группировка изменений в одну транзакцию, фиксируемую при выходе из внешнего блока."""
+        with self.lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.connection.commit()
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция одной операции; внутри batch() фиксация откладывается."""
+        with self.lock:
+            if self._batch_depth:
+                yield
+            else:
+                with self.connection:
+                    yield
+
+
+class SqliteRecordCollection:
+    """Коллекция поверх таблицы SQLite без загрузки записей в память.
+
+    Поиск по ID, число записей и обход выполняются запросами к базе.
+    Изменения, которые ещё не записаны через хранилище, лежат поверх таблицы:
+    новые записи - в added, изменённые - в changed, ID удалённых - в removed.
+    Хранилище убирает записи оттуда, когда записывает их в базу. Интерфейс
+    совпадает с RecordCollection.
+    """
+
+    def __init__(self, storage, next_id):
+        self.storage = storage
+        self.ids = IdSequence(next_id)
+        self.listeners = []
+        self.renumbered = []
+        self.changed = {}
+        self.added = {}
+        self.removed = set()
+
+    def __len__(self):
+        return self.storage.count() - len(self.removed) + len(self.added)
+
+    def __iter__(self):
+        for record in self.storage.scan():
+            if record["id"] in self.removed:
+                continue
+            yield self.changed.get(record["id"], record)
+        yield from list(self.added.values())
+
+    def __contains__(self, record_id):
+        return self.get(record_id) is not None
+
+    def __getitem__(self, record_id):
+        record = self.get(record_id)
+        if record is None:
+            raise KeyError(record_id)
+        return record
+
+    def get(self, record_id, default=None):
+        """Поиск записи по ID."""
+        record = self.added.get(record_id) or self.changed.get(record_id)
+        if record is not None:
+            return record
+        if record_id in self.removed:
+            return default
+        record = self.storage.find(record_id)
+        return default if record is None else record
+
+    def values(self, *fields):
+        """Кортежи значений нескольких полей fields всех записей."""
+        return map(itemgetter(*fields), self)
+
+    def add(self, record):
+        """Добавление новой записи."""
+        record_id = record["id"]
+        if record_id in self:
+            raise KeyError(record_id)
+        self.added[record_id] = record
+        self.ids.advance(record_id + 1)
+        for listener in self.listeners:
+            listener.add(record)
+
+    def put(self, record):
+        """Добавление записи или замена существующей с тем же ID."""
+        old = self.get(record["id"])
+        if old is None:
+            self.add(record)
+            return
+        self._set(record)
+        for listener in self.listeners:
+            listener.remove(old)
+            listener.add(record)
+
+    def update(self, record_id, changes):
+        """Изменение полей записи; KeyError, если записи нет."""
+        record = self[record_id]
+        old = dict(record)
+        record.update(changes)
+        self._set(record)
+        for listener in self.listeners:
+            listener.remove(old)
+            listener.add(record)
+        return record
+
+    def remove(self, record_id):
+        """Удаление записи; возвращает удалённую запись или None."""
+        record = self.added.pop(record_id, None)
+        if record is None:
+            record = self.get(record_id)
+            if record is None:
+                return None
+            self.changed.pop(record_id, None)
+            self.removed.add(record_id)
+        for listener in self.listeners:
+            listener.remove(record)
+        return record
+
+    def written(self, records=(), deleted=()):
+        """Отметка записей, которые хранилище записало в базу или удалило из неё."""
+        for record in records:
+            self.added.pop(record["id"], None)
+            self.changed.pop(record["id"], None)
+        for record_id in deleted:
+            self.removed.discard(record_id)
+
+    def _set(self, record):
+        if record["id"] in self.added:
+            self.added[record["id"]] = record
+        else:
+            self.changed[record["id"]] = record
+
+
+class SqliteStorage:
+    """Хранилище коллекции в таблице SQLite.
+
+    Интерфейс совпадает с JournalStorage, поэтому менеджеры работают с ним
+    так же. Дополнительно есть query: менеджеры передают в SQL условия
+    фильтрации, и они выполняются по индексам базы. Каждое изменение
+    выполняется в транзакции и увеличивает версию коллекции в таблице
+    collections; версия служит отпечатком состояния для производных данных
+    и кэша менеджеров. Она же используется для оптимистической проверки:
+    изменение проходит, только если версия в базе равна версии, с которой
+    работает этот экземпляр, иначе - ConflictError и пометка stale.
+    Одновременное чтение и запись из разных процессов обеспечивает сам
+    SQLite (режим WAL).
+
+    Коллекция в память не загружается: load возвращает
+    SqliteRecordCollection, которая находит записи по ID запросом к базе.
+    Итоги финансов (aggregate) и поиск дубликатов (fingerprint_ids) тоже
+    считает база, а индексы выборок (TaskIndex, ContactSearchIndex,
+    DateIndex) с SQLite не строятся. В памяти остаются только изменения,
+    ещё не записанные в базу, и поисковый индекс заметок.
+    """
+
+    supports_queries = True
+
+    def __init__(self, path, collection):
+        self.path = path
+        self.collection = collection
+        self.schema = SCHEMAS[collection]
+        self.database = Database.open(path)
+        self._lock = self.database.lock
+        self.connection = self.database.connection
+        self._version = None
+        self._records = None
+        self.stale = False
+        self._metric = f"storage.{collection}"
+        self._create()
+        columns = self.schema.columns
+        self._select = f"SELECT {', '.join(columns)} FROM {collection}"
+        self._insert = f"INSERT OR REPLACE INTO {collection} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+    def _create(self):
+        with self._transaction():
+            types = {"id": "INTEGER PRIMARY KEY"}
+            columns = ", ".join(f"{column} {types.get(column, '')}".strip() for column in self.schema.columns)
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {self.collection} ({columns})")
+            self._add_computed_columns()
+            for index in self.schema.indexes:
+                name = f"{self.collection}_{index.replace(', ', '_')}"
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {self.collection} ({index})")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS collections (name TEXT PRIMARY KEY, next_id INTEGER, version INTEGER)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS derived (collection TEXT, name TEXT, state TEXT, data TEXT, "
+                "PRIMARY KEY (collection, name))")
+            self.connection.execute(
+                "INSERT OR IGNORE INTO collections (name, next_id, version) VALUES (?, 1, 0)", (self.collection,))
+
+    def _add_computed_columns(self):
+        """Добавление вычисляемых столбцов, которых нет в таблице из старой версии, с их заполнением."""
+        existing = {row[1] for row in self.connection.execute(f"PRAGMA table_info({self.collection})")}
+        missing = [column for column in self.schema.computed if column not in existing]
+        if not missing:
+            return
+        for column in missing:
+            self.connection.execute(f"ALTER TABLE {self.collection} ADD COLUMN {column}")
+        rows = self.connection.execute(f"SELECT id, {', '.join(self.schema.fields)} FROM {self.collection}").fetchall()
+        assignments = ", ".join(f"{column} = ?" for column in missing)
+        self.connection.executemany(
+            f"UPDATE {self.collection} SET {assignments} WHERE id = ?",
+            ([self.schema.computed[column](record) for column in missing] + [record["id"]]
+             for record in map(self.schema.to_record, rows)))
+
+    @property
+    def version(self):
+        """Версия коллекции, с которой работает этот экземпляр."""
+        return self._version
+
+    def load(self):
+        """Коллекция записей поверх таблицы; сами записи читаются по мере обращения."""
+        with metrics.timer(self._metric + ".load"), self._lock:
+            # Версия читается до записей: при гонке с другим процессом она окажется
+            # старше данных, и следующее изменение честно получит ConflictError
+            next_id, self._version = self.connection.execute(
+                "SELECT next_id, version FROM collections WHERE name = ?", (self.collection,)).fetchone()
+            self.stale = False
+        self._records = SqliteRecordCollection(self, next_id)
+        return self._records
+
+    def find(self, record_id):
+        """Запись по ID или None."""
+        with self._lock:
+            row = self.connection.execute(f"{self._select} WHERE id = ?", (record_id,)).fetchone()
+        if row is None:
+            return None
+        metrics.add(self._metric + ".rows_read", 1)
+        return self.schema.to_record(row)
+
+    def count(self):
+        """Число записей в таблице."""
+        with self._lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM {self.collection}").fetchone()[0]
+
+    def scan(self, chunk_size=1000):
+        """Все записи в порядке ID; читаются частями, блокировка между частями отпускается."""
+        last_id = None
+        while True:
+            if last_id is None:
+                rows = self.query(limit=chunk_size)
+            else:
+                rows = self.query("id > ?", (last_id,), limit=chunk_size)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1]["id"]
+
+    def aggregate(self, expression, group_by=None):
+        """Значение агрегатного выражения по таблице или словарь группа -> значение.
+
+        expression и group_by задаются кодом менеджера и ссылаются на столбцы
+        таблицы, как where у query.
+        """
+        with metrics.timer(self._metric + ".query"), self._lock:
+            if group_by is None:
+                return self.connection.execute(f"SELECT {expression} FROM {self.collection}").fetchone()[0]
+            rows = self.connection.execute(
+                f"SELECT {group_by}, {expression} FROM {self.collection} GROUP BY 1 ORDER BY 1").fetchall()
+        return dict(rows)
+
+    def fingerprint_ids(self, key):
+        """ID записей с отпечатком key в порядке ID."""
+        where = " OR ".join(f"{column} = ?" for column in self.schema.fingerprints)
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT id FROM {self.collection} WHERE {where} ORDER BY id",
+                (key,) * len(self.schema.fingerprints)).fetchall()
+        return [row[0] for row in rows]
+
+    def query(self, where="", params=(), order_by="id", limit=None, offset=0):
+        """Выборка записей с условием на стороне SQLite.
+
+        where и order_by задаются кодом менеджера и ссылаются на столбцы
+        таблицы, значения передаются только через params.
+        """
+        sql = self._select
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params = tuple(params) + (limit, offset)
+        with metrics.timer(self._metric + ".query"), self._lock:
+            rows = self.connection.execute(sql, params).fetchall()
+        metrics.add(self._metric + ".rows_read", len(rows))
+        return [self.schema.to_record(row) for row in rows]
+
+    def insert(self, record):
+        """Добавление записи."""
+        self.insert_many([record])
+
+    def insert_many(self, records):
+        """Добавление пакета записей одной транзакцией."""
+        rows = [self.schema.to_row(record) for record in records]
+        if not rows:
+            return
+        with metrics.timer(self._metric + ".insert"), self._transaction():
+            self._bump(max(row[0] for row in rows) + 1)
+            self.connection.executemany(self._insert, rows)
+        metrics.add(self._metric + ".rows_written", len(rows))
+        self._written(records)
+
+    def update(self, record):
+        """Изменение записи."""
+        with self._transaction():
+            self._bump()
+            self.connection.execute(self._insert, self.schema.to_row(record))
+        self._written([record])
+
+    def delete(self, record_id):
+        """Удаление записи."""
+        with self._transaction():
+            self._bump()
+            self.connection.execute(f"DELETE FROM {self.collection} WHERE id = ?", (record_id,))
+        self._written(deleted=[record_id])
+
+    def save(self, records):
+        """Полная перезапись таблицы коллекции.
+
+        Для коллекции, полученной из этого хранилища, таблица и так содержит
+        записи, поэтому записываются только изменения поверх неё.
+        """
+        if records is self._records:
+            with self.batch():
+                for record_id in list(records.removed):
+                    self.delete(record_id)
+                self.insert_many(list(records.added.values()) + list(records.changed.values()))
+            return
+        with metrics.timer(self._metric + ".save"), self._transaction():
+            self._bump(records.ids.next_id)
+            self.connection.execute(f"DELETE FROM {self.collection}")
+            self.connection.executemany(self._insert, (self.schema.to_row(record) for record in records))
+        metrics.add(self._metric + ".rows_written", len(records))
+
+    def _written(self, records=(), deleted=()):
+        if self._records is not None:
+            self._records.written(records, deleted)
+
+    def batch(self):
+        """Группировка изменений в одну транзакцию (общую для коллекций этой базы)."""
+        return self.database.batch()
+
+    def _transaction(self):
+        return self.database.transaction()
+
+    def _bump(self, next_id=0):
+        """Увеличение версии коллекции с проверкой, что её не изменил другой процесс.
+
+        Вызывается до изменения данных, поэтому при конфликте в транзакции
+        ничего не остаётся. Экземпляр без load() (перенос данных) пишет без проверки.
+        """
+        if self._version is None:
+            self.connection.execute(
+                "UPDATE collections SET version = version + 1, next_id = MAX(next_id, ?) WHERE name = ?",
+                (next_id, self.collection))
+            return
+        cursor = self.connection.execute(
+            "UPDATE collections SET version = version + 1, next_id = MAX(next_id, ?) WHERE name = ? AND version = ?",
+            (next_id, self.collection, self._version))
+        if cursor.rowcount != 1:
+            self.stale = True
+            raise ConflictError(f"Коллекция {self.collection} изменена другим процессом. "
+                                "Изменение не сохранено, данные нужно перечитать.")
+        self._version += 1
+
+    def state(self):
+        """Версия коллекции в базе."""
+        with self._lock:
+            return self.connection.execute(
+                "SELECT version FROM collections WHERE name = ?", (self.collection,)).fetchone()[0]
+
+    def fingerprint(self):
+        """Отпечаток состояния данных на диске (для кэша менеджеров)."""
+        return self.state()
+
+    def load_derived(self, name):
+        """Загрузка производных данных, если они соответствуют текущей версии."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT state, data FROM derived WHERE collection = ? AND name = ?", (self.collection, name)).fetchone()
+        if row is None or json.loads(row[0]) != self.state():
+            return None
+        return json.loads(row[1])
+
+    def save_derived(self, name, data):
+        """Сохранение производных данных вместе с версией коллекции."""
+        state = json.dumps(self.state())
+        with self._transaction():
+            self.connection.execute(
+                "INSERT OR REPLACE INTO derived (collection, name, state, data) VALUES (?, ?, ?, ?)",
+                (self.collection, name, state, json.dumps(data, ensure_ascii=False)))
+
+    def load_snapshot(self):
+        """Снимков нет: коллекция читается одним запросом, метод нужен для совместимости с JournalStorage."""
+        return None
+
+    def save_snapshot(self, data):
+        """Снимков нет, метод нужен для совместимости с JournalStorage."""
+
+    def wait(self):
+        """Фоновых операций нет, метод нужен для совместимости с JournalStorage."""
+
+
+def migrate(db_path="assistant.db", files=("tasks.json", "notes.json", "contacts.json", "finance.json")):
+    """Однократный перенос JSON-файлов (с журналами) в базу SQLite."""
+    from JournalStorage import JournalStorage
+    for path in files:
+        records = JournalStorage(path).load()
+        if not records:
+            continue
+        collection = os.path.splitext(os.path.basename(path))[0]
+        SqliteStorage(db_path, collection).save(records)
+        print(f"{path}: перенесено записей - {len(records)}.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,23 @@
+import os
+from JournalStorage import JournalStorage
+
+
+def open_storage(path):
+    """Хранилище для файла данных менеджера с учётом выбранного бэкенда.
+
+    Бэкенд задаётся переменной окружения ASSISTANT_BACKEND: json (по умолчанию),
+    binary или sqlite. Для binary данные лежат в компактных двоичных файлах
+    с расширением .bin вместо .json (перевести существующий файл:
+    python RecordFile.py finance.json finance.bin). Для sqlite все коллекции лежат в одной базе ASSISTANT_DB
+    (assistant.db), таблица называется по имени JSON-файла.
+    """
+    backend = os.environ.get("ASSISTANT_BACKEND", "json")
+    if backend == "json":
+        return JournalStorage(path)
+    if backend == "binary":
+        return JournalStorage(os.path.splitext(path)[0] + ".bin", format="binary")
+    if backend == "sqlite":
+        from SqliteStorage import SqliteStorage
+        collection = os.path.splitext(os.path.basename(path))[0]
+        return SqliteStorage(os.environ.get("ASSISTANT_DB", "assistant.db"), collection)
+    raise ValueError(f"Неизвестный бэкенд хранилища: {backend}")
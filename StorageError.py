@@ -0,0 +1,6 @@
+class StorageError(Exception):
+    """Файл данных повреждён или не может быть прочитан."""
+
+
+class ConflictError(StorageError):
+    """Данные изменены другим процессом после загрузки; изменение не сохранено."""
@@ -0,0 +1,118 @@
+import bisect
+import heapq
+from itertools import islice
+from DateIndex import to_ordinal
+from Metrics import metrics
+from SortedKeys import SortedKeys
+
+PRIORITIES = ("Высокий", "Средний", "Низкий")
+
+# Задачи без корректного срока идут после всех задач со сроком
+NO_DUE_DATE = 10 ** 9
+
+
+class TaskIndex:
+    """Составной индекс задач: статус и приоритет, внутри - срок.
+
+    Для каждой пары (выполнена, приоритет) хранится отсортированный список
+    (порядковый номер срока, ID). Запрос выбирает нужные корзины, в каждой
+    бинарным поиском находит диапазон сроков и сливает диапазоны через heapq,
+    поэтому запрос вроде "просроченные открытые задачи с высоким приоритетом"
+    стоит O(log N + k) и не трогает остальные задачи.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+
+    @classmethod
+    def build(cls, tasks):
+        """Построение индекса по всем задачам.
+
+        Из коллекции читаются только поля индекса, а каждый различный срок
+        разбирается один раз.
+        """
+        index = cls()
+        ordinals = {}
+        buckets = {}
+        for task_id, done, priority, due_date in tasks.values("id", "done", "priority", "due_date"):
+            key = ordinals.get(due_date)
+            if key is None:
+                ordinal = to_ordinal(due_date)
+                key = ordinals[due_date] = NO_DUE_DATE if ordinal is None else ordinal
+            buckets.setdefault((bool(done), priority), []).append((key, task_id))
+        index._buckets = {bucket: SortedKeys(keys) for bucket, keys in buckets.items()}
+        return index
+
+    @staticmethod
+    def _bucket(task):
+        return bool(task["done"]), task["priority"]
+
+    @staticmethod
+    def _key(task):
+        ordinal = to_ordinal(task["due_date"])
+        return (NO_DUE_DATE if ordinal is None else ordinal), task["id"]
+
+    def add(self, task):
+        """Добавление задачи в индекс."""
+        self._keys(self._bucket(task)).add(self._key(task))
+
+    def remove(self, task):
+        """Удаление задачи из индекса."""
+        keys = self._buckets.get(self._bucket(task))
+        if keys is not None:
+            keys.remove(self._key(task))
+
+    def _keys(self, bucket):
+        keys = self._buckets.get(bucket)
+        if keys is None:
+            keys = self._buckets[bucket] = SortedKeys()
+        return keys
+
+    def query(self, done=None, priorities=None, due_from=None, due_to=None,
+              order_by="due_date", offset=0, limit=None):
+        """ID задач, подходящих под все условия, в заданном порядке.
+
+        done - True/False или None (любой статус), priorities - список
+        приоритетов или None, due_from/due_to - границы срока (порядковые
+        номера дней, включительно). order_by: due_date, priority или id.
+        """
+        statuses = (False, True) if done is None else (bool(done),)
+        if priorities is None:
+            priorities = list(PRIORITIES) + sorted({p for _, p in self._buckets} - set(PRIORITIES))
+
+        if order_by == "priority":
+            priorities = sorted(priorities, key=lambda p: PRIORITIES.index(p) if p in PRIORITIES else len(PRIORITIES))
+            groups = [self._ranges(statuses, [priority], due_from, due_to) for priority in priorities]
+        else:
+            groups = [self._ranges(statuses, priorities, due_from, due_to)]
+        ids = (task_id for ranges in groups for task_id in self._merge(ranges))
+        if order_by == "id":
+            ids = iter(sorted(ids))
+        stop = None if limit is None else offset + limit
+        result = list(islice(ids, offset, stop))
+        metrics.scan("tasks.index", sum(hi - lo for ranges in groups for _, lo, hi in ranges), len(result))
+        return result
+
+    @staticmethod
+    def _merge(ranges):
+        """ID из отсортированных диапазонов корзин в общем порядке (срок, ID)."""
+        return (task_id for _, task_id in heapq.merge(*(map(keys.__getitem__, range(lo, hi)) for keys, lo, hi in ranges)))
+
+    def _ranges(self, statuses, priorities, due_from, due_to):
+        """Диапазоны (ключи корзины, начало, конец) под условия запроса."""
+        ranges = []
+        for status in statuses:
+            for priority in priorities:
+                keys = self._buckets.get((status, priority))
+                if not keys:
+                    continue
+                keys = keys.ordered()
+                lo = 0 if due_from is None else bisect.bisect_left(keys, (due_from,))
+                if due_to is not None:
+                    hi = bisect.bisect_left(keys, (due_to + 1,))
+                elif due_from is not None:
+                    hi = bisect.bisect_left(keys, (NO_DUE_DATE,))
+                else:
+                    hi = len(keys)
+                ranges.append((keys, lo, hi))
+        return ranges
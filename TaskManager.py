@@ -1,24 +1,78 @@
-import json
-import csv
-from datetime import datetime
+from collections import deque
+from datetime import datetime, date
+from Storage import open_storage
+from CsvImporter import CsvImporter, require_fields
+from RecordExporter import RecordExporter
+from DateIndex import to_ordinal
+from TaskIndex import TaskIndex, PRIORITIES
+from TaskScheduler import TaskScheduler, DUE
+from Metrics import instrumented
 
+@instrumented("tasks")
 class TaskManager:
-    def __init__(self):
+    CSV_FIELDS = ["title", "description", "done", "priority", "due_date"]
+
+    def __init__(self, reminders=True):
         self.tasks_file = "tasks.json"
-        self.tasks = self.load_tasks()
+        self.storage = open_storage(self.tasks_file)
+        snapshot = self.storage.load_snapshot()
+        if snapshot is None:
+            self.tasks = self.load_tasks()
+            # Выборки по SQLite выполняет сама база, индекс в памяти не нужен
+            self.index = None if self.storage.supports_queries else TaskIndex.build(self.tasks)
+        else:
+            self.tasks, self.index = snapshot
+        if self.index is not None:
+            self.tasks.listeners.append(self.index)
+        self.reminders = deque()
+        self.scheduler = None
+        if reminders:
+            self.scheduler = TaskScheduler.build(self.tasks, self.remind)
+            self.tasks.listeners.append(self.scheduler)
+            self.scheduler.start()
+
+    def close(self):
+        """Остановка планировщика напоминаний и сохранение снимка задач с индексом."""
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        self.storage.save_snapshot((self.tasks, self.index))
+
+    def remind(self, task_id, kind):
+        """Обработчик планировщика: напоминание откладывается до вывода меню."""
+        self.reminders.append((task_id, kind))
+
+    def show_reminders(self, limit=10):
+        """Вывод накопившихся напоминаний о сроках задач: не больше limit, остальные - числом."""
+        scheduler = self.scheduler
+        if scheduler is not None and (scheduler.overdue or scheduler.due_today):
+            # Задачи, сроки которых наступили до запуска, - одной строкой, а не по одной
+            print(f"Просроченных открытых задач: {scheduler.overdue}, со сроком сегодня: {scheduler.due_today}.")
+            scheduler.overdue = scheduler.due_today = 0
+        shown = 0
+        skipped = 0
+        while self.reminders:
+            task_id, kind = self.reminders.popleft()
+            task = self.tasks.get(task_id)
+            if task is None or task["done"]:
+                continue
+            if shown >= limit:
+                skipped += 1
+            elif kind == DUE:
+                print(f"Напоминание: срок задачи [{task_id}] {task['title']} - сегодня ({task['due_date']}).")
+                shown += 1
+            else:
+                print(f"Напоминание: задача [{task_id}] {task['title']} просрочена (срок {task['due_date']}).")
+                shown += 1
+        if skipped:
+            print(f"... и ещё {skipped} напоминаний о сроках задач.")
 
     def load_tasks(self):
-        """Загрузка задач из JSON-файла."""
-        try:
-            with open(self.tasks_file, "r") as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        """Загрузка задач из JSON-файла с применением журнала изменений."""
+        return self.storage.load()
 
     def save_tasks(self):
-        """Сохранение задач в JSON-файл."""
-        with open(self.tasks_file, "w") as file:
-            json.dump(self.tasks, file, indent=4)
+        """Полное сохранение задач в JSON-файл."""
+        self.storage.save(self.tasks)
 
     def add_task(self):
         """Добавление новой задачи."""
@@ -40,54 +94,136 @@ class TaskManager:
             print("Неверный формат даты. Используйте ДД-ММ-ГГГГ.")
             return
 
-        task_id = len(self.tasks) + 1
-        self.tasks.append({
-            "id": task_id,
+        task = {
+            "id": self.tasks.ids.allocate(),
             "title": title,
             "description": description,
             "done": False,
             "priority": priority,
             "due_date": due_date
-        })
-        self.save_tasks()
+        }
+        self.tasks.add(task)
+        self.storage.insert(task)
         print("Задача добавлена.")
 
     def list_tasks(self, filter_by=None):
         """Просмотр списка задач с возможностью фильтрации."""
-        tasks = self.tasks
+        criteria = {}
         if filter_by == "status":
             status = input("Введите статус (выполнено/не выполнено): ").strip().lower()
             if status == "выполнено":
-                tasks = [task for task in tasks if task["done"]]
+                criteria["done"] = True
             elif status == "не выполнено":
-                tasks = [task for task in tasks if not task["done"]]
+                criteria["done"] = False
             else:
                 print("Неверный статус.")
                 return
         elif filter_by == "priority":
-            priority = input("Введите приоритет (Высокий, Средний, Низкий): ").strip()
-            tasks = [task for task in tasks if task["priority"] == priority]
+            criteria["priority"] = input("Введите приоритет (Высокий, Средний, Низкий): ").strip()
         elif filter_by == "due_date":
-            due_date = input("Введите срок выполнения (ДД-ММ-ГГГГ): ").strip()
-            tasks = [task for task in tasks if task["due_date"] == due_date]
+            criteria["due_date"] = input("Введите срок выполнения (ДД-ММ-ГГГГ): ").strip()
+        tasks = self.find_tasks(**criteria)
 
         if not tasks:
             print("Нет задач, соответствующих критериям.")
             return
 
+        self.display_tasks(tasks)
+
+    def display_tasks(self, tasks):
+        """Вывод списка задач."""
         for task in tasks:
             status = "Выполнено" if task["done"] else "Не выполнено"
             print(f"[{task['id']}] {task['title']} - {status}, Приоритет: {task['priority']}, Срок: {task['due_date']}")
 
+    def find_tasks(self, done=None, priority=None, due_date=None):
+        """Задачи, подходящие под все заданные условия, в порядке ID."""
+        due = None
+        if due_date is not None:
+            due = to_ordinal(due_date)
+            if due is None:
+                return []
+        return self.query_tasks(done, None if priority is None else [priority], due, due, order_by="id")
+
+    def query_tasks(self, done=None, priorities=None, due_from=None, due_to=None,
+                    order_by="due_date", offset=0, limit=None):
+        """Выборка задач с пересечением условий, сортировкой и постраничным выводом.
+
+        Параметры совпадают с TaskIndex.query. Если хранилище умеет выполнять
+        запросы (SQLite), выборка передаётся ему.
+        """
+        if not self.storage.supports_queries:
+            ids = self.index.query(done, priorities, due_from, due_to, order_by, offset, limit)
+            return [self.tasks[task_id] for task_id in ids]
+
+        conditions = []
+        params = []
+        if done is not None:
+            conditions.append("done = ?")
+            params.append(int(done))
+        if priorities is not None:
+            conditions.append(f"priority IN ({', '.join('?' * len(priorities))})")
+            params.extend(priorities)
+        if due_from is not None:
+            conditions.append("due_ordinal >= ?")
+            params.append(due_from)
+        if due_to is not None:
+            conditions.append("due_ordinal <= ?")
+            params.append(due_to)
+        order = "due_ordinal IS NULL, due_ordinal, id"
+        if order_by == "priority":
+            ranks = " ".join(f"WHEN '{priority}' THEN {rank}" for rank, priority in enumerate(PRIORITIES))
+            order = f"CASE priority {ranks} ELSE {len(PRIORITIES)} END, {order}"
+        elif order_by == "id":
+            order = "id"
+        return self.storage.query(" AND ".join(conditions), params, order, limit, offset)
+
+    def search_tasks(self, page_size=20):
+        """Поиск задач по нескольким условиям с сортировкой и постраничным выводом."""
+        status = input("Статус (выполнено/не выполнено, пусто - любой): ").strip().lower()
+        done = {"выполнено": True, "не выполнено": False}.get(status)
+        if status and done is None:
+            print("Неверный статус.")
+            return
+
+        priorities = [p.strip() for p in input("Приоритеты через запятую (пусто - любые): ").split(",") if p.strip()]
+        if any(priority not in PRIORITIES for priority in priorities):
+            print("Недопустимый приоритет. Используйте 'Высокий', 'Средний' или 'Низкий'.")
+            return
+
+        if input("Только просроченные? (да/нет): ").strip().lower() == "да":
+            due_from, due_to = None, date.today().toordinal() - 1
+        else:
+            bounds = []
+            for prompt in ("Срок с (ДД-ММ-ГГГГ, пусто - без границы): ", "Срок по (ДД-ММ-ГГГГ, пусто - без границы): "):
+                text = input(prompt).strip()
+                bounds.append(to_ordinal(text) if text else None)
+                if text and bounds[-1] is None:
+                    print("Неверный формат даты. Используйте ДД-ММ-ГГГГ.")
+                    return
+            due_from, due_to = bounds
+
+        order_by = "priority" if input("Сортировать по (срок/приоритет): ").strip().lower() == "приоритет" else "due_date"
+        offset = 0
+        while True:
+            tasks = self.query_tasks(done, priorities or None, due_from, due_to, order_by, offset, page_size)
+            if not tasks:
+                if not offset:
+                    print("Нет задач, соответствующих критериям.")
+                return
+            self.display_tasks(tasks)
+            offset += len(tasks)
+            if len(tasks) < page_size or input("Показать ещё? (да/нет): ").strip().lower() != "да":
+                return
+
     def mark_task_done(self):
         """Отметка задачи как выполненной."""
         try:
             task_id = int(input("Введите ID задачи: "))
-            task = next(task for task in self.tasks if task["id"] == task_id)
-            task["done"] = True
-            self.save_tasks()
+            task = self.tasks.update(task_id, {"done": True})
+            self.storage.update(task)
             print("Задача отмечена как выполненная.")
-        except StopIteration:
+        except KeyError:
             print("Задача с таким ID не найдена.")
         except ValueError:
             print("ID должен быть числом.")
@@ -96,32 +232,33 @@ class TaskManager:
         """Редактирование существующей задачи."""
         try:
             task_id = int(input("Введите ID задачи для редактирования: "))
-            task = next(task for task in self.tasks if task["id"] == task_id)
+            task = self.tasks[task_id]
+            changes = {}
 
             print(f"Редактирование задачи: {task['title']}")
             new_title = input("Новое название (оставьте пустым для сохранения текущего): ").strip()
             if new_title:
-                task["title"] = new_title
+                changes["title"] = new_title
 
             new_description = input("Новое описание (оставьте пустым для сохранения текущего): ").strip()
             if new_description:
-                task["description"] = new_description
+                changes["description"] = new_description
 
             new_priority = input("Новый приоритет (Высокий, Средний, Низкий): ").strip()
             if new_priority in {"Высокий", "Средний", "Низкий"}:
-                task["priority"] = new_priority
+                changes["priority"] = new_priority
 
             new_due_date = input("Новый срок выполнения (ДД-ММ-ГГГГ): ").strip()
             if new_due_date:
                 try:
                     datetime.strptime(new_due_date, "%d-%m-%Y")  # Проверка формата даты
-                    task["due_date"] = new_due_date
+                    changes["due_date"] = new_due_date
                 except ValueError:
                     print("Неверный формат даты. Используйте ДД-ММ-ГГГГ.")
 
-            self.save_tasks()
+            self.storage.update(self.tasks.update(task_id, changes))
             print("Задача обновлена.")
-        except StopIteration:
+        except KeyError:
             print("Задача с таким ID не найдена.")
         except ValueError:
             print("ID должен быть числом.")
@@ -130,52 +267,74 @@ class TaskManager:
         """Удаление задачи."""
         try:
             task_id = int(input("Введите ID задачи для удаления: "))
-            self.tasks = [task for task in self.tasks if task["id"] != task_id]
-            self.save_tasks()
+            if self.tasks.remove(task_id) is not None:
+                self.storage.delete(task_id)
             print("Задача удалена.")
         except ValueError:
             print("ID должен быть числом.")
 
-    def import_tasks(self):
-        """Импорт задач из CSV."""
+    @staticmethod
+    def parse_csv_row(row):
+        """Проверка строки CSV и преобразование её в задачу (без ID)."""
+        require_fields(row, TaskManager.CSV_FIELDS)
+        title = row["title"].strip()
+        if not title:
+            raise ValueError("Название задачи обязательно.")
+        if row["priority"] not in {"Высокий", "Средний", "Низкий"}:
+            raise ValueError(f"Недопустимый приоритет '{row['priority']}'.")
+        try:
+            datetime.strptime(row["due_date"], "%d-%m-%Y")  # Проверка формата даты
+        except ValueError:
+            raise ValueError(f"Неверный формат даты '{row['due_date']}'. Используйте ДД-ММ-ГГГГ.")
+        return {
+            "title": title,
+            "description": row["description"],
+            "done": row["done"].lower() == "true",
+            "priority": row["priority"],
+            "due_date": row["due_date"]
+        }
+
+    def import_tasks(self, batch_size=1000):
+        """Потоковый импорт задач из CSV с пакетной фиксацией.
+
+        Большие файлы разбираются и проверяются параллельно всеми процессорами.
+        """
         filename = input("Введите имя файла CSV для импорта: ").strip()
+        importer = CsvImporter(self.tasks, self.storage, self.parse_csv_row, self.CSV_FIELDS, batch_size,
+                               workers=None)
         try:
-            with open(filename, "r") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    self.tasks.append({
-                        "id": len(self.tasks) + 1,
-                        "title": row["title"],
-                        "description": row["description"],
-                        "done": row["done"].lower() == "true",
-                        "priority": row["priority"],
-                        "due_date": row["due_date"]
-                    })
-                self.save_tasks()
-                print("Задачи импортированы.")
+            report = importer.run(filename)
         except FileNotFoundError:
             print("Файл не найден.")
+            return
+        except ValueError as e:
+            print(f"Некорректный формат CSV-файла. {e}")
+            return
+        print("Задачи импортированы.")
+        report.print_summary()
 
     def export_tasks(self):
-        """Экспорт задач в CSV."""
-        filename = input("Введите имя файла CSV для экспорта: ").strip()
-        with open(filename, "w", newline="") as file:
-            fieldnames = ["title", "description", "done", "priority", "due_date"]
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for task in self.tasks:
-                writer.writerow({
-                    "title": task["title"],
-                    "description": task["description"],
-                    "done": task["done"],
-                    "priority": task["priority"],
-                    "due_date": task["due_date"]
-                })
-            print("Задачи экспортированы.")
+        """Потоковый экспорт задач в CSV, JSONL или gzip с фильтром по статусу и приоритету."""
+        filename = input("Введите имя файла для экспорта (.csv, .jsonl, можно добавить .gz): ").strip()
+        status = input("Статус (выполнено/не выполнено, пусто - любой): ").strip().lower()
+        if status not in ("", "выполнено", "не выполнено"):
+            print("Неверный статус.")
+            return
+        priority = input("Приоритет (Высокий, Средний, Низкий, пусто - любой): ").strip()
+        done = None if not status else status == "выполнено"
+        tasks = self.tasks if done is None and not priority else self.find_tasks(done, priority or None)
+        try:
+            report = RecordExporter(self.CSV_FIELDS, progress_every=100000).run(tasks, filename)
+        except OSError as e:
+            print(f"Не удалось записать файл: {e}")
+            return
+        print("Задачи экспортированы.")
+        report.print_summary()
 
     def manage_tasks(self):
         """Основное меню управления задачами."""
         while True:
+            self.show_reminders()
             print("\nУправление задачами:")
             print("1. Добавить задачу")
             print("2. Просмотреть задачи")
@@ -183,9 +342,10 @@ class TaskManager:
             print("4. Редактировать задачу")
             print("5. Удалить задачу")
             print("6. Импорт задач из CSV")
-            print("7. Экспорт задач в CSV")
+            print("7. Экспорт задач (CSV, JSONL, gzip)")
             print("8. Фильтровать задачи")
-            print("9. Назад")
+            print("9. Поиск задач по нескольким условиям")
+            print("10. Назад")
 
             choice = input("Введите номер действия: ")
 
@@ -207,6 +367,8 @@ class TaskManager:
                 filter_by = input("Фильтровать по (status/priority/due_date): ").strip()
                 self.list_tasks(filter_by)
             elif choice == '9':
+                self.search_tasks()
+            elif choice == '10':
                 break
             else:
                 print("Неверный выбор.")
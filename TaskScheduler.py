@@ -0,0 +1,183 @@
+import heapq
+import time
+import threading
+from datetime import date
+from DateIndex import to_ordinal
+
+DUE = "due"
+OVERDUE = "overdue"
+
+
+class TaskScheduler:
+    """Фоновый планировщик напоминаний о сроках задач.
+
+    Открытые задачи лежат в минимальной куче по моменту следующего события:
+    начало дня срока (DUE) и начало следующего дня (OVERDUE). Поток спит на
+    Condition до ближайшего события и просыпается раньше, только если новая
+    задача оказалась в вершине кучи, поэтому в простое процессор не
+    расходуется. Изменения задач приходят через listeners коллекции:
+    добавление - O(log N), удаление ленивое - запись в куче помечается
+    устаревшей по номеру версии и выбрасывается при извлечении.
+    on_reminder(task_id, kind) вызывается из потока планировщика.
+
+    Планируются только события позже текущего момента: задача, срок которой
+    уже прошёл, напоминания не получает, а у задачи со сроком сегодня
+    остаётся только OVERDUE. Сколько таких задач было при построении,
+    показывают счётчики overdue и due_today - их выводят одной строкой,
+    а не напоминанием на каждую задачу.
+    """
+
+    def __init__(self, on_reminder, clock=time.time):
+        self.on_reminder = on_reminder
+        self.clock = clock
+        self._heap = []
+        self._versions = {}
+        self._counter = 0
+        self._deadlines = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.overdue = 0
+        self.due_today = 0
+
+    @classmethod
+    def build(cls, tasks, on_reminder, clock=time.time):
+        """Планировщик по всем открытым задачам (куча строится за O(N)).
+
+        Из коллекции читаются только ID, статус и срок задач.
+        """
+        scheduler = cls(on_reminder, clock)
+        now = clock()
+        for task_id, done, due_date in tasks.values("id", "done", "due_date"):
+            entry = scheduler._entry(task_id, done, due_date, now)
+            if entry is not None:
+                scheduler._heap.append(entry)
+                if entry[3] == OVERDUE:
+                    scheduler.due_today += 1
+            elif not done and scheduler._deadline(due_date) is not None:
+                scheduler.overdue += 1
+        heapq.heapify(scheduler._heap)
+        return scheduler
+
+    def __len__(self):
+        return len(self._versions)
+
+    def _deadline(self, due_date):
+        """Начало дня срока и следующего дня по местному времени.
+
+        Различных дат мало по сравнению с числом задач, поэтому результат
+        кэшируется по тексту даты.
+        """
+        deadline = self._deadlines.get(due_date)
+        if deadline is None:
+            ordinal = to_ordinal(due_date)
+            if ordinal is None:
+                return None
+            deadline = self._deadlines[due_date] = (
+                time.mktime(date.fromordinal(ordinal).timetuple()),
+                time.mktime(date.fromordinal(ordinal + 1).timetuple())
+            )
+        return deadline
+
+    def _entry(self, task_id, done, due_date, now=None):
+        if done:
+            return None
+        deadline = self._deadline(due_date)
+        if deadline is None:
+            return None
+        due, overdue = deadline
+        now = self.clock() if now is None else now
+        if overdue <= now:
+            return None
+        self._counter += 1
+        self._versions[task_id] = self._counter
+        if due <= now:
+            return overdue, self._counter, task_id, OVERDUE, overdue
+        return due, self._counter, task_id, DUE, overdue
+
+    def _push(self, entry):
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._condition.notify()
+        # Устаревших записей больше половины - куча пересобирается
+        if len(self._heap) > 2 * len(self._versions) + 1024:
+            self._heap = [item for item in self._heap if self._versions.get(item[2]) == item[1]]
+            heapq.heapify(self._heap)
+
+    def add(self, task):
+        """Постановка задачи в расписание (выполненные и без срока пропускаются)."""
+        with self._condition:
+            entry = self._entry(task["id"], task["done"], task["due_date"])
+            if entry is not None:
+                self._push(entry)
+
+    def remove(self, task):
+        """Снятие задачи с расписания."""
+        with self._condition:
+            self._versions.pop(task["id"], None)
+
+    def next_event(self):
+        """Ближайшее событие (время, ID задачи, вид) или None."""
+        with self._condition:
+            self._drop_stale()
+            if not self._heap:
+                return None
+            timestamp, _, task_id, kind, _ = self._heap[0]
+            return timestamp, task_id, kind
+
+    def _drop_stale(self):
+        while self._heap and self._versions.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def _due_events(self):
+        """Извлечение наступивших событий; после DUE ставится OVERDUE."""
+        now = self.clock()
+        events = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return events
+            _, _, task_id, kind, overdue = heapq.heappop(self._heap)
+            events.append((task_id, kind))
+            if kind == DUE:
+                self._counter += 1
+                self._versions[task_id] = self._counter
+                heapq.heappush(self._heap, (overdue, self._counter, task_id, OVERDUE, overdue))
+            else:
+                del self._versions[task_id]
+
+    def start(self):
+        """Запуск фонового потока."""
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка фонового потока."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+                    events = self._due_events()
+                    if events:
+                        break
+                    if self._heap:
+                        delay = self._heap[0][0] - self.clock()
+                        self._condition.wait(min(max(delay, 0), threading.TIMEOUT_MAX))
+                    else:
+                        self._condition.wait()
+            # Обработчик вызывается без блокировки, чтобы не задерживать изменения задач
+            for task_id, kind in events:
+                self.on_reminder(task_id, kind)
@@ -0,0 +1,410 @@
+"""Нагрузочные замеры менеджеров помощника на синтетических данных.
+
+Для каждого набора (notes, tasks, contacts, finance) и каждого размера
+генерируются детерминированные данные (зерно --seed), после чего настоящие
+классы менеджеров прогоняются по сценариям: загрузка, сохранение, поиск и
+фильтры, отчёты, импорт и экспорт CSV. Загрузка замеряется дважды: load -
+со снимком и производными файлами предыдущего запуска, cold_load - после
+их удаления перед каждым прогоном. Ввод подставляется из списка
+ответов, вывод отбрасывается. Каждый набор и размер выполняется в
+отдельном процессе во временном каталоге, чтобы пиковая память (RSS)
+относилась только к нему. Бэкенд хранилища берётся из ASSISTANT_BACKEND.
+
+Запуск:
+    python benchmark.py --scales 1000,100000 --output results.json
+    python benchmark.py --baseline baseline.json --save-baseline
+    python benchmark.py --baseline baseline.json --tolerance 0.25
+
+Результат - JSON с перцентилями задержки (мс) и пропускной способностью
+(записей в секунду) по сценариям и пиковой памятью (МБ) процесса каждого
+набора в разделе peak_rss_mb: ru_maxrss - максимум за всю жизнь процесса,
+поэтому отдельным сценариям он не приписывается. При сравнении с базовой линией
+регрессией считается рост медианы больше чем на tolerance; тогда код
+возврата 1. Размеры 1M и 10M требуют многих гигабайт памяти.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import builtins
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import date
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCALES = {"1k": 1000, "100k": 100000, "1m": 1000000, "10m": 10000000}
+
+WORDS = ("встреча", "проект", "отчёт", "покупки", "звонок", "идея", "план", "бюджет", "поездка",
+         "книга", "ремонт", "врач", "подарок", "курс", "спорт", "договор", "сервер", "релиз")
+FIRST_NAMES = ("Иван", "Мария", "Пётр", "Анна", "Сергей", "Ольга", "Алексей", "Елена", "Дмитрий", "Наталья")
+LAST_NAMES = ("Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов", "Соколова", "Лебедев", "Новикова")
+CATEGORIES = ("Еда", "Транспорт", "Жильё", "Развлечения", "Здоровье", "Зарплата", "Подарки", "Связь")
+PRIORITIES = ("Высокий", "Средний", "Низкий")
+
+
+def random_date(rng, first_year=2015, last_year=2025):
+    day = date.fromordinal(rng.randint(date(first_year, 1, 1).toordinal(), date(last_year, 12, 31).toordinal()))
+    return day.strftime("%d-%m-%Y")
+
+
+def generate_notes(count, seed):
+    """Заметки: заголовок из двух слов, текст из 5-30 слов."""
+    rng = random.Random(seed)
+    for record_id in range(1, count + 1):
+        yield {
+            "id": record_id,
+            "title": " ".join(rng.choices(WORDS, k=2)).capitalize(),
+            "content": " ".join(rng.choices(WORDS, k=rng.randint(5, 30))),
+            "timestamp": f"{random_date(rng)} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+        }
+
+
+def generate_tasks(count, seed):
+    """Задачи: четверть выполнена, приоритеты и сроки распределены равномерно."""
+    rng = random.Random(seed)
+    for record_id in range(1, count + 1):
+        yield {
+            "id": record_id,
+            "title": f"{rng.choice(WORDS).capitalize()} {record_id}",
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(3, 10))),
+            "done": rng.random() < 0.25,
+            "priority": rng.choice(PRIORITIES),
+            "due_date": random_date(rng, 2024, 2027)
+        }
+
+
+def generate_contacts(count, seed):
+    """Контакты: имя и фамилия, телефон +7 и адрес почты."""
+    rng = random.Random(seed)
+    for record_id in range(1, count + 1):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        yield {
+            "id": record_id,
+            "name": name,
+            "phone": f"+7{rng.randint(9000000000, 9999999999)}",
+            "email": f"user{record_id}@example.com"
+        }
+
+
+def generate_records(count, seed):
+    """Финансовые записи: расходы и доходы по категориям за десять лет."""
+    rng = random.Random(seed)
+    for record_id in range(1, count + 1):
+        category = rng.choice(CATEGORIES)
+        amount = round(rng.uniform(10000, 150000) if category == "Зарплата" else -rng.uniform(50, 5000), 2)
+        yield {
+            "id": record_id,
+            "amount": amount,
+            "category": category,
+            "date": random_date(rng),
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(1, 5)))
+        }
+
+
+def _open(name):
+    """Менеджер набора name (импорт по требованию, как в главном меню)."""
+    if name == "notes":
+        from NoteManager import NoteManager
+        return NoteManager()
+    if name == "tasks":
+        from TaskManager import TaskManager
+        return TaskManager(reminders=False)
+    if name == "contacts":
+        from ContactManager import ContactManager
+        return ContactManager()
+    from FinanceManager import FinanceManager
+    return FinanceManager()
+
+
+def _close(name, manager):
+    """Сохранение производных данных и снимка, остановка менеджера."""
+    if name == "notes":
+        manager.save_index()
+    elif name == "finance":
+        manager.save_ledger()
+    manager.close()
+
+
+def _drop_derived(data_file):
+    """Удаление снимка и производных данных (итогов, индексов) коллекции."""
+    from Storage import open_storage
+    storage = open_storage(data_file)
+    if storage.supports_queries:
+        # У SQLite снимков нет, производные данные лежат в таблице derived
+        with storage.database.transaction():
+            storage.connection.execute("DELETE FROM derived WHERE collection = ?", (storage.collection,))
+        return
+    directory, base = os.path.split(os.path.abspath(storage.path))
+    for file in os.listdir(directory):
+        if file.startswith(base + ".") and not file.endswith((".journal", ".lock")):
+            os.remove(os.path.join(directory, file))
+
+
+# Набор: (файл данных, генератор, сценарии).
+# Сценарий: (имя, метод менеджера, ответы на запросы ввода).
+SUITES = {
+    "notes": ("notes.json", generate_notes, [
+        ("list_notes", "list_notes", []),
+        ("search_notes", "search_notes", ["проект бюджет"]),
+        ("search_notes_phrase", "search_notes", ['"план поездка"']),
+        ("search_notes_prefix", "search_notes", ["рем*"]),
+        ("save_notes", "save_notes", []),
+    ]),
+    "tasks": ("tasks.json", generate_tasks, [
+        ("list_tasks", "list_tasks", []),
+        ("list_tasks_status", "list_tasks", ["не выполнено"], "status"),
+        ("list_tasks_priority", "list_tasks", ["Высокий"], "priority"),
+        ("list_tasks_due_date", "list_tasks", ["15-06-2025"], "due_date"),
+        ("save_tasks", "save_tasks", []),
+    ]),
+    "contacts": ("contacts.json", generate_contacts, [
+        ("search_contact", "search_contact", ["Мария Петрова"]),
+        ("search_contact_phone", "search_contact", ["+79123456789"]),
+        ("search_contact_prefix", "search_contact_prefix", ["Серг"]),
+        ("save_contacts", "save_contacts", []),
+    ]),
+    "finance": ("finance.json", generate_records, [
+        ("generate_report", "generate_report", ["01-01-2020", "31-03-2020"]),
+        ("calculate_balance", "calculate_balance", []),
+        ("group_by_category", "group_by_category", []),
+        ("group_by_month", "group_by_month", []),
+        ("save_records", "save_records", []),
+    ]),
+}
+
+IMPORT_METHODS = {"notes": "import_notes", "tasks": "import_tasks",
+                  "contacts": "import_contacts", "finance": "import_records"}
+# Экспорт: метод и ответы на запросы фильтров после имени файла (без фильтров)
+EXPORT_METHODS = {"notes": ("export_notes", []), "tasks": ("export_tasks", ["", ""]),
+                  "contacts": ("export_contacts", []), "finance": ("export_records", ["", "", "", ""])}
+
+
+class _Answers:
+    """Подмена input: ответы выдаются по очереди из списка."""
+
+    def __init__(self, answers):
+        self._answers = iter(answers)
+
+    def __call__(self, prompt=""):
+        try:
+            return next(self._answers)
+        except StopIteration:
+            raise RuntimeError(f"Сценарию не хватило ответов на запрос: {prompt}")
+
+
+def _call(method, answers, *args):
+    """Вызов интерактивного метода с подставленным вводом и без вывода."""
+    saved = builtins.input
+    builtins.input = _Answers(answers)
+    try:
+        with open(os.devnull, "w") as sink, redirect_stdout(sink):
+            start = time.perf_counter()
+            method(*args)
+            return time.perf_counter() - start
+    finally:
+        builtins.input = saved
+
+
+def _timed(action):
+    with open(os.devnull, "w") as sink, redirect_stdout(sink):
+        start = time.perf_counter()
+        result = action()
+        return time.perf_counter() - start, result
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _summary(latencies, items):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+    median = percentile(50)
+    return {
+        "runs": len(latencies),
+        "p50_ms": round(median * 1000, 3),
+        "p90_ms": round(percentile(90) * 1000, 3),
+        "p99_ms": round(percentile(99) * 1000, 3),
+        "min_ms": round(latencies[0] * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "throughput": round(items / median, 1) if median > 0 else None
+    }
+
+
+def run_suite(name, count, repeat, seed):
+    """Прогон одного набора в текущем каталоге; возвращает словарь сценариев."""
+    from Storage import open_storage
+    from RecordCollection import RecordCollection
+    data_file, generator, scenarios = SUITES[name]
+    results = {}
+
+    _, records = _timed(lambda: RecordCollection(generator(count, seed)))
+    elapsed, _ = _timed(lambda: open_storage(data_file).save(records))
+    results["generate"] = _summary([elapsed], count)
+    del records
+
+    # Первая загрузка строит и сохраняет производные данные и снимок, замеряются последующие
+    manager = _open(name)
+    _close(name, manager)
+    del manager
+    loads = []
+    for _ in range(repeat):
+        elapsed, manager = _timed(lambda: _open(name))
+        loads.append(elapsed)
+        _close(name, manager)
+        del manager
+    results["load"] = _summary(loads, count)
+
+    # Холодная загрузка: без снимка и производных файлов, как после изменения данных другим процессом
+    loads = []
+    for _ in range(repeat):
+        _drop_derived(data_file)
+        elapsed, manager = _timed(lambda: _open(name))
+        loads.append(elapsed)
+        _close(name, manager)
+        del manager
+    results["cold_load"] = _summary(loads, count)
+
+    manager = _open(name)
+    for scenario in scenarios:
+        scenario_name, method, answers = scenario[:3]
+        args = scenario[3:]
+        latencies = [_call(getattr(manager, method), answers, *args) for _ in range(repeat)]
+        results[scenario_name] = _summary(latencies, count)
+
+    export_path = os.path.abspath(f"{name}_export.csv")
+    method, answers = EXPORT_METHODS[name]
+    latencies = [_call(getattr(manager, method), [export_path] + answers) for _ in range(repeat)]
+    results["export_csv"] = _summary(latencies, count)
+    _close(name, manager)
+    del manager
+
+    # Импорт в пустую коллекцию: файл экспорта содержит count строк
+    latencies = []
+    for run in range(repeat):
+        os.mkdir(f"import_{run}")
+        os.chdir(f"import_{run}")
+        try:
+            manager = _open(name)
+            latencies.append(_call(getattr(manager, IMPORT_METHODS[name]), [export_path]))
+            _close(name, manager)
+            del manager
+        finally:
+            os.chdir("..")
+    results["import_csv"] = _summary(latencies, count)
+    return results
+
+
+def _run_worker(name, count, repeat, seed):
+    """Набор в отдельном процессе и временном каталоге (чистый учёт памяти)."""
+    with tempfile.TemporaryDirectory(prefix="assistant-bench-") as workdir:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", name,
+                   "--count", str(count), "--repeat", str(repeat), "--seed", str(seed)]
+        env = dict(os.environ)
+        here = os.path.dirname(os.path.abspath(__file__))
+        env["PYTHONPATH"] = here + os.pathsep + env.get("PYTHONPATH", "")
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Набор {name} ({count}) завершился с ошибкой:\n{completed.stderr}")
+    output = json.loads(completed.stdout)
+    return output["scenarios"], output["peak_rss_mb"]
+
+
+def compare(results, baseline, tolerance):
+    """Сравнение медиан с базовой линией; возвращает список регрессий."""
+    regressions = []
+    for key, scenarios in results["suites"].items():
+        for scenario, current in scenarios.items():
+            previous = baseline.get("suites", {}).get(key, {}).get(scenario)
+            if not previous or not previous["p50_ms"]:
+                continue
+            ratio = current["p50_ms"] / previous["p50_ms"]
+            if ratio > 1 + tolerance:
+                regressions.append({"suite": key, "scenario": scenario, "baseline_ms": previous["p50_ms"],
+                                    "current_ms": current["p50_ms"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def _parse_scales(text):
+    scales = []
+    for item in text.split(","):
+        item = item.strip().lower()
+        scales.append(SCALES[item] if item in SCALES else int(item))
+    return scales
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Нагрузочные замеры персонального помощника")
+    parser.add_argument("--suites", default=",".join(SUITES), help="наборы через запятую")
+    parser.add_argument("--scales", default="1k,100k", help="размеры через запятую: 1k, 100k, 1m, 10m или числа")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого сценария")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл для результатов JSON (по умолчанию вывод на экран)")
+    parser.add_argument("--baseline", help="файл базовой линии для сравнения")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как базовую линию")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост медианы (0.2 = 20%%)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--count", type=int, help=argparse.SUPPRESS)
+    options = parser.parse_args(argv[1:])
+
+    if options.worker:
+        scenarios = run_suite(options.worker, options.count, options.repeat, options.seed)
+        json.dump({"scenarios": scenarios, "peak_rss_mb": _peak_rss_mb()}, sys.stdout)
+        return 0
+
+    results = {
+        "backend": os.environ.get("ASSISTANT_BACKEND", "json"),
+        "python": sys.version.split()[0],
+        "seed": options.seed,
+        "repeat": options.repeat,
+        "suites": {},
+        "peak_rss_mb": {}
+    }
+    for name in options.suites.split(","):
+        name = name.strip()
+        if name not in SUITES:
+            parser.error(f"неизвестный набор {name}")
+        for count in _parse_scales(options.scales):
+            print(f"{name} x {count}...", file=sys.stderr)
+            key = f"{name}/{count}"
+            results["suites"][key], results["peak_rss_mb"][key] = _run_worker(name, count, options.repeat, options.seed)
+
+    text = json.dumps(results, ensure_ascii=False, indent=4)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if options.baseline and options.save_baseline:
+        with open(options.baseline, "w", encoding="utf-8") as file:
+            file.write(text)
+        print(f"Базовая линия сохранена в {options.baseline}.", file=sys.stderr)
+    elif options.baseline:
+        with open(options.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), options.tolerance)
+        for item in regressions:
+            print(f"Регрессия {item['suite']} {item['scenario']}: {item['baseline_ms']} -> "
+                  f"{item['current_ms']} мс (x{item['ratio']})", file=sys.stderr)
+        if regressions:
+            return 1
+        print("Регрессий нет.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,53 +1,86 @@
-import json
-from datetime import datetime
-from NoteManager import NoteManager
-from TaskManager import TaskManager
-from ContactManager import ContactManager
-from FinanceManager import FinanceManager
-from Calculator import Calculator
-import csv
+import os
+from ManagerRegistry import ManagerRegistry
+from StorageError import StorageError
+from Metrics import Metrics
+
+# Модули менеджеров, калькулятора и профилировщика импортируются при первом
+# входе в раздел меню: до первого приглашения программа не загружает
+# хранилища, csv, NumPy и пул процессов. Сами данные при входе читаются из
+# снимка (см. JournalStorage.load_snapshot), который сохраняется при выходе.
 
 
 def main():
     print("Добро пожаловать в Персональный помощник!")
+    registry = ManagerRegistry()
+    calc = None
+    # Время ожидания ввода не попадает в таймеры операций
+    Metrics.install_input_hook()
+    profiler = None
+    if os.environ.get("ASSISTANT_PROFILE"):
+        from Profiler import Profiler
+        profiler = Profiler.from_env()
+
+    try:
+        while True:
+            print("\nВыберите действие:")
+            print("1. Управление заметками")
+            print("2. Управление задачами")
+            print("3. Управление контактами")
+            print("4. Управление финансовыми записями")
+            print("5. Калькулятор")
+            print("6. Метрики и профилирование")
+            print("7. Выход")
 
-    while True:
-        print("\nВыберите действие:")
-        print("1. Управление заметками")
-        print("2. Управление задачами")
-        print("3. Управление контактами")
-        print("4. Управление финансовыми записями")
-        print("5. Калькулятор")
-        print("6. Выход")
+            choice = input("Введите номер действия: ")
 
-        choice = input("Введите номер действия: ")
+            try:
+                if choice == '1':
+                    from NoteManager import NoteManager
+                    with registry.open(NoteManager) as note_manager:
+                        note_manager.manage_notes()
 
-        if choice == '1':
-            note_manager = NoteManager()
-            note_manager.manage_notes()
+                elif choice == '2':
+                    from TaskManager import TaskManager
+                    with registry.open(TaskManager) as task_manager:
+                        task_manager.manage_tasks()
 
-        elif choice == '2':
-            task_manager = TaskManager()
-            task_manager.manage_tasks()
+                elif choice == '3':
+                    from ContactManager import ContactManager
+                    with registry.open(ContactManager) as contact_manager:
+                        contact_manager.manage_contacts()
 
-        elif choice == '3':
-            contact_manager = ContactManager()
-            contact_manager.manage_contacts()
+                elif choice == '4':
+                    from FinanceManager import FinanceManager
+                    with registry.open(FinanceManager) as finance_manager:
+                        finance_manager.manage_finances()
 
-        elif choice == '4':
-            finance_manager = FinanceManager()
-            finance_manager.manage_finances()
+                elif choice == '5':
+                    if calc is None:
+                        from Calculator import Calculator
+                        calc = Calculator()
+                    calc.start_calculator()
 
-        elif choice == '5':
-            calc = Calculator()
-            calc.start_calculator()
+                elif choice == '6':
+                    if profiler is None:
+                        from Profiler import Profiler
+                        profiler = Profiler.from_env()
+                    profiler.manage_profiling()
 
-        elif choice == '6':
-            print("Выход из программы.")
-            break
+                elif choice == '7':
+                    if profiler is not None:
+                        profiler.finish()
+                    print("Выход из программы.")
+                    break
 
-        else:
-            print("Неверный выбор, пожалуйста, выберите правильный пункт.")
+                else:
+                    print("Неверный выбор, пожалуйста, выберите правильный пункт.")
+            except StorageError as e:
+                # Повреждённый файл или изменения другого процесса: данные не теряются,
+                # при следующем входе в раздел менеджер перечитает файлы
+                print(f"Ошибка хранилища: {e}")
+    finally:
+        # Менеджеры сохраняют снимки данных для быстрого следующего запуска
+        registry.invalidate()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
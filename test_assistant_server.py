@@ -0,0 +1,60 @@
+"""Проверка очерёдности команд AssistantServer без сетевого обмена.
+
+Запуск: python test_assistant_server.py (или python -m unittest test_assistant_server).
+"""
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+import AssistantServer
+from AssistantServer import AssistantServer as Server
+from AssistantService import AssistantService
+from ExpressionEngine import ExpressionError
+
+
+class AssistantServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="server-test-")
+        os.chdir(self.directory)
+        self.service = AssistantService()
+        self.server = Server(self.service)
+        listener = await self.server.start(unix_path=os.path.join(self.directory, "server.sock"))
+        listener.close()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    async def test_slow_calculation_does_not_block_reads_and_writes(self):
+        def slow_calculate(expression, variables=None):
+            time.sleep(0.5)
+            return 0
+
+        with mock.patch.object(self.service, "calculate", slow_calculate), \
+                mock.patch.object(AssistantServer, "CALCULATE_TIMEOUT", 0.2):
+            calculation = asyncio.create_task(self.server.execute("calculate", {"expression": "1"}))
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            task = await self.server.execute("add_task", {"title": "a", "priority": "Высокий",
+                                                          "due_date": "01-01-2030"})
+            balance = await self.server.execute("balance", {})
+            self.assertLess(time.monotonic() - started, 0.3)
+            self.assertEqual(task["id"], 1)
+            self.assertEqual(balance, 0)
+            with self.assertRaises(ExpressionError):
+                await calculation
+
+    async def test_calculate(self):
+        self.assertEqual(await self.server.execute("calculate", {"expression": "2 + 2"}), 4)
+        with self.assertRaises(ExpressionError):
+            await self.server.execute("calculate", {"expression": "(-8) ** 0.5"})
+
+
+if __name__ == "__main__":
+    unittest.main()
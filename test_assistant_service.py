@@ -0,0 +1,73 @@
+"""Проверка пакетного режима AssistantService (run_batch).
+
+Запуск: python test_assistant_service.py (или python -m unittest test_assistant_service).
+"""
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from AssistantService import AssistantService, run_batch
+from JournalStorage import JournalStorage
+
+
+class RunBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="batch-test-")
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def run_lines(self, lines):
+        output = io.StringIO()
+        errors = run_batch(lines, output)
+        return errors, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_invalid_lines_are_reported_per_line(self):
+        errors, responses = self.run_lines([
+            '{"command": "add_task", "title": "a", "priority": "Высокий", "due_date": "01-01-2030"}\n',
+            '"oops"\n',
+            '[1, 2]\n',
+            '{"command": "add_task", "title": 5, "priority": "Высокий", "due_date": "01-01-2030"}\n',
+            '{"command": "edit_task", "task_id": 1, "done": "false"}\n',
+            '{"command": "list_tasks", "priorities": "Высокий"}\n',
+            '{"command": ["add_task"]}\n',
+            '{"title": "без команды"}\n',
+            '{"command": "get_task", "task_id": 1}\n',
+        ])
+        self.assertEqual(errors, 6)
+        self.assertEqual([response["ok"] for response in responses],
+                         [True, False, False, False, True, False, False, False, True])
+        self.assertIn("JSON-объектом", responses[1]["error"])
+        self.assertIn("'title'", responses[3]["error"])
+        self.assertFalse(responses[4]["result"]["done"])
+
+    def test_commit_conflict_fails_every_successful_line(self):
+        service = AssistantService()
+        service.execute("add_task", title="a", priority="Высокий", due_date="01-01-2030")
+        service.close()
+
+        def lines():
+            yield '{"command": "add_task", "title": "b", "priority": "Низкий", "due_date": "01-01-2030"}\n'
+            yield '{"command": "get_task", "task_id": 99}\n'
+            # Другой процесс меняет файл задач до фиксации пакета
+            other = JournalStorage("tasks.json")
+            other.load()
+            other.insert({"id": 50, "title": "чужая", "description": "", "done": False,
+                          "priority": "Средний", "due_date": "01-01-2030"})
+
+        errors, responses = self.run_lines(lines())
+        self.assertEqual(errors, 2)
+        self.assertIn("не сохранены", responses[0]["error"])
+        self.assertIn("не найдена", responses[1]["error"])
+        titles = {record["title"] for record in JournalStorage("tasks.json").load()}
+        self.assertEqual(titles, {"a", "чужая"})
+
+
+if __name__ == "__main__":
+    unittest.main()
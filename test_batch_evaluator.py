@@ -0,0 +1,60 @@
+"""Проверка BatchEvaluator: результаты NumPy и построчного режима совпадают по значению и типу.
+
+Запуск: python test_batch_evaluator.py (или python -m unittest test_batch_evaluator).
+"""
+import random
+import unittest
+from unittest import mock
+import BatchEvaluator
+from BatchEvaluator import BatchEvaluator as Evaluator
+
+EXPRESSIONS = [
+    "round(amount, 2)", "round(amount)", "round(amount, -1)", "round(2.675, 2)", "round(amount * 1.2, 2)",
+    "round(7, 2)", "min(amount, 0)", "max(amount, 0)", "max(0, amount, rate)", "min(amount, rate) * 2",
+    "floor(amount)", "ceil(amount) // 3", "abs(floor(amount))", "factorial(n)", "factorial(amount)",
+    "amount / rate", "amount // rate", "amount % 0", "n ** 2", "n ** -1", "2 ** 10 + n",
+    "sqrt(amount)", "log(amount)", "(-8) ** 0.5 + amount", "amount ** 0.5", "amount + 9 ** 999",
+    "round(amount, n)", "amount * 2", "42",
+]
+
+
+def make_rows(count, seed=1):
+    generator = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        rows.append({
+            "amount": str(round(generator.uniform(-1000, 1000), generator.choice((0, 1, 2, 3)))),
+            "rate": generator.choice(("0", "1.5", "-2", "0.0", "3")),
+            "n": str(generator.randint(-3, 30)),
+        })
+    rows += [{"amount": "2.5", "rate": "2.5", "n": "0"}, {"amount": "-0.5", "rate": "0", "n": "170"},
+             {"amount": "abc", "rate": "1", "n": "1"}, {"rate": "1", "n": "1"}, {"amount": "2.675", "rate": "1", "n": "4"}]
+    return rows
+
+
+@unittest.skipIf(BatchEvaluator.np is None, "нужен NumPy")
+class BatchEvaluatorTest(unittest.TestCase):
+
+    def test_vector_and_scalar_paths_match(self):
+        rows = make_rows(500)
+        for expression in EXPRESSIONS:
+            with self.subTest(expression=expression):
+                vector = Evaluator(expression).evaluate_batch(rows)
+                with mock.patch.object(BatchEvaluator, "np", None):
+                    scalar = Evaluator(expression).evaluate_batch(rows)
+                self.assertEqual(vector, scalar)
+                self.assertEqual([type(value) for value in vector], [type(value) for value in scalar])
+
+    def test_round_to_cents(self):
+        results = Evaluator("round(amount, 2)").evaluate_batch([{"amount": "10.456"}, {"amount": "2.675"}])
+        self.assertEqual(results, [10.46, 2.67])
+
+    def test_errors_are_reported_per_row(self):
+        results = Evaluator("amount / rate").evaluate_batch(
+            [{"amount": "1", "rate": "0"}, {"amount": "1", "rate": "x"}, {"amount": "1"}, {"amount": "3", "rate": "2"}])
+        self.assertEqual(results, ["Деление на ноль!", "Некорректное значение переменной 'rate'.",
+                                   "Нет значения переменной 'rate'.", 1.5])
+
+
+if __name__ == "__main__":
+    unittest.main()
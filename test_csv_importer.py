@@ -0,0 +1,111 @@
+"""Проверка импорта CSV: строки с ошибками не прерывают импорт.
+
+Запуск: python test_csv_importer.py (или python -m unittest test_csv_importer).
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from CsvImporter import CsvImporter
+from JournalStorage import JournalStorage
+from NoteManager import NoteManager
+from TaskManager import TaskManager
+from ContactManager import ContactManager
+from FinanceManager import FinanceManager
+from DateIndex import DateIndex
+from TaskIndex import TaskIndex
+from ContactSearchIndex import ContactSearchIndex
+from NoteSearchIndex import NoteSearchIndex
+
+# Для каждого менеджера: заголовок, правильная строка и короткие строки
+ROWS = {
+    NoteManager: ("title,content,timestamp", "Заметка,текст,01-01-2030 10:00:00", ["Заметка", "Заметка,текст"]),
+    TaskManager: ("title,description,done,priority,due_date", "Задача,,False,Высокий,01-01-2030",
+                  ["Задача", "Задача,,False,Высокий"]),
+    ContactManager: ("name,phone,email", "Иван,+79001112233,ivan@example.com", ["Пётр", "Пётр,+79005556677"]),
+    FinanceManager: ("amount,category,date,description", "-10,Еда,01-01-2030,обед", ["-10", "-10,Еда,01-01-2030"]),
+}
+
+
+class CsvImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="import-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, lines):
+        path = os.path.join(self.directory, "import.csv")
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            file.write("\n".join(lines) + "\n")
+        return path
+
+    def run_import(self, manager, lines, workers=1):
+        storage = JournalStorage(os.path.join(self.directory, manager.__name__ + ".json"))
+        records = storage.load()
+        importer = CsvImporter(records, storage, manager.parse_csv_row, manager.CSV_FIELDS, batch_size=2,
+                               workers=workers)
+        importer.parallel_min_size = 0
+        return records, importer.run(self.write(lines))
+
+    def test_ragged_rows_are_reported_per_row(self):
+        for manager, (header, good, ragged) in ROWS.items():
+            with self.subTest(manager=manager.__name__):
+                records, report = self.run_import(manager, [header, good] + ragged + [good, good])
+                self.assertEqual(report.rows, 5)
+                self.assertEqual(report.imported, 3)
+                self.assertEqual(len(records), 3)
+                self.assertEqual([line for line, _ in report.errors], [3, 4])
+                for _, message in report.errors:
+                    self.assertIn("нет значения", message)
+
+    def test_ragged_rows_in_parallel_import(self):
+        header, good, ragged = ROWS[FinanceManager]
+        lines = [header] + [good] * 50 + ragged + [good] * 50
+        records, report = self.run_import(FinanceManager, lines, workers=2)
+        self.assertEqual(report.imported, 100)
+        self.assertEqual(len(report.errors), 2)
+
+    def test_invalid_values_do_not_stop_import(self):
+        header, good, _ = ROWS[FinanceManager]
+        lines = [header, good, "abc,Еда,01-01-2030,x", "-5,Еда,32-01-2030,x", good]
+        records, report = self.run_import(FinanceManager, lines)
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+
+    def test_missing_column_rejects_file(self):
+        with self.assertRaises(ValueError):
+            self.run_import(FinanceManager, ["amount,category,date", "-10,Еда,01-01-2030"])
+
+    def test_import_updates_indexes_like_build(self):
+        cases = [
+            (FinanceManager, ["amount,category,date,description"] +
+             [f"-{i},Еда,{i % 28 + 1:02d}-0{i % 9 + 1}-2030,x{i}" for i in range(100)],
+             lambda records: DateIndex.build(records, "date"), lambda index: index._keys.ordered()),
+            (TaskManager, ["title,description,done,priority,due_date"] +
+             [f"Задача {i},,{i % 2 == 0},{('Высокий', 'Низкий')[i % 2]},{i % 28 + 1:02d}-01-2030" for i in range(100)],
+             TaskIndex.build, lambda index: {bucket: keys.ordered() for bucket, keys in index._buckets.items()}),
+            (ContactManager, ["name,phone,email"] + [f"Имя {100 - i},+7900{i:07d}," for i in range(100)],
+             ContactSearchIndex.build, lambda index: (index._sorted_names.ordered(), index.name_trigrams)),
+            (NoteManager, ["title,content,timestamp"] +
+             [f"Заметка {i},слово{i % 7} текст{i},01-01-2030 10:00:00" for i in range(100)],
+             NoteSearchIndex.build, lambda index: (index._terms.ordered(), index.postings)),
+        ]
+        for manager, lines, build, state in cases:
+            with self.subTest(manager=manager.__name__):
+                storage = JournalStorage(os.path.join(self.directory, manager.__name__ + ".json"))
+                records = storage.load()
+                index = build(records)
+                records.listeners.append(index)
+                importer = CsvImporter(records, storage, manager.parse_csv_row, manager.CSV_FIELDS, batch_size=7,
+                                       workers=1)
+                importer.run(self.write(lines[:51]))
+                state(index)
+                importer.run(self.write(lines[:1] + lines[51:]))
+                self.assertEqual(len(records), 100)
+                self.assertEqual(state(index), state(build(records)))
+
+
+if __name__ == "__main__":
+    unittest.main()
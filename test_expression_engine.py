@@ -0,0 +1,87 @@
+"""Проверка ограничений ExpressionEngine: размер результата, время, степень, факториал и округление.
+
+Запуск: python test_expression_engine.py (или python -m unittest test_expression_engine).
+"""
+import time
+import unittest
+from ExpressionEngine import ExpressionEngine, ExpressionError, MAX_FACTORIAL
+
+
+class ExpressionEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = ExpressionEngine()
+
+    def assertRejected(self, text, message=None, **variables):
+        with self.assertRaises(ExpressionError) as context:
+            self.engine.evaluate(text, variables)
+        if message is not None:
+            self.assertIn(message, str(context.exception))
+
+    def assertFast(self, text):
+        """Выражение отклоняется быстро, а не после долгого вычисления."""
+        started = time.monotonic()
+        self.assertRejected(text)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_arithmetic_and_variables(self):
+        self.assertEqual(self.engine.evaluate("2 + 3 * 4"), 14)
+        self.assertEqual(self.engine.evaluate("amount * 1.5", {"amount": 10}), 15.0)
+        self.assertRejected("x + 1", "Неизвестная переменная")
+        self.assertRejected("__import__('os')")
+        self.assertRejected("'text'", "Допускаются только числа")
+
+    def test_result_size(self):
+        self.assertFast("9 ** 9999")
+        self.assertFast("9 ** 4000 * 9 ** 4000")
+        self.assertFast("factorial(1000) * factorial(1000) * factorial(1000)")
+        self.assertRejected("1e999", "конечным")
+        self.assertEqual(len(str(self.engine.evaluate("10 ** 3999"))), 4000)
+
+    def test_nesting(self):
+        self.assertFast("(" * 500 + "1" + ")" * 500)
+        self.assertFast("-" * 100000 + "1")
+
+    def test_deadline(self):
+        with self.assertRaises(ExpressionError) as context:
+            self.engine.evaluate("1 + 1", timeout=-1)
+        self.assertIn("время", str(context.exception))
+        # Длинная цепочка тяжёлых вызовов прерывается по времени, а не считается до конца
+        text = " + ".join(["factorial(1000)"] * 5000)
+        started = time.monotonic()
+        with self.assertRaises(ExpressionError):
+            self.engine.evaluate(text, timeout=0.01)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_pow(self):
+        self.assertEqual(self.engine.evaluate("2 ** 10"), 1024)
+        self.assertEqual(self.engine.evaluate("4 ** 0.5"), 2.0)
+        self.assertFast("2 ** 100000000")
+        self.assertFast("7 ** 7 ** 7")
+        self.assertRejected("2.0 ** 10000", "большой")
+        self.assertRejected("(-8) ** 0.5", "действительным")
+        self.assertRejected("x ** (1 / 3)", "действительным", x=-27)
+
+    def test_factorial(self):
+        self.assertEqual(self.engine.evaluate("factorial(5)"), 120)
+        self.assertEqual(self.engine.evaluate("factorial(5.0)"), 120)
+        self.assertRejected("factorial(1.5)", "целых")
+        self.assertRejected("factorial(-1)")
+        self.assertFast(f"factorial({MAX_FACTORIAL + 1})")
+
+    def test_round(self):
+        self.assertEqual(self.engine.evaluate("round(3.14159, 2)"), 3.14)
+        self.assertEqual(self.engine.evaluate("round(1234, -2)"), 1200)
+        self.assertEqual(self.engine.evaluate("round(2.5)"), 2)
+        self.assertEqual(self.engine.evaluate("round(x, 2)", {"x": 1.005}), round(1.005, 2))
+        self.assertFast("round(7, -30000000)")
+        self.assertFast("round(7.5, 30000000)")
+        self.assertRejected("round(7, 0.5)", "целым")
+
+    def test_division_by_zero_is_left_to_caller(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.engine.evaluate("1 / 0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Проверка FileRecordCollection: индексы строятся по столбцам файла без сборки записей.
+
+Запуск: python test_file_record_collection.py (или python -m unittest test_file_record_collection).
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from JournalStorage import JournalStorage
+from RecordCollection import RecordCollection
+from RecordFile import RecordFile
+from DateIndex import DateIndex
+from TaskIndex import TaskIndex
+from TaskScheduler import TaskScheduler
+
+TASKS = [{"id": i, "title": f"Задача {i}", "description": "", "done": i % 3 == 0,
+          "priority": ("Высокий", "Средний", "Низкий")[i % 3],
+          "due_date": "нет" if i % 7 == 0 else f"{i % 28 + 1:02d}-{i % 12 + 1:02d}-2030"} for i in range(1, 200)]
+
+
+class FileRecordCollectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="binary-test-")
+        storage = JournalStorage(os.path.join(self.directory, "tasks.bin"), format="binary")
+        storage.load()
+        storage.save(RecordCollection(dict(task) for task in TASKS))
+        # Изменения после сохранения лежат в журнале поверх двоичного файла
+        storage.update(dict(TASKS[4], done=True, due_date="01-01-2031"))
+        storage.delete(TASKS[9]["id"])
+        storage.insert(dict(TASKS[0], id=500, due_date="15-06-2030"))
+        self.tasks = JournalStorage(storage.path, format="binary").load()
+        self.expected = RecordCollection(dict(task) for task in self.tasks)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_values_match_records(self):
+        fields = ("id", "title", "done", "priority", "due_date")
+        self.assertEqual(list(self.tasks.values(*fields)), list(self.expected.values(*fields)))
+        self.assertEqual(len(list(self.tasks.values("id", "done"))), len(self.expected))
+
+    def test_indexes_are_built_without_decoding_records(self):
+        with mock.patch.object(RecordFile, "record", side_effect=AssertionError("запись собрана")):
+            dates = DateIndex.build(self.tasks, "due_date")
+            index = TaskIndex.build(self.tasks)
+            scheduler = TaskScheduler.build(self.tasks, lambda task_id, kind: None, clock=lambda: 0)
+        self.assertEqual(list(dates.range()), list(DateIndex.build(self.expected, "due_date").range()))
+        self.assertEqual(index.query(order_by="priority"), TaskIndex.build(self.expected).query(order_by="priority"))
+        expected = TaskScheduler.build(self.expected, lambda task_id, kind: None, clock=lambda: 0)
+        self.assertEqual(sorted(scheduler._heap), sorted(expected._heap))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Проверка поиска дубликатов по отпечаткам и отложенной загрузки индекса.
+
+Запуск: python test_fingerprint_index.py (или python -m unittest test_fingerprint_index).
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from FinanceManager import FinanceManager
+from ContactManager import ContactManager
+
+RECORD = {"amount": -10.0, "category": "Еда", "date": "01-01-2030", "description": "обед"}
+
+
+class LazyFingerprintIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="fingerprint-test-")
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def add_record(self, manager, record_id, **changes):
+        record = dict(RECORD, id=record_id, **changes)
+        manager.records.add(record)
+        manager.storage.insert(record)
+
+    def test_index_is_not_read_at_start(self):
+        manager = FinanceManager(columnar=False)
+        manager.fingerprints
+        self.add_record(manager, 1)
+        manager.save_ledger()
+        manager.close()
+        self.assertTrue(os.path.exists("finance.json.fingerprints"))
+        os.remove("finance.json.snapshot")
+
+        with mock.patch("JournalStorage.JournalStorage.load_derived", return_value=None) as load_derived:
+            manager = FinanceManager(columnar=False)
+            self.assertNotIn("fingerprints", [call.args[0] for call in load_derived.call_args_list])
+        self.assertEqual(manager.fingerprints.find(dict(RECORD)), 1)
+
+    def test_changes_before_load_are_indexed(self):
+        manager = FinanceManager(columnar=False)
+        self.add_record(manager, 1)
+        manager.save_ledger()
+        manager.close()
+
+        manager = FinanceManager(columnar=False)
+        with manager.storage.batch():
+            # В пакете файл ещё не изменён, и сохранённый индекс выглядел бы верным
+            self.add_record(manager, 2, description="ужин")
+            manager.records.remove(1)
+            manager.storage.delete(1)
+            self.assertEqual(manager.fingerprints.find(dict(RECORD, description="ужин")), 2)
+            self.assertIsNone(manager.fingerprints.find(dict(RECORD)))
+
+    def test_contacts_survive_restart(self):
+        manager = ContactManager()
+        contact = {"id": 1, "name": "Анна", "phone": "8 (912) 345-67-89", "email": ""}
+        manager.contacts.add(contact)
+        manager.storage.insert(contact)
+        manager.save_fingerprints()
+        manager.close()
+
+        manager = ContactManager()
+        self.assertIsNone(manager._fingerprints.index)
+        self.assertEqual(manager.fingerprints.find({"name": "", "phone": "+79123456789", "email": ""}), 1)
+        contact = {"id": 2, "name": "Борис", "phone": "", "email": "boris@example.com"}
+        manager.contacts.add(contact)
+        manager.storage.insert(contact)
+        manager.close()
+        # Снимок хранит загруженный индекс вместе с изменениями
+        manager = ContactManager()
+        self.assertIsNotNone(manager._fingerprints.index)
+        self.assertEqual(manager.fingerprints.find({"name": "", "phone": "", "email": "Boris@example.com"}), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Проверка восстановления JournalStorage после сбоев и конфликтов записи.
+
+Запуск: python test_journal_storage.py (или python -m unittest test_journal_storage).
+Каждый тест работает во временном каталоге. Сбой процесса имитируется
+исключением из os.replace: на диске остаётся ровно то состояние, которое
+оставил бы процесс, упавший в этот момент, а экземпляр хранилища после
+этого больше не используется.
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from JournalStorage import JournalStorage
+from RecordCollection import RecordCollection
+from StorageError import ConflictError
+
+
+class Crash(Exception):
+    """Имитация падения процесса."""
+
+
+def crash_on_replace(number):
+    """Подмена os.replace, падающая на вызове с номером number (с единицы)."""
+    real_replace = os.replace
+    calls = []
+
+    def replace(source, target):
+        calls.append(target)
+        if len(calls) == number:
+            raise Crash(target)
+        real_replace(source, target)
+    return mock.patch("JournalStorage.os.replace", replace)
+
+
+class JournalStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="journal-test-")
+        self.path = os.path.join(self.directory, "tasks.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_storage(self, count):
+        """Хранилище с сохранённым базовым файлом и count записями в журнале."""
+        storage = JournalStorage(self.path)
+        storage.save(RecordCollection([{"id": 1, "title": "база"}]))
+        storage.load()
+        for record_id in range(2, count + 2):
+            storage.insert({"id": record_id, "title": f"задача {record_id}"})
+        return storage
+
+    def titles(self):
+        return {record["id"]: record["title"] for record in JournalStorage(self.path).load()}
+
+    def test_torn_tail_is_dropped_and_journal_truncated(self):
+        self.make_storage(3)
+        size = os.path.getsize(self.path + ".journal")
+        with open(self.path + ".journal", "ab") as file:
+            file.write(b'{"op": "insert", "record": {"id": 99, "ti')
+
+        storage = JournalStorage(self.path)
+        records = storage.load()
+        self.assertEqual(sorted(record["id"] for record in records), [1, 2, 3, 4])
+        self.assertEqual(os.path.getsize(self.path + ".journal"), size)
+
+        # После отрезания хвоста журнал снова дописывается и читается
+        storage.insert({"id": 5, "title": "после сбоя"})
+        self.assertEqual(self.titles()[5], "после сбоя")
+
+    def test_crash_before_base_replaced_keeps_old_files(self):
+        storage = self.make_storage(3)
+        expected = self.titles()
+        # Первая замена - новый базовый файл: новый журнал уже записан в .tmp
+        with crash_on_replace(1), self.assertRaises(Crash):
+            storage._compact_files()
+        self.assertTrue(os.path.exists(self.path + ".journal.tmp"))
+
+        self.assertEqual(self.titles(), expected)
+        self.assertFalse(os.path.exists(self.path + ".journal.tmp"))
+
+    def test_crash_between_replacements_finishes_compaction(self):
+        storage = self.make_storage(3)
+        expected = self.titles()
+        # Базовый файл уже заменён, журнал - ещё нет: старый журнал повторил бы записи
+        with crash_on_replace(2), self.assertRaises(Crash):
+            storage._compact_files()
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(len(json.load(file)), len(expected))
+
+        self.assertEqual(self.titles(), expected)
+        self.assertFalse(os.path.exists(self.path + ".journal.tmp"))
+        with open(self.path + ".journal", encoding="utf-8") as file:
+            self.assertEqual([json.loads(line)["op"] for line in file], ["base"])
+
+    def test_stale_writer_gets_conflict(self):
+        self.make_storage(1)
+        first = JournalStorage(self.path)
+        second = JournalStorage(self.path)
+        first.load()
+        second.load()
+        first.insert({"id": 3, "title": "первый"})
+
+        with self.assertRaises(ConflictError):
+            second.insert({"id": 3, "title": "второй"})
+        self.assertTrue(second.stale)
+        self.assertEqual(self.titles()[3], "первый")
+
+        # После перечитывания запись проходит
+        second.load()
+        self.assertFalse(second.stale)
+        second.insert({"id": 4, "title": "второй"})
+        self.assertEqual(self.titles()[4], "второй")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+"""Проверка SortedKeys: отложенное вливание ключей совпадает с отсортированным списком.
+
+Запуск: python test_sorted_keys.py (или python -m unittest test_sorted_keys).
+"""
+import random
+import unittest
+from SortedKeys import SortedKeys, INSORT_LIMIT
+
+
+class SortedKeysTest(unittest.TestCase):
+
+    def test_random_operations_match_sorted_set(self):
+        rng = random.Random(6)
+        expected = set(rng.sample(range(10000), 500))
+        keys = SortedKeys(expected)
+        for step in range(200):
+            # Пакеты и меньше, и больше порога поштучной вставки
+            for _ in range(rng.choice((1, INSORT_LIMIT, 5 * INSORT_LIMIT))):
+                key = rng.randrange(10000)
+                if key not in expected:
+                    expected.add(key)
+                    keys.add(key)
+            for key in rng.sample(sorted(expected), 20):
+                expected.discard(key)
+                keys.remove(key)
+            keys.remove(-1)
+            self.assertEqual(len(keys), len(expected))
+            if step % 3 == 0:
+                self.assertEqual(keys.ordered(), sorted(expected))
+        self.assertEqual(keys.ordered(), sorted(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Проверка бэкенда SQLite: записи, итоги и дубликаты обслуживает база без загрузки таблицы.
+
+Запуск: python test_sqlite_storage.py (или python -m unittest test_sqlite_storage).
+"""
+import os
+import sqlite3
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from AssistantService import AssistantService
+from FinanceLedger import FinanceLedger
+from FingerprintIndex import finance_keys
+from RecordCollection import RecordCollection
+from SqliteStorage import SqliteStorage
+
+
+class SqliteStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="sqlite-test-")
+        os.chdir(self.directory)
+        patcher = mock.patch.dict(os.environ, {"ASSISTANT_BACKEND": "sqlite", "ASSISTANT_DB": "assistant.db"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def write(self, lines):
+        with open("import.csv", "w", encoding="utf-8", newline="") as file:
+            file.write("\n".join(lines) + "\n")
+        return "import.csv"
+
+    def test_records_and_totals_without_loading_table(self):
+        service = AssistantService()
+        for amount, category, date in ((-100, "Еда", "01-01-2030"), (500, "Зарплата", "05-01-2030"),
+                                       (-40, "Еда", "03-02-2030"), (-7.5, "Транспорт", "03-02-2030")):
+            service.add_record(amount, category, date)
+        service.close()
+
+        service = AssistantService()
+        with mock.patch.object(SqliteStorage, "scan", side_effect=AssertionError("таблица прочитана целиком")):
+            self.assertEqual(service.balance(), 352.5)
+            self.assertEqual(service.totals_by_category(), {"Еда": -140.0, "Зарплата": 500.0, "Транспорт": -7.5})
+            self.assertEqual(service.totals_by_month(), {"01-2030": 400.0, "02-2030": -47.5})
+            self.assertEqual(service.get_record(3)["amount"], -40.0)
+            with self.assertRaises(ValueError):
+                service.add_record(-40, "еда", "03-02-2030")
+            service.add_record(-40, "еда", "03-02-2030", force=True)
+            manager = service._manager("finance")
+            self.assertEqual(len(manager.records), 5)
+            manager.records.remove(1)
+            manager.storage.delete(1)
+            self.assertIsNone(manager.records.get(1))
+        expected = FinanceLedger.build(RecordCollection(manager.records))
+        self.assertEqual(manager.ledger.by_day, expected.by_day)
+        self.assertAlmostEqual(manager.ledger.balance, expected.balance)
+        service.close()
+
+    def test_import_skips_and_merges_duplicates(self):
+        service = AssistantService()
+        lines = ["amount,category,date,description", "-10,Еда,01-01-2030,обед", "-10,Еда,01-01-2030,обед",
+                 "20,Доход,02-01-2030,"]
+        self.assertEqual(service.import_records(self.write(lines), batch_size=2, workers=1)["imported"], 3)
+        report = service.import_records(self.write(lines), batch_size=2, workers=1)
+        self.assertEqual((report["imported"], report["duplicates"]), (0, 3))
+
+        lines = ["name,phone,email", "Иван,+79001112233,", "Иван,8 900 111-22-33,ivan@example.com",
+                 "Пётр,,petr@example.com", "Иван,,IVAN@example.com"]
+        report = service.import_contacts(self.write(lines), batch_size=10)
+        self.assertEqual((report["imported"], report["duplicates"], report["merged"]), (2, 2, 1))
+        service.close()
+
+        service = AssistantService()
+        self.assertEqual(service.get_contact(1)["email"], "ivan@example.com")
+        self.assertEqual(service.add_contact("Иван Иванович", phone="89001112233")["id"], 1)
+        self.assertEqual(len(service._manager("contacts").contacts), 2)
+        service.close()
+
+    def test_old_table_gets_fingerprint_columns(self):
+        connection = sqlite3.connect("old.db")
+        connection.execute("CREATE TABLE finance (id INTEGER PRIMARY KEY, amount, category, date, description, "
+                           "date_ordinal, category_folded)")
+        connection.execute("INSERT INTO finance VALUES (1, -10.0, 'Еда', '01-01-2030', 'обед', 0, 'еда')")
+        connection.commit()
+        connection.close()
+        storage = SqliteStorage("old.db", "finance")
+        records = storage.load()
+        self.assertEqual(records[1]["description"], "обед")
+        self.assertEqual(storage.fingerprint_ids(finance_keys(records[1])[0]), [1])
+
+
+if __name__ == "__main__":
+    unittest.main()